@@ -20,6 +20,10 @@ from app.utils.config import Config
 from app.models.user import db, User
 from app.routes.auth import auth_bp
 
+def _json_matrix(rows):
+    """Matrix as nested lists of floats, NaN as null"""
+    return [[None if value != value else float(value) for value in row] for row in rows]
+
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
@@ -101,28 +105,28 @@ def create_app(config_class=Config):
             print("StockAnalyzer instance created successfully")
             
 
-            advice = analyzer.generate_investment_advice(symbol)
+            # Enhanced question type detection using conversation context
+            question_type = "general"
+            combined_text = f"{question} {conversation_context}".lower()
+            
+            if 'trend' in combined_text or 'going' in combined_text or 'direction' in combined_text:
+                question_type = "trend_analysis"
+            elif any(word in combined_text for word in ['buy', 'sell', 'hold', 'invest', 'investment', 'purchase']):
+                question_type = "should_i_buy"
+            elif any(word in combined_text for word in ['risk', 'safe', 'dangerous', 'volatile']):
+                question_type = "risk_assessment"
+            elif any(word in combined_text for word in ['price', 'value', 'worth', 'expensive', 'cheap']):
+                question_type = "price_analysis"
+            
+            print(f"Question type detected: {question_type}")
+            
+            # Advice, technical data and formatted text from one computation
+            analysis = analyzer.analyze_question(symbol, question_type)
+            advice = analysis['advice']
             print(f"Investment advice generated: {advice}")
             
             if advice and not advice.get('error'):
-
-                # Enhanced question type detection using conversation context
-                question_type = "general"
-                combined_text = f"{question} {conversation_context}".lower()
-                
-                if 'trend' in combined_text or 'going' in combined_text or 'direction' in combined_text:
-                    question_type = "trend_analysis"
-                elif any(word in combined_text for word in ['buy', 'sell', 'hold', 'invest', 'investment', 'purchase']):
-                    question_type = "should_i_buy"
-                elif any(word in combined_text for word in ['risk', 'safe', 'dangerous', 'volatile']):
-                    question_type = "risk_assessment"
-                elif any(word in combined_text for word in ['price', 'value', 'worth', 'expensive', 'cheap']):
-                    question_type = "price_analysis"
-                
-                print(f"Question type detected: {question_type}")
-                
-            
-                response = analyzer.get_investment_insight(symbol, question_type)
+                response = analysis['response']
                 print(f"Response generated: {response}")
                 
                 # Add contextual information based on conversation history
@@ -141,16 +145,7 @@ def create_app(config_class=Config):
                     'response': final_response,
                     'analysis_type': 'stock_analysis',
                     'symbol': symbol,
-                    'technical_data': {
-                        'current_price': advice.get('current_price'),
-                        'trend': advice.get('trend'),
-                        'recommendation': advice.get('recommendation'),
-                        'risk_score': advice.get('risk_score'),
-                        'volatility': advice.get('volatility'),
-                        'support': advice.get('support'),
-                        'resistance': advice.get('resistance'),
-                        'price_change_pct': advice.get('price_change_pct')
-                    }
+                    'technical_data': analysis['technical_data']
                 })
             else:
                 return jsonify({
@@ -165,19 +160,112 @@ def create_app(config_class=Config):
     @app.route('/api/available-assets', methods=['GET'])
     def available_assets():
         try:
-            assets = [
-                'AAPL', 'GOOGL', 'MSFT', 'AMZN', 'TSLA', 'META', 'NVDA', 'NFLX',
-                'BTC', 'ETH', 'ADA', 'DOT', 'LINK', 'LTC', 'BCH', 'UNI', 'ATOM',
-                'EUR/USD', 'GBP/USD', 'USD/JPY', 'AUD/USD', 'USD/CAD'
-            ]
+            sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'chatbot'))
+            from stock_analyzer_model.market_catalog import get_catalog
+            
+            catalog = get_catalog()
             
             return jsonify({
                 'success': True,
-                'assets': assets
+                'assets': catalog.symbols(),
+                'categories': {category: catalog.symbols(category) for category in catalog.categories()}
             })
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 500
     
+    @app.route('/api/screener', methods=['GET'])
+    def screener():
+        """Screen the whole catalog, e.g. ?rsi_oversold=true&category=Tech&sort=rsi&order=asc&limit=10"""
+        try:
+            sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'chatbot'))
+            from stock_analyzer_model.stock_analyzer import StockAnalyzer
+            from stock_analyzer_model.screener import filters_from_query
+
+            try:
+                filters = filters_from_query(request.args)
+                limit = request.args.get('limit', type=int)
+                period = request.args.get('period', 30, type=int)
+                if period < 2:
+                    raise ValueError("period must be at least 2")
+                results = StockAnalyzer().screen(filters, request.args.get('sort') or None,
+                                                 request.args.get('order', 'desc') != 'asc', limit, period)
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+
+            return jsonify({
+                'success': True,
+                'count': len(results),
+                'results': results
+            })
+        except Exception as e:
+            print(f"Screener error: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/sectors', methods=['GET'])
+    def sectors():
+        """Breadth, median volatility and trend of every category"""
+        try:
+            sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'chatbot'))
+            from stock_analyzer_model.stock_analyzer import StockAnalyzer
+
+            return jsonify({
+                'success': True,
+                'sectors': list(StockAnalyzer().sector_summary().values())
+            })
+        except Exception as e:
+            print(f"Sector aggregates error: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/sectors/<category>', methods=['GET'])
+    def sector_detail(category):
+        """One category's summary plus its equal-weight index, e.g. ?history=250 for the last 250 points"""
+        try:
+            sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'chatbot'))
+            from stock_analyzer_model.stock_analyzer import StockAnalyzer
+
+            analyzer = StockAnalyzer()
+            summary = analyzer.sector_summary(category)
+            if summary is None:
+                return jsonify({'success': False, 'error': f'Unknown category {category}'}), 404
+
+            index = analyzer.sector_index(category, request.args.get('history', 250, type=int))
+            return jsonify({
+                'success': True,
+                'sector': summary,
+                'index': [{'date': date.date().isoformat(), 'level': float(level)} for date, level in index.items()]
+            })
+        except Exception as e:
+            print(f"Sector aggregates error: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @app.route('/api/correlation', methods=['GET'])
+    def correlation():
+        """Return correlation and covariance of a watchlist, e.g. ?symbols=AAPL,MSFT,BTC&window=90"""
+        try:
+            symbols = [s.strip() for s in request.args.get('symbols', '').split(',') if s.strip()]
+            window = request.args.get('window', 90, type=int)
+            if len(symbols) < 2:
+                return jsonify({'success': False, 'error': 'At least two symbols are required'}), 400
+            if window < 3:
+                return jsonify({'success': False, 'error': 'window must be at least 3'}), 400
+
+            sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'chatbot'))
+            from stock_analyzer_model.stock_analyzer import StockAnalyzer
+
+            matrix = StockAnalyzer().correlation_matrix(symbols, window)
+            return jsonify({
+                'success': True,
+                'symbols': matrix.symbols,
+                'window': matrix.window,
+                'end_date': matrix.end_date,
+                'correlation': _json_matrix(matrix.correlation),
+                'covariance': _json_matrix(matrix.covariance),
+                'summary': matrix.summary()
+            })
+        except Exception as e:
+            print(f"Correlation error: {e}")
+            return jsonify({'success': False, 'error': str(e)}), 500
+
     @app.route('/api/available-stocks', methods=['GET'])
     def available_stocks():
         try:
@@ -345,19 +345,4 @@ class BasicChatbot:
         self.conversation_history = []
 
     def get_available_assets(self):
-        return [
-            'AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'META', 'NVDA', 'NFLX', 'CRM', 'ADBE',
-            'PYPL', 'INTC', 'AMD', 'CSCO', 'ORCL', 'IBM', 'QCOM', 'AVGO', 'TXN', 'MU',
-            'TMUS', 'VZ', 'T', 'CMCSA', 'CHTR', 'DISH', 'LUMN', 'CTL',
-            'JPM', 'BAC', 'WFC', 'GS', 'MS', 'C', 'USB', 'PNC', 'TFC', 'COF',
-            'JNJ', 'PFE', 'UNH', 'ABBV', 'MRK', 'TMO', 'ABT', 'DHR', 'BMY', 'AMGN',
-            'XOM', 'CVX', 'COP', 'EOG', 'SLB', 'PSX', 'VLO', 'MPC', 'HAL', 'BKR',
-            'DIS', 'NKE', 'HD', 'LOW', 'COST', 'TGT', 'WMT', 'SBUX', 'MCD', 'KO', 'PEP', 'PG',
-            'BA', 'CAT', 'GE', 'MMM', 'HON', 'UPS', 'FDX', 'RTX', 'LMT', 'NOC',
-            'SPG', 'PLD', 'AMT', 'CCI', 'EQIX', 'DLR', 'PSA', 'O', 'WELL', 'VICI',
-            'LIN', 'APD', 'FCX', 'NEM', 'BLL', 'SHW', 'ECL', 'NUE', 'X',
-            'NEE', 'DUK', 'SO', 'D', 'AEP', 'SRE', 'XEL', 'DTE', 'WEC', 'ED',
-            'TJX', 'BKNG', 'MAR', 'PM', 'MO', 'CL', 'GIS', 'KMB',
-            'BTC', 'ETH', 'ADA', 'DOT', 'LINK', 'LTC', 'BCH', 'XRP', 'BNB', 'SOL',
-            'MATIC', 'AVAX', 'UNI', 'ATOM', 'FTM', 'NEAR', 'ALGO', 'VET', 'MANA', 'SAND'
-        ] 
\ No newline at end of file
+        return self.analyzer.catalog.symbols() 
\ No newline at end of file
@@ -24,6 +24,14 @@ else:
 sys.path.append(os.path.dirname(current_dir))
 
 from stock_analyzer_model.stock_analyzer import StockAnalyzer
+from stock_analyzer_model.correlation import describe as describe_correlation
+
+# Bars analyzed for each horizon interpret_question extracts
+HORIZON_TIMEFRAMES = {
+    "short_term": "daily",
+    "medium_term": "daily",
+    "long_term": "weekly"
+}
 
 class AIChatbot:
     def __init__(self, openai_api_key=None):
@@ -196,6 +204,7 @@ class AIChatbot:
             f"Price Change: {data.get('price_change_pct', 0):+.2f}%\n"
             f"Price Change Amount: ${data.get('price_change', 0):+.2f}\n"
             f"Trend Direction: {data.get('trend')}\n"
+            f"Timeframe: {data.get('timeframe', 'daily')} bars, last {data.get('analysis_period', 30)} periods\n"
             f"Volatility: {data.get('volatility', 0):.2f}%\n"
             f"Risk Score: {data.get('risk_score', 'N/A')}/10\n"
             f"Recommendation: {data.get('recommendation', 'N/A')}\n"
@@ -674,9 +683,10 @@ class AIChatbot:
         
         interpretation = self.interpret_question(question)
         symbol = interpretation.get("asset_symbol")
+        timeframe = HORIZON_TIMEFRAMES.get(interpretation.get("timeframe"), "daily")
 
         if symbol:
-            data = self.analyzer.generate_investment_advice(symbol)
+            data = self.analyzer.generate_investment_advice(symbol, timeframe=timeframe)
             if data and 'error' not in data:
                 try:
                     return self.generate_insight(data, question)
@@ -727,10 +737,14 @@ class AIChatbot:
             symbol = watchlist_items[0]
             return f"I can see you have {symbol} in your watchlist. Let me analyze it for you:\n\n" + self._analyze_single_stock(symbol)
         
+        correlation_text = self._correlation_context(watchlist_items)
        
         prompt = f"""
         The user is asking about investing in multiple stocks from their watchlist: {watchlist_text}
         
+        Measured return correlations (base the diversification advice on these figures):
+        {correlation_text}
+        
         Provide a comprehensive analysis comparing these stocks. Include:
         1. Brief overview of each company
         2. Risk assessment for each
@@ -754,6 +768,19 @@ class AIChatbot:
         
         return self._chat_with_openai(prompt, question, 600)
 
+    def _correlation_context(self, symbols, max_pairs=10):
+        """Correlation figures for a watchlist from the cached matrix, as prompt text"""
+        try:
+            matrix = self.analyzer.correlation_matrix(symbols)
+            summary = matrix.summary()
+        except Exception as e:
+            print(f"[ERROR] Correlation lookup failed: {e}")
+            return "Not available."
+        if summary is None:
+            return "Not available for these symbols."
+        pairs = ", ".join(f"{a}/{b} {value:.2f}" for a, b, value in matrix.pairs()[:max_pairs])
+        return f"{describe_correlation(summary)} Pairs: {pairs}."
+
     def _analyze_single_stock(self, symbol):
         """Analyze a single stock and return formatted response"""
         try:
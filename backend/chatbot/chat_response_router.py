@@ -1,6 +1,7 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
+import threading
 from dotenv import load_dotenv
 
 
@@ -10,20 +11,31 @@ app = Flask(__name__)
 CORS(app)
 
 
-try:
-    from chat_gpt_model.ai_chatbot import AIChatbot
-    ai_chatbot = AIChatbot()
-    enhanced_chatbot = ai_chatbot
-    ai_available = True
-    print("AI Chatbot loaded successfully")
-except Exception as e:
-    print(f"Failed to load AI Chatbot: {e}")
-    ai_available = False
+_chatbots = None
+_chatbots_lock = threading.Lock()
 
 
-from stock_analyzer_model.basic_chatbot import BasicChatbot
-basic_chatbot = BasicChatbot()
-enhanced_chatbot = basic_chatbot
+def get_chatbots():
+    """(ai_chatbot or None, basic_chatbot), built once on first use.
+
+    Not built at import: advice pool workers re-import this module as
+    ``__mp_main__`` and must not each construct the chatbots.
+    """
+    global _chatbots
+    if _chatbots is None:
+        with _chatbots_lock:
+            if _chatbots is None:
+                try:
+                    from chat_gpt_model.ai_chatbot import AIChatbot
+                    ai_chatbot = AIChatbot()
+                    print("AI Chatbot loaded successfully")
+                except Exception as e:
+                    print(f"Failed to load AI Chatbot: {e}")
+                    ai_chatbot = None
+
+                from stock_analyzer_model.basic_chatbot import BasicChatbot
+                _chatbots = (ai_chatbot, BasicChatbot())
+    return _chatbots
 
 @app.route('/api/ai_chatbot', methods=['POST'])
 def analyze_stock_enhanced():
@@ -39,7 +51,8 @@ def analyze_stock_enhanced():
             }), 400
         
   
-        if ai_available:
+        ai_chatbot, basic_chatbot = get_chatbots()
+        if ai_chatbot is not None:
             try:
                 response = ai_chatbot.process_question(user_question)
                 return jsonify({
@@ -81,6 +94,7 @@ def analyze_stock_enhanced():
 def get_available_assets():
     """Get list of available assets"""
     try:
+        _, basic_chatbot = get_chatbots()
         assets = basic_chatbot.get_available_assets()
         return jsonify({
             'assets': assets,
@@ -106,6 +120,7 @@ def fallback_analysis():
                 'response': 'Please provide a question about a stock or cryptocurrency.'
             }), 400
         
+        _, basic_chatbot = get_chatbots()
         response = basic_chatbot.process_question(user_question)
         
         return jsonify({
@@ -127,6 +142,7 @@ def fallback_analysis():
 def get_conversation_history():
     """Get current conversation history"""
     try:
+        _, enhanced_chatbot = get_chatbots()
         history = enhanced_chatbot.conversation_history
         return jsonify({
             'history': history,
@@ -143,6 +159,7 @@ def get_conversation_history():
 def clear_conversation():
     """Clear conversation history"""
     try:
+        _, enhanced_chatbot = get_chatbots()
         enhanced_chatbot.clear_history()
         return jsonify({
             'message': 'Conversation history cleared',
@@ -155,4 +172,5 @@ def clear_conversation():
         }), 500
 
 if __name__ == '__main__':
+    get_chatbots()
     app.run(host='0.0.0.0', port=5002) 
\ No newline at end of file
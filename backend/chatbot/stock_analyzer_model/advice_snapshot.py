@@ -0,0 +1,267 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from .market_catalog import get_catalog
+
+ADVICE_SNAPSHOT_FILENAME = 'advice_snapshot.json'
+ADVICE_SNAPSHOT_VERSION = 1
+# Question types ``format_investment_insight`` distinguishes; the text for each is stored
+QUESTION_TYPES = ('general', 'should_i_buy', 'trend_analysis', 'risk_assessment', 'price_analysis')
+# Seconds between checks for a snapshot file rebuilt by another process
+RELOAD_INTERVAL = 5
+
+_advice_snapshots = {}
+_advice_snapshots_lock = threading.Lock()
+
+
+class AdviceSnapshot:
+    """Advice and formatted insights for every catalog symbol at one analysis period.
+
+    Entries are keyed by CSV path (so aliases and categories land on the
+    same entry) and stamped with that CSV's mtime and size; ``get`` returns
+    an entry only while the stamp still matches the file on disk.
+    """
+
+    def __init__(self, entries, analysis_period, built_at):
+        self.entries = entries
+        self.analysis_period = analysis_period
+        self.built_at = built_at
+
+    def get(self, rel_path, source_stats, analysis_period=30):
+        entry = self.entries.get(rel_path)
+        if (entry is None or source_stats is None or analysis_period != self.analysis_period
+                or entry['mtime_ns'] != source_stats['mtime_ns'] or entry['size'] != source_stats['size']):
+            return None
+        return entry
+
+    def to_json(self):
+        return {
+            'version': ADVICE_SNAPSHOT_VERSION,
+            'analysis_period': self.analysis_period,
+            'built_at': self.built_at,
+            'entries': self.entries
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        if data.get('version') != ADVICE_SNAPSHOT_VERSION:
+            return None
+        return cls(data['entries'], data['analysis_period'], data['built_at'])
+
+
+def _json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class AdviceSnapshotStore:
+    """The advice snapshot of a store directory (``market_store/advice_snapshot.json``).
+
+    The file is written by ``build`` after each data update and loaded once
+    per process; other processes pick up a rebuilt file within
+    ``RELOAD_INTERVAL`` seconds.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.path = os.path.join(store_dir, ADVICE_SNAPSHOT_FILENAME)
+        self.snapshot = None
+        self._file_stamp = None
+        self._last_check = None
+        self._lock = threading.Lock()
+
+    def read(self):
+        """Snapshot on disk, or None"""
+        try:
+            with open(self.path, 'r') as f:
+                return AdviceSnapshot.from_json(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def current(self):
+        """The loaded snapshot, reloaded when the file changed since the last check"""
+        now = time.monotonic()
+        if self._last_check is not None and now - self._last_check < RELOAD_INTERVAL:
+            return self.snapshot
+        with self._lock:
+            self._last_check = now
+            try:
+                stat = os.stat(self.path)
+                stamp = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                stamp = None
+            if stamp != self._file_stamp:
+                self.snapshot = self.read() if stamp is not None else None
+                self._file_stamp = stamp
+        return self.snapshot
+
+    def get(self, rel_path, source_stats, analysis_period=30):
+        """Current entry (``advice``, ``insights``) for a CSV, or None when missing or stale"""
+        snapshot = self.current()
+        return None if snapshot is None else snapshot.get(rel_path, source_stats, analysis_period)
+
+    def put(self, snapshot):
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot.to_json(), f, default=_json_value)
+        os.replace(tmp_path, self.path)
+        with self._lock:
+            self.snapshot = snapshot
+            stat = os.stat(self.path)
+            self._file_stamp = (stat.st_mtime_ns, stat.st_size)
+            self._last_check = time.monotonic()
+
+    def build(self, analyzer, analysis_period=30, workers=None, force=False):
+        """Write advice and insight texts for every catalog symbol.
+
+        Entries whose CSV is unchanged since the last build are kept; the
+        rest are computed with ``generate_investment_advice_batch`` with the
+        advice snapshot turned off, so nothing is copied from it. Symbols
+        whose advice fails are left out and served live.
+        """
+        catalog = analyzer.catalog
+        catalog.refresh()
+        previous = None if force else self.read()
+        if previous is not None and previous.analysis_period != analysis_period:
+            previous = None
+
+        entries = {}
+        pending = {}
+        for symbol, entry in sorted(catalog.entries.items()):
+            rel_path = entry['file']
+            stats = catalog.files.get(rel_path)
+            if stats is None:
+                continue
+            kept = None if previous is None else previous.get(rel_path, stats, analysis_period)
+            if kept is not None:
+                entries[rel_path] = kept
+            else:
+                pending[symbol] = (rel_path, stats)
+
+        failed = 0
+        # Compute from the data, not from the snapshot being replaced (``force`` recomputes current entries)
+        analyzer.use_advice_snapshot = False
+        try:
+            advice = analyzer.generate_investment_advice_batch(list(pending), analysis_period, workers=workers)
+        finally:
+            analyzer.use_advice_snapshot = True
+        for symbol, (rel_path, stats) in pending.items():
+            result = advice[symbol]
+            if 'error' in result:
+                print(f"Failed to snapshot advice for {symbol}: {result['error']}")
+                failed += 1
+                continue
+            entries[rel_path] = {
+                'mtime_ns': stats['mtime_ns'],
+                'size': stats['size'],
+                'advice': result,
+                'insights': {question_type: analyzer.format_investment_insight(result, question_type)
+                             for question_type in QUESTION_TYPES}
+            }
+
+        self.put(AdviceSnapshot(entries, analysis_period, datetime.now().isoformat()))
+        return {'computed': len(pending) - failed, 'kept': len(entries) - len(pending) + failed,
+                'failed': failed}
+
+
+def get_advice_snapshot_store(store_dir):
+    """Process-wide advice snapshot store for a store directory"""
+    key = os.path.abspath(store_dir)
+    store = _advice_snapshots.get(key)
+    if store is None:
+        with _advice_snapshots_lock:
+            store = _advice_snapshots.get(key)
+            if store is None:
+                store = AdviceSnapshotStore(key)
+                _advice_snapshots[key] = store
+    return store
+
+
+def check(analyzer, symbols=None):
+    """Compare snapshot-served advice and insights with computing them without the advice snapshot"""
+    symbols = symbols or analyzer.catalog.symbols()
+    mismatches = []
+    for symbol in symbols:
+        served = analyzer.analyze_question(symbol, 'general')
+        analyzer.use_advice_snapshot = False
+        try:
+            live = analyzer.generate_investment_advice(symbol)
+        finally:
+            analyzer.use_advice_snapshot = True
+        if 'error' in live:
+            continue
+        ours = {key: value for key, value in served['advice'].items() if key != 'timestamp'}
+        expected = {key: value for key, value in live.items() if key != 'timestamp'}
+        if ours != expected:
+            mismatches.append(f"{symbol}: advice differs")
+        for question_type in QUESTION_TYPES:
+            if analyzer.get_investment_insight(symbol, question_type) != \
+                    analyzer.format_investment_insight(live, question_type):
+                mismatches.append(f"{symbol}: {question_type} insight differs")
+    return mismatches, len(symbols)
+
+
+def main():
+    from .stock_analyzer import SIGNAL_INDICATORS, StockAnalyzer
+
+    parser = argparse.ArgumentParser(description="Build, check or benchmark the precomputed advice snapshot")
+    parser.add_argument('command', choices=['build', 'check', 'bench'])
+    parser.add_argument('--data-dir', default=None)
+    parser.add_argument('--period', type=int, default=30)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--force', action='store_true', help="Recompute every symbol")
+    args = parser.parse_args()
+
+    analyzer = StockAnalyzer(get_catalog(args.data_dir).data_dir)
+    store = analyzer.advice_snapshot
+    if args.command == 'build':
+        start = time.perf_counter()
+        # Advice reads the indicator snapshots, so bring them up to date first
+        indicators = analyzer.snapshots.build(analyzer, SIGNAL_INDICATORS, force=args.force)
+        summary = store.build(analyzer, args.period, args.workers, args.force)
+        print(f"Indicator snapshots: built {indicators['built']}, extended {indicators['extended']}, "
+              f"skipped {indicators['skipped']}; advice: computed {summary['computed']}, kept {summary['kept']}, "
+              f"failed {summary['failed']} in {time.perf_counter() - start:.2f}s -> {store.path}")
+        return
+
+    if args.command == 'check':
+        mismatches, checked = check(analyzer)
+        for mismatch in mismatches:
+            print(f"MISMATCH {mismatch}")
+        print(f"{checked} symbols: {len(mismatches)} mismatches between snapshot and live advice")
+        if mismatches:
+            sys.exit(1)
+        return
+
+    symbols = analyzer.catalog.symbols()
+    timings = {}
+    # Advice snapshot; indicator snapshots (advice memoized per period); neither
+    for label, use_advice, use_indicators, rounds in (('advice snapshot', True, True, 50),
+                                                       ('indicator snapshot', False, True, 50),
+                                                       ('computed', False, False, 1)):
+        analyzer.use_advice_snapshot = use_advice
+        analyzer.use_snapshots = use_indicators
+        analyzer.analysis_cache.clear()
+        for symbol in symbols:
+            analyzer.analyze_question(symbol, 'should_i_buy')
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for symbol in symbols:
+                analyzer.analyze_question(symbol, 'should_i_buy')
+        timings[label] = (time.perf_counter() - start) / (rounds * len(symbols))
+    analyzer.use_advice_snapshot = analyzer.use_snapshots = True
+    print("analyze_question per request: " + ", ".join(f"{label} {seconds * 1e6:.1f} us"
+                                                       for label, seconds in timings.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+import argparse
+import math
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from . import batch_indicators
+from .screener import RECOMMENDATIONS, TRENDS, bollinger_codes, recommendation_codes, risk_scores, trend_codes
+
+# Bars skipped at the start of every history before the rule is evaluated,
+# so SMA_50-length warmups and the EMA start-up transient are behind us
+BACKTEST_WARMUP_BARS = 60
+# Symbols evaluated per vectorized pass; bounds the size of the bar matrices
+CHUNK_SYMBOLS = 32
+DEFAULT_HORIZON = 5
+# Thresholds of the advice rule (``analyze_trend``, ``_build_advice``, ``_calculate_risk_score``)
+DEFAULT_RULES = {
+    'trend_weak': 2,
+    'trend_strong': 5,
+    'rsi_oversold': 30,
+    'rsi_overbought': 70,
+    'volume_spike': 1.5,
+    'volatility_tiers': (20, 30, 50),
+}
+
+
+def _right_aligned(arrays):
+    width = max(len(values) for values in arrays)
+    out = np.full((len(arrays), width), np.nan)
+    for i, values in enumerate(arrays):
+        out[i, width - len(values):] = values
+    return out
+
+
+def signal_inputs(close, volume, analysis_periods=(30,)):
+    """Everything the rule reads that does not depend on its thresholds, for every bar (symbols x bars).
+
+    Crossovers, the SMA and Bollinger positions are final; RSI, the volume
+    ratio to its 5-bar mean, and each period's price change and volatility
+    are kept as values so thresholds can be applied cheaply afterwards.
+    Rows are right-aligned with NaN padding in front.
+    """
+    indicators = batch_indicators.compute_indicators(close, volume)
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        macd, signal = indicators['MACD'], indicators['MACD_Signal']
+        macd_bullish = np.zeros(close.shape, dtype=bool)
+        macd_bearish = np.zeros(close.shape, dtype=bool)
+        macd_bullish[:, 1:] = (macd[:, :-1] <= signal[:, :-1]) & (macd[:, 1:] > signal[:, 1:])
+        macd_bearish[:, 1:] = (macd[:, :-1] >= signal[:, :-1]) & (macd[:, 1:] < signal[:, 1:])
+        inputs = {
+            'macd_bullish': macd_bullish,
+            'macd_bearish': macd_bearish,
+            'price_above_sma': close > indicators['SMA_20'],
+            'bollinger': bollinger_codes(close, indicators['BB_Upper'], indicators['BB_Lower']),
+            'rsi': indicators['RSI'],
+            'volume_ratio': volume / batch_indicators.rolling_mean(volume, 5),
+            'periods': {}
+        }
+
+        returns = np.full(close.shape, np.nan)
+        returns[:, 1:] = close[:, 1:] / close[:, :-1] - 1
+        for period in analysis_periods:
+            lag = period - 1
+            start = np.full(close.shape, np.nan)
+            start[:, lag:] = close[:, :close.shape[1] - lag]
+            volatility = (batch_indicators.rolling_std(returns, lag) * np.sqrt(252) * 100 if lag >= 2
+                          else np.full(close.shape, np.nan))
+            inputs['periods'][period] = {'price_change_pct': (close - start) / start * 100, 'volatility': volatility}
+    return inputs
+
+
+def apply_rules(inputs, analysis_period=30, rules=None):
+    """Trend, recommendation and risk codes from ``signal_inputs`` under ``rules`` (default: the advice rule)"""
+    rules = dict(DEFAULT_RULES, **(rules or {}))
+    period = inputs['periods'][analysis_period]
+    with np.errstate(invalid='ignore'):
+        trend = trend_codes(period['price_change_pct'], rules['trend_weak'], rules['trend_strong'])
+        rsi_overbought = inputs['rsi'] > rules['rsi_overbought']
+        rsi_oversold = inputs['rsi'] < rules['rsi_oversold']
+        volume_spike = inputs['volume_ratio'] > rules['volume_spike']
+    recommendation = recommendation_codes(trend, inputs['macd_bullish'], inputs['macd_bearish'], rsi_overbought,
+                                          rsi_oversold, inputs['price_above_sma'], volume_spike, inputs['bollinger'])
+    risk = risk_scores(period['volatility'], trend, rsi_overbought, rsi_oversold, volume_spike,
+                       rules['volatility_tiers'])
+    return {'trend': trend, 'recommendation': recommendation, 'risk_score': risk}
+
+
+def rule_history(close, volume, analysis_period=30, rules=None):
+    """Trend, risk score and recommendation codes for every bar of every row (symbols x bars).
+
+    Bar t sees only bars up to t and evaluates the same rules as
+    ``generate_investment_advice`` with ``analysis_period`` would on that
+    day.
+    """
+    return apply_rules(signal_inputs(close, volume, (analysis_period,)), analysis_period, rules)
+
+
+def forward_returns(close, horizon=DEFAULT_HORIZON):
+    """Return from each close to the close ``horizon`` bars later, and to the next close (0 where unknown)"""
+    bars = close.shape[1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        forward = np.full(close.shape, np.nan)
+        forward[:, :bars - horizon] = close[:, horizon:] / close[:, :bars - horizon] - 1
+        next_return = np.zeros(close.shape)
+        next_return[:, :-1] = np.nan_to_num(close[:, 1:] / close[:, :-1] - 1)
+    return forward, next_return
+
+
+def evaluate(close, recommendation, valid, horizon=DEFAULT_HORIZON, allow_short=False, returns=None):
+    """Per-row hit rate, forward returns, strategy return, drawdown and exposure of a recommendation history.
+
+    A BUY/STRONG_BUY at close t is a hit when the close ``horizon`` bars
+    later is higher, a SELL/STRONG_SELL when it is lower. The strategy
+    holds the position the recommendation implies from close t to close
+    t+1: long on buys, short on sells when ``allow_short``, flat otherwise.
+    ``returns`` takes a precomputed ``forward_returns(close, horizon)``.
+    """
+    rows = close.shape[0]
+    forward, next_return = returns if returns is not None else forward_returns(close, horizon)
+
+    buy = valid & (recommendation >= 3)
+    sell = valid & (recommendation <= 1)
+    scored = ~np.isnan(forward)
+    buy_calls, sell_calls = (buy & scored).sum(axis=1), (sell & scored).sum(axis=1)
+    buy_hits = (buy & scored & (forward > 0)).sum(axis=1)
+    sell_hits = (sell & scored & (forward < 0)).sum(axis=1)
+
+    position = buy.astype(np.float64)
+    if allow_short:
+        position -= sell
+    strategy = position * next_return
+    equity = np.cumprod(1 + strategy, axis=1)
+    drawdown = equity / np.maximum.accumulate(equity, axis=1) - 1
+    trades = (np.abs(np.diff(position, axis=1, prepend=0.0)) > 0).sum(axis=1)
+
+    first = np.argmax(valid, axis=1)
+    evaluated = valid.sum(axis=1)
+    row_index = np.arange(rows)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'bars': evaluated,
+            'calls': buy_calls + sell_calls,
+            'hits': buy_hits + sell_hits,
+            'hit_rate': (buy_hits + sell_hits) / (buy_calls + sell_calls),
+            'buy_calls': buy_calls,
+            'buy_hits': buy_hits,
+            'buy_hit_rate': buy_hits / buy_calls,
+            'sell_calls': sell_calls,
+            'sell_hits': sell_hits,
+            'sell_hit_rate': sell_hits / sell_calls,
+            'avg_buy_forward_return': np.where(buy & scored, forward, 0).sum(axis=1) / buy_calls,
+            'avg_sell_forward_return': np.where(sell & scored, forward, 0).sum(axis=1) / sell_calls,
+            'total_return': equity[:, -1] - 1,
+            'max_drawdown': drawdown.min(axis=1),
+            'exposure': (position != 0).sum(axis=1) / evaluated,
+            'trades': trades,
+            'buy_and_hold_return': close[:, -1] / close[row_index, first] - 1
+        }
+
+
+def backtest_frames(frames, analysis_period=30, horizon=DEFAULT_HORIZON, allow_short=False):
+    """``{symbol: metrics}`` for ``{symbol: price frame}``, in vectorized chunks of ``CHUNK_SYMBOLS``"""
+    results = {}
+    symbols = [symbol for symbol, df in frames.items() if df is not None and len(df) > BACKTEST_WARMUP_BARS]
+    for start in range(0, len(symbols), CHUNK_SYMBOLS):
+        chunk = symbols[start:start + CHUNK_SYMBOLS]
+        close = _right_aligned([frames[symbol]['Close'].to_numpy(dtype=np.float64) for symbol in chunk])
+        volume = _right_aligned([frames[symbol]['Volume'].to_numpy(dtype=np.float64) for symbol in chunk])
+        history = rule_history(close, volume, analysis_period)
+
+        first = batch_indicators.first_bars(close)
+        warmup = max(BACKTEST_WARMUP_BARS, analysis_period - 1)
+        valid = np.arange(close.shape[1]) >= (first + warmup)[:, None]
+        metrics = evaluate(close, history['recommendation'], valid, horizon, allow_short)
+
+        for i, symbol in enumerate(chunk):
+            row = {name: _value(metrics[name][i]) for name in metrics}
+            dates = frames[symbol].index
+            years = (dates[-1] - dates[min(warmup, len(dates) - 1)]).days / 365.25
+            row['annual_return'] = ((1 + row['total_return']) ** (1 / years) - 1
+                                    if years > 0 and row['total_return'] > -1 else None)
+            row['start_date'] = dates[min(warmup, len(dates) - 1)].date().isoformat()
+            row['end_date'] = dates[-1].date().isoformat()
+            row['last_recommendation'] = RECOMMENDATIONS[history['recommendation'][i, -1]]
+            results[symbol] = row
+    return results
+
+
+def _value(value):
+    if isinstance(value, (np.integer, int)):
+        return int(value)
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def _backtest_worker(symbols, analysis_period, horizon, allow_short):
+    from .stock_analyzer import worker_analyzer
+    analyzer = worker_analyzer()
+    return backtest_frames({symbol: analyzer.load_stock_data(symbol) for symbol in symbols},
+                           analysis_period, horizon, allow_short)
+
+
+class BacktestReport:
+    """Per-symbol and per-category results of a backtest run"""
+
+    def __init__(self, symbols, categories, params):
+        self.symbols = symbols
+        self.categories = categories
+        self.params = params
+
+    def to_frame(self):
+        """Per-symbol metrics as a DataFrame indexed by symbol"""
+        return pd.DataFrame.from_dict(self.symbols, orient='index').rename_axis('Symbol')
+
+    def category_frame(self):
+        return pd.DataFrame.from_dict(self.categories, orient='index').rename_axis('Category')
+
+
+def aggregate_categories(results, memberships):
+    """Pooled hit rates and mean/median returns and drawdowns per category"""
+    categories = {}
+    for category, members in sorted(memberships.items()):
+        rows = [results[symbol] for symbol in members if symbol in results]
+        if not rows:
+            continue
+        calls = sum(row['calls'] for row in rows)
+        hits = sum((row['hit_rate'] or 0) * row['calls'] for row in rows)
+        categories[category] = {
+            'symbols': len(rows),
+            'calls': calls,
+            'hit_rate': hits / calls if calls else None,
+            'mean_total_return': float(np.mean([row['total_return'] for row in rows])),
+            'mean_buy_and_hold_return': float(np.mean([row['buy_and_hold_return'] for row in rows])),
+            'median_max_drawdown': float(np.median([row['max_drawdown'] for row in rows])),
+            'mean_exposure': float(np.mean([row['exposure'] for row in rows]))
+        }
+    return categories
+
+
+def run_backtest(analyzer, symbols=None, analysis_period=30, horizon=DEFAULT_HORIZON, allow_short=False,
+                 workers=None):
+    """Backtest the recommendation rule over every symbol's full history.
+
+    Symbols are split into one chunk per worker and run in the shared
+    worker pool when ``workers`` > 1, otherwise in this process.
+    """
+    from .stock_analyzer import DEFAULT_BATCH_WORKERS, discard_worker_pool, get_worker_pool
+
+    symbols = list(symbols or analyzer.catalog.symbols())
+    workers = DEFAULT_BATCH_WORKERS if workers is None else workers
+    results = {}
+    if workers > 1 and len(symbols) > CHUNK_SYMBOLS:
+        pool = get_worker_pool(analyzer.data_dir, analyzer.indicator_backend, workers)
+        chunks = [symbols[i::workers] for i in range(workers)]
+        try:
+            for future in [pool.submit(_backtest_worker, chunk, analysis_period, horizon, allow_short)
+                           for chunk in chunks if chunk]:
+                results.update(future.result())
+        except Exception as e:
+            print(f"Backtest pool failed, running in-process: {e}")
+            discard_worker_pool(pool)
+            results = {}
+    if not results:
+        results = backtest_frames({symbol: analyzer.load_stock_data(symbol) for symbol in symbols},
+                                  analysis_period, horizon, allow_short)
+
+    memberships = {category: analyzer.catalog.symbols(category) for category in analyzer.catalog.categories()}
+    params = {'analysis_period': analysis_period, 'horizon': horizon, 'allow_short': allow_short}
+    return BacktestReport(results, aggregate_categories(results, memberships), params)
+
+
+def check(analyzer, symbols=None, dates_per_symbol=25, analysis_period=30):
+    """Compare the vectorized rule history with ``_build_advice`` on truncated histories"""
+    from .stock_analyzer import SIGNAL_INDICATORS
+
+    mismatches = []
+    checked = 0
+    for symbol in symbols or analyzer.catalog.symbols()[::8]:
+        df = analyzer.load_stock_data(symbol)
+        if df is None or len(df) <= BACKTEST_WARMUP_BARS:
+            continue
+        history = rule_history(df['Close'].to_numpy(dtype=np.float64)[None, :],
+                               df['Volume'].to_numpy(dtype=np.float64)[None, :], analysis_period)
+        full = analyzer.calculate_technical_indicators(df, SIGNAL_INDICATORS)
+        for t in np.linspace(BACKTEST_WARMUP_BARS, len(df) - 1, dates_per_symbol).astype(int):
+            advice = analyzer._build_advice(symbol, full.iloc[:t + 1], analysis_period)
+            ours = (history['trend'][0, t], history['recommendation'][0, t], history['risk_score'][0, t])
+            expected = (TRENDS.index(advice['trend']), RECOMMENDATIONS.index(advice['recommendation']),
+                        advice['risk_score'])
+            if ours != expected:
+                mismatches.append(f"{symbol} {df.index[t].date()}: {ours} != {expected}")
+            checked += 1
+    return mismatches, checked
+
+
+def main():
+    from .stock_analyzer import StockAnalyzer
+
+    parser = argparse.ArgumentParser(description="Backtest the investment advice rule over full price histories")
+    parser.add_argument('command', choices=['run', 'check'])
+    parser.add_argument('--symbols', nargs='*', default=None)
+    parser.add_argument('--period', type=int, default=30)
+    parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON, help="Bars ahead a call is scored on")
+    parser.add_argument('--allow-short', action='store_true')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--csv', default=None, help="Write per-symbol metrics to this CSV")
+    args = parser.parse_args()
+
+    analyzer = StockAnalyzer()
+    if args.command == 'check':
+        mismatches, checked = check(analyzer, args.symbols, analysis_period=args.period)
+        for mismatch in mismatches:
+            print(f"MISMATCH {mismatch} (trend, recommendation, risk)")
+        print(f"{checked - len(mismatches)} of {checked} symbol-dates match _build_advice")
+        if mismatches:
+            sys.exit(1)
+        return
+
+    start = time.perf_counter()
+    report = run_backtest(analyzer, args.symbols, args.period, args.horizon, args.allow_short, args.workers)
+    elapsed = time.perf_counter() - start
+    bars = sum(row['bars'] for row in report.symbols.values())
+    print(f"Backtested {len(report.symbols)} symbols ({bars} symbol-days) in {elapsed:.2f}s")
+
+    with pd.option_context('display.width', 200, 'display.max_columns', 20, 'display.float_format', '{:.3f}'.format):
+        print(report.category_frame())
+    if args.csv:
+        report.to_frame().to_csv(args.csv)
+        print(f"Per-symbol metrics written to {os.path.abspath(args.csv)}")
+
+
+if __name__ == '__main__':
+    main()
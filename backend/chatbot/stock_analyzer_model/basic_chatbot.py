@@ -7,6 +7,7 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(current_dir))
 
 
+from .correlation import describe as describe_correlation
 from .stock_analyzer import StockAnalyzer
 
 class BasicChatbot:
@@ -307,11 +308,7 @@ class BasicChatbot:
         self.conversation_history = []
 
     def get_available_assets(self):
-        return [
-            'AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'META', 'NVDA', 'NFLX',
-            'BTC', 'ETH', 'ADA', 'DOT', 'LINK', 'LTC', 'BCH', 'UNI', 'ATOM',
-            'EUR/USD', 'GBP/USD', 'USD/JPY', 'AUD/USD', 'USD/CAD'
-        ] 
+        return self.analyzer.catalog.symbols()
 
     def _classify_question_type(self, question):
         """Classify question type using keyword matching (basic version)"""
@@ -464,9 +461,10 @@ class BasicChatbot:
         
                 
         analysis_parts = []
+        advice = self.analyzer.generate_investment_advice_batch(watchlist_items)
         for symbol in watchlist_items:
             try:
-                data = self.analyzer.generate_investment_advice(symbol)
+                data = advice.get(symbol)
                 if data and 'error' not in data:
                     analysis = self._format_basic_analysis(data)
                     prediction = self._generate_market_prediction(data, symbol)
@@ -476,6 +474,14 @@ class BasicChatbot:
             except Exception as e:
                 analysis_parts.append(f"**{symbol}:** Error analyzing this stock.\n")
         
+        try:
+            correlation = self.analyzer.correlation_summary(watchlist_items)
+        except Exception as e:
+            print(f"Correlation lookup failed: {e}")
+            correlation = None
+        if correlation:
+            analysis_parts.append(f"**Correlation:** {describe_correlation(correlation)}\n")
+        
         return (
             f"**Multi-Stock Analysis**\n\n"
             f"Here's an analysis of your watchlist stocks:\n\n"
@@ -0,0 +1,180 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from .market_catalog import get_catalog
+from .price_store import PRICE_COLUMNS
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+FLOAT_COLUMNS = PRICE_COLUMNS[:-1]
+
+# Indicators compared by the error-bound check, with the kind of error reported
+CHECKED_INDICATORS = ['SMA_20', 'SMA_50', 'EMA_12', 'EMA_26', 'MACD', 'MACD_Signal',
+                      'RSI', 'BB_Upper', 'BB_Lower', 'Volume_Ratio']
+ABSOLUTE_ERROR_INDICATORS = {'MACD', 'MACD_Signal', 'RSI'}
+
+
+def dates_to_days(dates):
+    """int32 day offsets from 1970-01-01 for datetime64 values"""
+    return (np.asarray(dates).astype('datetime64[D]') - EPOCH).astype(np.int32)
+
+
+def days_to_dates(days):
+    """datetime64[ns] values for int32 day offsets"""
+    return (EPOCH + np.asarray(days).astype('timedelta64[D]')).astype('datetime64[ns]')
+
+
+class CompactSeries:
+    """Opt-in compact form of one symbol's daily bars.
+
+    Prices are float32 in a (4, rows) Close/High/Low/Open block, volume is
+    int64 and dates are int32 day offsets, about 28 bytes per bar against
+    48 for the float64 DataFrame (before indicators). float32 rounding
+    bounds the price error at 2**-24 (6e-8) relative; indicators computed
+    from the compact prices stay within the bounds that
+    ``python -m stock_analyzer_model.compact_series check`` measures over
+    the universe (documented in the README).
+    """
+
+    __slots__ = ('days', 'prices', 'volume')
+
+    def __init__(self, days, prices, volume):
+        self.days = days
+        self.prices = prices
+        self.volume = volume
+
+    @classmethod
+    def from_frame(cls, df):
+        prices = np.empty((len(FLOAT_COLUMNS), len(df)), dtype=np.float32)
+        for i, col in enumerate(FLOAT_COLUMNS):
+            prices[i] = df[col].values
+        return cls(dates_to_days(df.index.values), prices, df['Volume'].values.astype(np.int64))
+
+    def __len__(self):
+        return len(self.days)
+
+    @property
+    def nbytes(self):
+        return self.days.nbytes + self.prices.nbytes + self.volume.nbytes
+
+    @property
+    def dates(self):
+        return days_to_dates(self.days)
+
+    def column(self, name):
+        if name == 'Volume':
+            return self.volume
+        return self.prices[FLOAT_COLUMNS.index(name)]
+
+    @property
+    def close(self):
+        return self.prices[0]
+
+    def tail(self, rows):
+        """Last ``rows`` bars (views, no copy)"""
+        return CompactSeries(self.days[-rows:], self.prices[:, -rows:], self.volume[-rows:])
+
+    def to_frame(self, dtype=np.float64):
+        """Date-indexed OHLCV frame with prices cast to ``dtype``"""
+        data = {col: self.prices[i].astype(dtype) for i, col in enumerate(FLOAT_COLUMNS)}
+        data['Volume'] = self.volume
+        return pd.DataFrame(data, index=pd.DatetimeIndex(self.dates, name='Date'))
+
+
+def error_bounds(analyzer, symbols=None):
+    """Worst compact-vs-float64 error per indicator over the universe.
+
+    Relative error for price-scaled indicators, absolute error for MACD
+    (which crosses zero) and RSI (in points).
+    """
+    worst = {'prices': 0.0}
+    worst.update({name: 0.0 for name in CHECKED_INDICATORS})
+    for symbol in symbols or analyzer.catalog.symbols():
+        full = analyzer.load_stock_data(symbol)
+        if full is None or full.empty:
+            continue
+        compact = CompactSeries.from_frame(full)
+        reference = analyzer.calculate_technical_indicators(full)
+        approx = analyzer.calculate_technical_indicators(compact.to_frame())
+
+        prices = full[FLOAT_COLUMNS].values
+        worst['prices'] = max(worst['prices'], float(np.max(np.abs(compact.prices.T - prices) / prices)))
+        for name in CHECKED_INDICATORS:
+            expected = reference[name].values
+            actual = approx[name].values
+            valid = np.isfinite(expected) & np.isfinite(actual)
+            if not valid.any():
+                continue
+            error = np.abs(actual[valid] - expected[valid])
+            if name not in ABSOLUTE_ERROR_INDICATORS:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    error = error / np.abs(expected[valid])
+            worst[name] = max(worst[name], float(np.nanmax(error)))
+    return worst
+
+
+def benchmark(analyzer, repeat=3):
+    """Memory of the universe as float64 frames vs compact series, and a returns pass over each"""
+    symbols = analyzer.catalog.symbols()
+    frames = [analyzer.load_stock_data(symbol) for symbol in symbols]
+    frames = [df for df in frames if df is not None]
+    compact = [CompactSeries.from_frame(df) for df in frames]
+
+    frame_bytes = sum(int(df.memory_usage(index=True).sum()) for df in frames)
+    indicator_bytes = sum(int(analyzer.calculate_technical_indicators(df.copy()).memory_usage(index=True).sum())
+                          for df in frames)
+    compact_bytes = sum(series.nbytes for series in compact)
+
+    def daily_returns(arrays):
+        for values in arrays:
+            values[1:] / values[:-1] - 1
+
+    timings = {}
+    for label, arrays in (('float64', [df['Close'].values for df in frames]),
+                          ('float32', [series.close for series in compact])):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            daily_returns(arrays)
+            best = min(best, time.perf_counter() - start)
+        timings[label] = best
+
+    return {
+        'symbols': len(frames),
+        'rows': sum(len(df) for df in frames),
+        'frame_bytes': frame_bytes,
+        'indicator_frame_bytes': indicator_bytes,
+        'compact_bytes': compact_bytes,
+        'float64_seconds': timings['float64'],
+        'float32_seconds': timings['float32']
+    }
+
+
+def main():
+    from .stock_analyzer import StockAnalyzer
+
+    parser = argparse.ArgumentParser(description="Error bound and benchmark of the compact price representation")
+    parser.add_argument('command', choices=['check', 'bench'])
+    parser.add_argument('--data-dir', default=None)
+    args = parser.parse_args()
+
+    analyzer = StockAnalyzer(get_catalog(args.data_dir).data_dir)
+    if args.command == 'check':
+        for name, error in error_bounds(analyzer).items():
+            kind = 'absolute' if name in ABSOLUTE_ERROR_INDICATORS else 'relative'
+            print(f"{name:<14} max {kind} error {error:.3e}")
+        return
+
+    result = benchmark(analyzer)
+    print(f"{result['symbols']} symbols, {result['rows']} bars")
+    print(f"float64 frames      {result['frame_bytes'] / 1e6:8.1f} MB "
+          f"({result['indicator_frame_bytes'] / 1e6:.1f} MB with indicators)")
+    print(f"compact series      {result['compact_bytes'] / 1e6:8.1f} MB")
+    print(f"daily returns       float64 {result['float64_seconds'] * 1000:.2f} ms, "
+          f"float32 {result['float32_seconds'] * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+import argparse
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from .price_panel import get_price_panel
+
+DEFAULT_WINDOW = 90
+# Rows of the matrix computed per block of matrix products
+CORRELATION_BLOCK = 64
+
+_matrices = {}
+_matrices_lock = threading.Lock()
+
+
+def window_returns(panel, window):
+    """Daily returns of every symbol over the last ``window`` equity-calendar days (symbols x days).
+
+    Returns are taken between each symbol's own consecutive bars, with the
+    price carried over days it did not trade, so a crypto Monday return
+    covers Friday to Monday like an equity's. Days without a bar are NaN.
+    """
+    equity_days = panel.mask[~panel.crypto].any(axis=0) if not panel.crypto.all() else np.ones(panel.shape[1], bool)
+    # The window's days plus the one before it; carrying prices over the full calendar
+    # gives the same values on equity days as carrying them over the equity calendar
+    days = np.flatnonzero(equity_days)[-(window + 1):]
+    close = panel.ffill('Close')[:, days]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = close[:, 1:] / close[:, :-1] - 1
+    returns[~panel.mask[:, days[1:]]] = np.nan
+    return returns, panel.dates[days[1:]]
+
+
+def pairwise_moments(returns, min_periods, block=CORRELATION_BLOCK):
+    """Covariance, correlation and overlap counts over pairwise-complete observations, like ``DataFrame.corr``.
+
+    Each block of rows is reduced against every column with six matrix
+    products (counts, both sums, both sums of squares, cross products).
+    Values are centered on each symbol's own mean first to limit
+    cancellation in the sum-of-products form.
+    """
+    present = ~np.isnan(returns)
+    bars = present.sum(axis=1, keepdims=True)
+    means = np.where(present, returns, 0.0).sum(axis=1, keepdims=True) / np.maximum(bars, 1)
+    centered = np.where(present, returns - means, 0.0)
+    squared = centered * centered
+    weights = present.astype(np.float64)
+
+    symbols = len(returns)
+    covariance = np.empty((symbols, symbols))
+    correlation = np.empty((symbols, symbols))
+    counts = np.empty((symbols, symbols), dtype=np.int64)
+    for start in range(0, symbols, block):
+        rows = slice(start, start + block)
+        n = weights[rows] @ weights.T
+        sum_x = centered[rows] @ weights.T
+        sum_y = weights[rows] @ centered.T
+        sum_xx = squared[rows] @ weights.T
+        sum_yy = weights[rows] @ squared.T
+        sum_xy = centered[rows] @ centered.T
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = (sum_xy - sum_x * sum_y / n) / (n - 1)
+            var_x = (sum_xx - sum_x * sum_x / n) / (n - 1)
+            var_y = (sum_yy - sum_y * sum_y / n) / (n - 1)
+            corr = cov / np.sqrt(var_x * var_y)
+        short = n < max(min_periods, 2)
+        cov[short] = np.nan
+        corr[short] = np.nan
+        covariance[rows] = cov
+        correlation[rows] = np.clip(corr, -1.0, 1.0)
+        counts[rows] = n
+
+    diagonal = np.arange(symbols)
+    correlation[diagonal, diagonal] = np.where(np.isnan(covariance[diagonal, diagonal]), np.nan, 1.0)
+    return covariance, correlation, counts
+
+
+class CorrelationMatrix:
+    """Correlation and covariance of daily returns over a trailing window, with their overlap counts"""
+
+    def __init__(self, symbols, correlation, covariance, observations, window, end_date, source_key=None):
+        self.symbols = symbols
+        self.correlation = correlation
+        self.covariance = covariance
+        self.observations = observations
+        self.window = window
+        self.end_date = end_date
+        self.source_key = source_key
+        self._positions = {symbol: i for i, symbol in enumerate(symbols)}
+        for array in (correlation, covariance, observations):
+            array.flags.writeable = False
+
+    @classmethod
+    def from_panel(cls, panel, window=DEFAULT_WINDOW, min_periods=None):
+        returns, dates = window_returns(panel, window)
+        covariance, correlation, counts = pairwise_moments(returns, min_periods or window // 2)
+        end_date = str(dates[-1])[:10] if len(dates) else None
+        return cls(list(panel.symbols), correlation, covariance, counts, window, end_date, panel.source_key)
+
+    def select(self, symbols):
+        """Sub-matrix for ``symbols`` (in their order; unknown symbols are skipped)"""
+        symbols = [symbol for symbol in dict.fromkeys(s.upper() for s in symbols) if symbol in self._positions]
+        rows = np.array([self._positions[symbol] for symbol in symbols], dtype=np.intp)
+        grid = np.ix_(rows, rows)
+        return CorrelationMatrix(symbols, self.correlation[grid], self.covariance[grid], self.observations[grid],
+                                 self.window, self.end_date, self.source_key)
+
+    def frame(self, kind='correlation'):
+        """``correlation``, ``covariance`` or ``observations`` as a labelled DataFrame"""
+        index = pd.Index(self.symbols, name='Symbol')
+        return pd.DataFrame(getattr(self, kind), index=index, columns=index.rename(None))
+
+    def pairs(self):
+        """Every distinct pair with a correlation, most correlated first"""
+        upper = np.triu_indices(len(self.symbols), k=1)
+        values = self.correlation[upper]
+        order = np.argsort(-values, kind='stable')
+        return [(self.symbols[upper[0][i]], self.symbols[upper[1][i]], float(values[i]))
+                for i in order if not np.isnan(values[i])]
+
+    def summary(self):
+        """Average pairwise correlation and the most and least correlated pairs, for responses"""
+        pairs = self.pairs()
+        if not pairs:
+            return None
+        return {
+            'symbols': self.symbols,
+            'window': self.window,
+            'end_date': self.end_date,
+            'average_correlation': float(np.mean([value for _, _, value in pairs])),
+            'most_correlated': list(pairs[0]),
+            'least_correlated': list(pairs[-1])
+        }
+
+
+def get_correlation_matrix(analyzer, window=DEFAULT_WINDOW, min_periods=None):
+    """Process-wide universe matrix per (window, min_periods), recomputed when the data changes"""
+    panel = get_price_panel(analyzer)
+    key = (analyzer.catalog.data_dir, window, min_periods)
+    matrix = _matrices.get(key)
+    if matrix is None or matrix.source_key != panel.source_key:
+        with _matrices_lock:
+            matrix = _matrices.get(key)
+            if matrix is None or matrix.source_key != panel.source_key:
+                matrix = CorrelationMatrix.from_panel(panel, window, min_periods)
+                # Matrices for older data versions are never served again
+                for stale in [k for k, m in _matrices.items() if m.source_key != panel.source_key]:
+                    del _matrices[stale]
+                _matrices[key] = matrix
+    return matrix
+
+
+def describe(summary):
+    """One-paragraph plain-text description of a correlation summary"""
+    first, second, value = summary['most_correlated']
+    low_first, low_second, low_value = summary['least_correlated']
+    text = (f"Over the last {summary['window']} trading days (to {summary['end_date']}), the average pairwise "
+            f"correlation of daily returns is {summary['average_correlation']:.2f}. "
+            f"Most correlated: {first}/{second} ({value:.2f})")
+    if (low_first, low_second) != (first, second):
+        text += f"; least correlated: {low_first}/{low_second} ({low_value:.2f})"
+    return text + "."
+
+
+def check(analyzer, window=DEFAULT_WINDOW):
+    """Compare the blocked matrices with pandas ``DataFrame.corr`` / ``cov`` on the same returns"""
+    panel = get_price_panel(analyzer)
+    matrix = CorrelationMatrix.from_panel(panel, window)
+    returns, _ = window_returns(panel, window)
+    frame = pd.DataFrame(returns.T, columns=panel.symbols)
+    min_periods = window // 2
+    failures = []
+    for kind, expected in (('correlation', frame.corr(min_periods=min_periods)),
+                           ('covariance', frame.cov(min_periods=min_periods))):
+        ours = getattr(matrix, kind)
+        if not np.allclose(ours, expected.values, rtol=1e-9, atol=1e-12, equal_nan=True):
+            worst = np.nanmax(np.abs(ours - expected.values))
+            failures.append(f"{kind} differs from pandas (max abs error {worst:.3g})")
+    return failures, len(panel.symbols)
+
+
+def main():
+    from .stock_analyzer import StockAnalyzer
+
+    parser = argparse.ArgumentParser(description="Check or benchmark the return correlation service")
+    parser.add_argument('command', choices=['check', 'bench'])
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW)
+    args = parser.parse_args()
+
+    analyzer = StockAnalyzer()
+    if args.command == 'check':
+        failures, symbols = check(analyzer, args.window)
+        for failure in failures:
+            print(f"MISMATCH {failure}")
+        print(f"{symbols} x {symbols} matrices over {args.window} days: {len(failures)} mismatches")
+        if failures:
+            sys.exit(1)
+        return
+
+    panel = get_price_panel(analyzer)
+    returns, _ = window_returns(panel, args.window)
+    frame = pd.DataFrame(returns.T, columns=panel.symbols)
+
+    start = time.perf_counter()
+    CorrelationMatrix.from_panel(panel, args.window)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    frame.corr(min_periods=args.window // 2)
+    frame.cov(min_periods=args.window // 2)
+    pandas_time = time.perf_counter() - start
+
+    watchlist = panel.symbols[::8]
+    get_correlation_matrix(analyzer, args.window)
+    start = time.perf_counter()
+    for _ in range(100):
+        get_correlation_matrix(analyzer, args.window).select(watchlist).summary()
+    cached_time = (time.perf_counter() - start) / 100
+    print(f"{len(panel.symbols)} symbols, {args.window} days: blocked build {build_time * 1000:.1f} ms "
+          f"(pandas corr + cov {pandas_time * 1000:.1f} ms); cached {len(watchlist)}-symbol "
+          f"sub-matrix + summary {cached_time * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
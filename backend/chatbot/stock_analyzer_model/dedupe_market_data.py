@@ -0,0 +1,127 @@
+import argparse
+import hashlib
+import os
+import shutil
+from collections import Counter
+
+from .market_catalog import (DEFAULT_DATA_DIR, HISTORY_SUFFIX, SERIES_DIR, get_catalog, load_membership,
+                             save_membership, scan_history_file)
+
+
+def file_digest(file_path):
+    """sha256 of a file's bytes"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def collect_copies(data_dir):
+    """stem -> every per-category copy with its hash, size and row stats"""
+    copies = {}
+    for category in sorted(os.listdir(data_dir)):
+        category_dir = os.path.join(data_dir, category)
+        if category == SERIES_DIR or category.startswith('.') or not os.path.isdir(category_dir):
+            continue
+        for name in sorted(os.listdir(category_dir)):
+            if not name.endswith(HISTORY_SUFFIX):
+                continue
+            path = os.path.join(category_dir, name)
+            copy = scan_history_file(path)
+            copy.update({
+                'category': category,
+                'path': path,
+                'sha256': file_digest(path),
+                'size': os.path.getsize(path)
+            })
+            copies.setdefault(name[:-len(HISTORY_SUFFIX)], []).append(copy)
+    return copies
+
+
+def choose_canonical(copies):
+    """The copy to keep: the most common content, then most rows, then the latest last date"""
+    votes = Counter(copy['sha256'] for copy in copies)
+    return max(copies, key=lambda copy: (votes[copy['sha256']], copy['rows'], copy['last_date'] or ''))
+
+
+def plan_dedup(data_dir):
+    """Per-stem plan: which copy becomes the series file and which copies diverge from it"""
+    plan = {}
+    for stem, copies in collect_copies(data_dir).items():
+        canonical = choose_canonical(copies)
+        plan[stem] = {
+            'source': canonical['path'],
+            'sha256': canonical['sha256'],
+            'categories': [copy['category'] for copy in copies],
+            'copies': len(copies),
+            'bytes': sum(copy['size'] for copy in copies),
+            'kept_bytes': canonical['size'],
+            'divergent': [
+                {'category': copy['category'], 'rows': copy['rows'], 'last_date': copy['last_date']}
+                for copy in copies if copy['sha256'] != canonical['sha256']
+            ]
+        }
+    return plan
+
+
+def apply_dedup(data_dir, plan):
+    """Move canonical copies into series/, record memberships, then drop the category copies.
+
+    The series files and categories.json are written before any category
+    copy is removed, so an interrupted run leaves a readable tree.
+    """
+    series_dir = os.path.join(data_dir, SERIES_DIR)
+    os.makedirs(series_dir, exist_ok=True)
+
+    membership = load_membership(data_dir) or {}
+    for stem, item in sorted(plan.items()):
+        target = os.path.join(series_dir, f"{stem}{HISTORY_SUFFIX}")
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        shutil.copy2(item['source'], tmp_path)
+        os.replace(tmp_path, target)
+        for category in item['categories']:
+            membership.setdefault(category, []).append(stem)
+    save_membership(data_dir, membership)
+
+    for stem, item in plan.items():
+        for category in item['categories']:
+            os.remove(os.path.join(data_dir, category, f"{stem}{HISTORY_SUFFIX}"))
+    for category in sorted({category for item in plan.values() for category in item['categories']}):
+        category_dir = os.path.join(data_dir, category)
+        if not os.listdir(category_dir):
+            os.rmdir(category_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Collapse per-category history CSV copies into one series file per ticker")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+    parser.add_argument('--apply', action='store_true', help="Rewrite the tree (default: report only)")
+    args = parser.parse_args()
+
+    plan = plan_dedup(args.data_dir)
+    if not plan:
+        print("No per-category history files found; nothing to deduplicate.")
+        return
+
+    copies = sum(item['copies'] for item in plan.values())
+    total = sum(item['bytes'] for item in plan.values())
+    kept = sum(item['kept_bytes'] for item in plan.values())
+    for stem, item in sorted(plan.items()):
+        for copy in item['divergent']:
+            print(f"{stem}: {copy['category']} copy differs from the kept one "
+                  f"({copy['rows']} rows, last {copy['last_date']})")
+    print(f"{copies} files for {len(plan)} tickers: {total / 1e6:.1f} MB -> {kept / 1e6:.1f} MB "
+          f"({copies - len(plan)} duplicates)")
+
+    if args.apply:
+        apply_dedup(args.data_dir, plan)
+        catalog = get_catalog(args.data_dir)
+        catalog.refresh(force=True)
+        print(f"Deduplicated into {os.path.join(args.data_dir, SERIES_DIR)}; "
+              f"catalog has {len(catalog.entries)} symbols in {len(catalog.category_members)} categories")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,18 @@
-import yfinance as yf
+import argparse
+import json
 import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .market_catalog import (DEFAULT_DATA_DIR, HISTORY_SUFFIX, SERIES_DIR, default_store_dir,
+                             load_membership, save_membership)
+from .price_store import PRICE_COLUMNS, read_history_csv
 
 tickers = {
     "Tech": ["AAPL", "MSFT", "GOOGL", "AMZN", "TSLA", "META", "NVDA", "NFLX", "ADBE", "CRM",
@@ -29,21 +42,397 @@ tickers = {
     ]
 }
 
-base_dir = 'market_data'
-os.makedirs(base_dir, exist_ok=True)
+START_DATE = '2000-01-01'
+
+DEFAULT_WORKERS = 8
+DEFAULT_RATE = 4.0  # provider requests per second
+DEFAULT_RETRIES = 3
+BACKOFF_BASE = 1.0  # seconds, doubled per attempt
+FAILURE_QUEUE_FILENAME = 'download_failures.json'
+# Runs a ticker may fail in a row before it is parked as dead (e.g. delisted) and no longer fetched
+MAX_FAILURE_ATTEMPTS = 5
+
+
+class YFinanceProvider:
+    """Daily bars from Yahoo Finance"""
+
+    def fetch(self, ticker, start, end):
+        import yfinance as yf
+
+        data = yf.download(ticker, start=start, end=end, interval='1d', progress=False)
+        if data.empty:
+            return data
+        if isinstance(data.columns, pd.MultiIndex):
+            data.columns = data.columns.get_level_values(0)
+        return data[PRICE_COLUMNS]
+
+
+class CsvFixtureProvider:
+    """Serves bars from a directory of yfinance-format CSVs (tests and offline runs)"""
+
+    def __init__(self, fixture_dir):
+        self.fixture_dir = fixture_dir
+
+    def fetch(self, ticker, start, end):
+        path = os.path.join(self.fixture_dir, f"{ticker.replace('-', '_')}{HISTORY_SUFFIX}")
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=PRICE_COLUMNS)
+        # Round-trip parsing so re-written bars are byte-identical to the fixture
+        data = read_history_csv(path, float_precision='round_trip')
+        return data[(data.index >= pd.Timestamp(start)) & (data.index < pd.Timestamp(end))]
+
+
+class FakeProvider:
+    """Wraps a provider with injected latency and random failures (load testing)"""
+
+    def __init__(self, provider, latency=0.2, jitter=0.1, error_rate=0.1, seed=None):
+        self.provider = provider
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def fetch(self, ticker, start, end):
+        with self._lock:
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self.error_rate
+        time.sleep(delay)
+        if fail:
+            raise ConnectionError(f"Injected failure fetching {ticker}")
+        return self.provider.fetch(ticker, start, end)
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting provider requests per second"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
 
-for category, symbols in tickers.items():
-    category_dir = os.path.join(base_dir, category)
-    os.makedirs(category_dir, exist_ok=True)
-    for symbol in symbols:
-        print(f"Downloading {symbol} in {category}...")
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimitedProvider:
+    """Applies a shared token bucket and exponential-backoff retries to a provider"""
+
+    def __init__(self, provider, limiter=None, retries=DEFAULT_RETRIES, backoff=BACKOFF_BASE):
+        self.provider = provider
+        self.limiter = limiter
+        self.retries = retries
+        self.backoff = backoff
+
+    def fetch(self, ticker, start, end):
+        attempt = 0
+        while True:
+            if self.limiter:
+                self.limiter.acquire()
+            try:
+                return self.provider.fetch(ticker, start, end)
+            except Exception:
+                if attempt >= self.retries:
+                    raise
+                time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+                attempt += 1
+
+
+class FailureQueue:
+    """Tickers that failed on the last run, persisted so the next run replays them.
+
+    Entries flagged ``dead`` failed ``MAX_FAILURE_ATTEMPTS`` runs in a row;
+    they stay in the file, and are skipped, until replayed with ``retry_dead``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
         try:
-            data = yf.download(symbol, start='2000-01-01', end='2025-08-01', interval='1d')
-            if not data.empty:
-                data.to_csv(os.path.join(category_dir, f"{symbol.replace('-', '_')}_history.csv"))
-            else:
-                print(f"No data returned for {symbol}")
-        except Exception as e:
-            print(f"Failed to download {symbol}: {e}")
-
-print("All stock and crypto data downloaded.")
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self, failures):
+        if not failures:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(failures, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def unique_tickers(ticker_map):
+    """ticker -> ordered list of categories, each ticker listed once per category"""
+    targets = {}
+    for category, symbols in ticker_map.items():
+        for symbol in symbols:
+            categories = targets.setdefault(symbol, [])
+            if category not in categories:
+                categories.append(category)
+    return targets
+
+
+def history_path(data_dir, category, ticker):
+    return os.path.join(data_dir, category, f"{ticker.replace('-', '_')}{HISTORY_SUFFIX}")
+
+
+def ticker_paths(data_dir, categories, ticker, deduplicated):
+    """Files holding a ticker: its one series file, or one copy per category"""
+    if deduplicated:
+        return [history_path(data_dir, SERIES_DIR, ticker)]
+    return [history_path(data_dir, category, ticker) for category in categories]
+
+
+def merge_membership(membership, results, targets):
+    """Add successfully written tickers to their categories. Returns True if changed"""
+    changed = False
+    for ticker, _, error, _ in results:
+        if error:
+            continue
+        stem = ticker.replace('-', '_')
+        for category in targets[ticker]:
+            stems = membership.setdefault(category, [])
+            if stem not in stems:
+                stems.append(stem)
+                changed = True
+    return changed
+
+
+def csv_header(ticker):
+    """The three-line header yfinance writes for a single ticker"""
+    return (f"Price,{','.join(PRICE_COLUMNS)}\n"
+            f"Ticker,{','.join([ticker] * len(PRICE_COLUMNS))}\n"
+            f"Date{',' * len(PRICE_COLUMNS)}\n")
+
+
+def last_stored_date(file_path):
+    """Date of the last row in a history CSV, or None if missing/empty"""
+    try:
+        with open(file_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            buffer = b''
+            while position > 0 and buffer.rstrip(b'\r\n').count(b'\n') < 1:
+                step = min(4096, position)
+                position -= step
+                f.seek(position)
+                buffer = f.read(step) + buffer
+    except FileNotFoundError:
+        return None
+
+    last_line = buffer.rstrip(b'\r\n').rsplit(b'\n', 1)[-1].decode()
+    try:
+        return datetime.strptime(last_line.split(',', 1)[0][:10], '%Y-%m-%d').date()
+    except ValueError:
+        # Header only
+        return None
+
+
+def format_rows(data):
+    """Bars as yfinance-style CSV lines"""
+    if data.empty:
+        return ''
+    return data[PRICE_COLUMNS].to_csv(header=False, date_format='%Y-%m-%d', lineterminator='\n')
+
+
+def write_atomic(file_path, content):
+    """Write via temp file + rename so readers never see a partial file"""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', newline='') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def append_bars(file_path, ticker, data, last_date):
+    """Append bars newer than last_date to a history file. Returns rows written"""
+    if last_date is not None:
+        data = data[data.index > pd.Timestamp(last_date)]
+    if data.empty:
+        return 0
+
+    if last_date is None:
+        existing = csv_header(ticker)
+    else:
+        with open(file_path, 'r', newline='') as f:
+            existing = f.read()
+        if existing and not existing.endswith('\n'):
+            existing += '\n'
+
+    write_atomic(file_path, existing + format_rows(data))
+    return len(data)
+
+
+def update_ticker(ticker, categories, provider, data_dir, end, deduplicated=False):
+    """Fetch the bars missing from any copy of a ticker once and fan them out"""
+    paths = ticker_paths(data_dir, categories, ticker, deduplicated)
+    last_dates = [last_stored_date(path) for path in paths]
+
+    if any(last_date is None for last_date in last_dates):
+        start = START_DATE
+    else:
+        start = (min(last_dates) + timedelta(days=1)).isoformat()
+    if start >= end:
+        return 0
+
+    data = provider.fetch(ticker, start, end)
+    if data is None or data.empty:
+        return 0
+
+    return sum(append_bars(path, ticker, data, last_date) for path, last_date in zip(paths, last_dates))
+
+
+def _update_one(ticker, categories, provider, data_dir, end, deduplicated):
+    started = time.perf_counter()
+    try:
+        rows = update_ticker(ticker, categories, provider, data_dir, end, deduplicated)
+        return ticker, rows, None, time.perf_counter() - started
+    except Exception as e:
+        return ticker, 0, str(e), time.perf_counter() - started
+
+
+def summarize(results, elapsed):
+    """Throughput and per-symbol latency summary for a run"""
+    latencies = np.array([latency for _, _, _, latency in results]) if results else np.zeros(1)
+    failed = [ticker for ticker, _, error, _ in results if error]
+    return {
+        'tickers': len(results),
+        'updated': sum(1 for _, rows, error, _ in results if rows and not error),
+        'rows': sum(rows for _, rows, _, _ in results),
+        'failed': failed,
+        'elapsed': elapsed,
+        'tickers_per_sec': len(results) / elapsed if elapsed else 0.0,
+        'latency_p50': float(np.percentile(latencies, 50)),
+        'latency_p95': float(np.percentile(latencies, 95)),
+        'latency_max': float(latencies.max())
+    }
+
+
+def run_update(data_dir=DEFAULT_DATA_DIR, provider=None, end=None, ticker_map=None,
+               workers=DEFAULT_WORKERS, rate=DEFAULT_RATE, retries=DEFAULT_RETRIES,
+               failures_only=False, failure_queue=None, max_attempts=MAX_FAILURE_ATTEMPTS,
+               retry_dead=False):
+    """Bring every ticker up to ``end`` (exclusive), fetching each unique ticker once.
+
+    Tickers run on a bounded thread pool behind a shared token bucket, with
+    exponential-backoff retries. Tickers that still fail are written to the
+    failure queue and replayed first on the next run; after ``max_attempts``
+    failed runs in a row a ticker is reported dead and skipped until
+    ``retry_dead``. In a deduplicated tree
+    each ticker has a single series file and new tickers are added to
+    ``categories.json``.
+    """
+    provider = RateLimitedProvider(provider or YFinanceProvider(),
+                                   TokenBucket(rate) if rate else None, retries)
+    end = end or date.today().isoformat()
+    failure_queue = failure_queue or FailureQueue(
+        os.path.join(default_store_dir(data_dir), FAILURE_QUEUE_FILENAME))
+
+    membership = load_membership(data_dir)
+    deduplicated = membership is not None
+
+    queued = failure_queue.load()
+    dead = {ticker: entry for ticker, entry in queued.items() if entry.get('dead') and not retry_dead}
+    pending = {ticker: entry for ticker, entry in queued.items() if ticker not in dead}
+    targets = {ticker: entry['categories'] for ticker, entry in pending.items()}
+    if not failures_only:
+        for ticker, categories in unique_tickers(ticker_map or tickers).items():
+            if ticker not in dead:
+                targets.setdefault(ticker, categories)
+
+    print(f"Updating {len(targets)} tickers ({len(pending)} replayed from the failure queue) "
+          f"with {workers} workers...")
+    started = time.perf_counter()
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_update_one, ticker, categories, provider, data_dir, end, deduplicated)
+                   for ticker, categories in targets.items()]
+        for future in as_completed(futures):
+            ticker, rows, error, latency = future.result()
+            results.append((ticker, rows, error, latency))
+            if error:
+                print(f"Failed to update {ticker}: {error}")
+    summary = summarize(results, time.perf_counter() - started)
+
+    if deduplicated and merge_membership(membership, results, targets):
+        save_membership(data_dir, membership)
+
+    failures = dict(dead)
+    for ticker, _, error, _ in results:
+        if error:
+            attempts = pending.get(ticker, {}).get('attempts', 0) + 1
+            failures[ticker] = {
+                'categories': targets[ticker],
+                'error': error,
+                'attempts': attempts,
+                'failed_at': datetime.now().isoformat()
+            }
+            if attempts >= max_attempts:
+                failures[ticker]['dead'] = True
+    failure_queue.save(failures)
+    summary['dead'] = sorted(ticker for ticker, entry in failures.items() if entry.get('dead'))
+    retrying = len(failures) - len(summary['dead'])
+
+    print(f"Updated {summary['updated']} of {summary['tickers']} tickers ({summary['rows']} rows) "
+          f"in {summary['elapsed']:.2f}s, {summary['tickers_per_sec']:.1f} tickers/s; "
+          f"latency p50 {summary['latency_p50']:.2f}s p95 {summary['latency_p95']:.2f}s "
+          f"max {summary['latency_max']:.2f}s; {retrying} queued for retry.")
+    if summary['dead']:
+        print(f"Skipping {len(summary['dead'])} dead tickers after {max_attempts} failed runs "
+              f"(--retry-dead to try again): {', '.join(summary['dead'])}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally update market_data history CSVs")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+    parser.add_argument('--end', default=None, help="Exclusive end date (YYYY-MM-DD), default today")
+    parser.add_argument('--fixture-dir', default=None,
+                        help="Read bars from yfinance-format CSVs in this directory instead of yfinance")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                        help="Max provider requests per second (0 disables limiting)")
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES)
+    parser.add_argument('--failures-only', action='store_true', help="Only replay the failure queue")
+    parser.add_argument('--max-attempts', type=int, default=MAX_FAILURE_ATTEMPTS,
+                        help="Failed runs in a row before a ticker is parked as dead")
+    parser.add_argument('--retry-dead', action='store_true', help="Fetch dead tickers again")
+    parser.add_argument('--fake-latency', type=float, default=None,
+                        help="Wrap the provider with this injected latency (seconds) for load tests")
+    parser.add_argument('--fake-error-rate', type=float, default=0.1)
+    args = parser.parse_args()
+
+    provider = CsvFixtureProvider(args.fixture_dir) if args.fixture_dir else YFinanceProvider()
+    if args.fake_latency is not None:
+        provider = FakeProvider(provider, latency=args.fake_latency, error_rate=args.fake_error_rate)
+    run_update(args.data_dir, provider, args.end, workers=args.workers, rate=args.rate,
+               retries=args.retries, failures_only=args.failures_only, max_attempts=args.max_attempts,
+               retry_dead=args.retry_dead)
+
+
+if __name__ == '__main__':
+    main()
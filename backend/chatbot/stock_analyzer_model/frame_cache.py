@@ -0,0 +1,102 @@
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_MB = int(os.environ.get('STOCK_FRAME_CACHE_MB', '256'))
+
+_frame_cache = None
+_frame_cache_lock = threading.Lock()
+
+
+def file_cache_key(file_path, variant=None):
+    """(path, mtime, size, variant) key; a rewritten file gets a new key"""
+    st = os.stat(file_path)
+    return (file_path, st.st_mtime_ns, st.st_size, variant)
+
+
+def frame_nbytes(frame):
+    """Memory of a cached DataFrame, or of any value exposing ``nbytes`` (compact series)"""
+    if hasattr(frame, 'nbytes'):
+        return int(frame.nbytes)
+    return int(frame.memory_usage(index=True).sum())
+
+
+class FrameCache:
+    """Thread-safe LRU cache of DataFrames bounded by total memory.
+
+    Keys embed the source file's mtime and size, so updated data misses
+    naturally and the old frames age out through LRU eviction. Cached
+    frames are shared; callers that mutate must copy.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._frames.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._frames.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, frame):
+        size = frame_nbytes(frame)
+        if size > self.max_bytes:
+            return frame
+
+        with self._lock:
+            previous = self._frames.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            self._frames[key] = (frame, size)
+            self.current_bytes += size
+            self._evict()
+        return frame
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._frames:
+            _, (_, size) = self._frames.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._frames),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+def get_frame_cache():
+    """Process-wide frame cache shared by every StockAnalyzer"""
+    global _frame_cache
+    if _frame_cache is None:
+        with _frame_cache_lock:
+            if _frame_cache is None:
+                _frame_cache = FrameCache()
+    return _frame_cache
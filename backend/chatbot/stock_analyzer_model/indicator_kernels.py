@@ -0,0 +1,84 @@
+import argparse
+import time
+
+import numpy as np
+
+from . import batch_indicators
+
+
+def _row(values):
+    return np.asarray(values, dtype=np.float64).reshape(1, -1)
+
+
+def rolling_mean(values, window):
+    """``Series.rolling(window).mean()`` from block-restarted prefix sums"""
+    return batch_indicators.rolling_mean(_row(values), window)[0]
+
+
+def rolling_var(values, window, ddof=1):
+    """``Series.rolling(window).var()`` from prefix sums of values and squares"""
+    return batch_indicators.rolling_var(_row(values), window, ddof=ddof)[0]
+
+
+def rolling_std(values, window, ddof=1):
+    """``Series.rolling(window).std()``"""
+    return batch_indicators.rolling_std(_row(values), window, ddof=ddof)[0]
+
+
+def ewm_mean(values, span):
+    """``Series.ewm(span=span).mean()`` (adjust=True) for a series with no NaN after its first value"""
+    return batch_indicators.ewm_mean(_row(values), span)[0]
+
+
+def rsi(close, window=14):
+    """RSI over simple moving averages of gains and losses, as ``calculate_technical_indicators``"""
+    return batch_indicators.rsi(_row(close), window)[0]
+
+
+def _best(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark(analyzer, symbol='AAPL', repeat=20):
+    """Per-call time of each kernel and of the full indicator set, pandas vs NumPy, on two history lengths"""
+    results = []
+    for label, tail in (('analysis window', analyzer.analysis_window()), ('full history', None)):
+        df = analyzer.load_stock_data(symbol, tail=tail)
+        close = df['Close']
+        values = close.values
+        cases = [
+            ('rolling mean (20)', lambda: close.rolling(window=20).mean(), lambda: rolling_mean(values, 20)),
+            ('rolling std (20)', lambda: close.rolling(window=20).std(), lambda: rolling_std(values, 20)),
+            ('ewm mean (span 26)', lambda: close.ewm(span=26).mean(), lambda: ewm_mean(values, 26)),
+            ('RSI (14)', lambda: analyzer.calculate_technical_indicators(df.copy(), ['RSI'], backend='pandas'),
+             lambda: rsi(values, 14)),
+            ('all indicators', lambda: analyzer.calculate_technical_indicators(df.copy(), backend='pandas'),
+             lambda: analyzer.calculate_technical_indicators(df.copy(), backend='numpy')),
+        ]
+        for name, pandas_call, numpy_call in cases:
+            results.append((label, len(df), name, _best(pandas_call, repeat), _best(numpy_call, repeat)))
+    return results
+
+
+def main():
+    from .stock_analyzer import StockAnalyzer
+
+    parser = argparse.ArgumentParser(description="Microbenchmark of the NumPy indicator kernels "
+                                                 "(parity is tested in tests/test_indicator_kernels.py)")
+    parser.add_argument('command', choices=['bench'])
+    parser.add_argument('--symbol', default='AAPL', help="Symbol for the benchmark")
+    args = parser.parse_args()
+
+    analyzer = StockAnalyzer()
+    for label, bars, name, pandas_time, numpy_time in benchmark(analyzer, args.symbol):
+        print(f"{label:<16} {bars:5d} bars  {name:<20} pandas {pandas_time * 1e6:8.1f} us   "
+              f"numpy {numpy_time * 1e6:8.1f} us   x{pandas_time / numpy_time:5.1f}")
+
+
+if __name__ == '__main__':
+    main()
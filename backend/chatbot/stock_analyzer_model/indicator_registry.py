@@ -0,0 +1,269 @@
+import numpy as np
+import pandas as pd
+
+from . import indicator_kernels
+
+BACKENDS = ('pandas', 'numpy')
+
+
+class Indicator:
+    """A named series computed from price columns and/or other indicators"""
+
+    def __init__(self, name, inputs, compute, public=True):
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.compute = compute
+        self.kernel = None
+        self.public = public
+
+
+_registry = {}
+
+
+def register(name, inputs, public=True):
+    """Decorator adding an indicator; ``compute`` receives one Series per input, in order.
+
+    Private (``public=False``) indicators are shared intermediates that are
+    never written to the frame.
+    """
+    def decorator(compute):
+        if name in _registry:
+            raise ValueError(f"Indicator {name} is already registered")
+        _registry[name] = Indicator(name, inputs, compute, public)
+        return compute
+    return decorator
+
+
+def kernel(name):
+    """Decorator adding the NumPy implementation of a registered indicator (float64 arrays in and out)"""
+    def decorator(compute):
+        _registry[name].kernel = compute
+        return compute
+    return decorator
+
+
+def get_indicator(name):
+    return _registry[name]
+
+
+def indicator_names():
+    """Public indicators in registration order (the full calculate_technical_indicators set)"""
+    return [name for name, indicator in _registry.items() if indicator.public]
+
+
+def resolve(names):
+    """Minimal dependency closure of ``names`` in computation order"""
+    order = []
+    state = {}
+
+    def visit(name, path):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Indicator dependency cycle: {' -> '.join(path + [name])}")
+        if name not in _registry:
+            raise KeyError(f"Unknown indicator {name}")
+        state[name] = 'visiting'
+        for dependency in _registry[name].inputs:
+            if dependency in _registry:
+                visit(dependency, path + [name])
+        state[name] = 'done'
+        order.append(name)
+
+    for name in names:
+        visit(name, [])
+    return order
+
+
+def compute_indicators(df, names=None, backend='pandas'):
+    """Add ``names`` (default: every public indicator) to ``df``, computing each dependency once.
+
+    Public dependencies in the closure are written too, since they are
+    already paid for. The pandas backend adds the columns to ``df`` in
+    place. ``backend='numpy'`` runs the ``indicator_kernels`` versions on
+    the raw arrays and returns a new frame with every column joined at
+    once, since per-column inserts would cost more than the kernels.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown indicator backend {backend}")
+    if backend == 'numpy':
+        return _compute_arrays(df, names)
+
+    values = {}
+    for name in resolve(indicator_names() if names is None else names):
+        indicator = _registry[name]
+        values[name] = indicator.compute(*[values[i] if i in values else df[i] for i in indicator.inputs])
+        if indicator.public:
+            df[name] = values[name]
+    return df
+
+
+def _compute_arrays(df, names):
+    values = {}
+    public = {}
+    for name in resolve(indicator_names() if names is None else names):
+        indicator = _registry[name]
+        if indicator.kernel is None:
+            raise ValueError(f"Indicator {name} has no NumPy kernel")
+        values[name] = indicator.kernel(*[values[i] if i in values else df[i].to_numpy(dtype=np.float64)
+                                          for i in indicator.inputs])
+        if indicator.public:
+            public[name] = values[name]
+    existing = [name for name in public if name in df.columns]
+    base = df.drop(columns=existing) if existing else df
+    return pd.concat([base, pd.DataFrame(public, index=df.index)], axis=1)
+
+
+@register('SMA_20', ['Close'])
+def _sma_20(close):
+    return close.rolling(window=20).mean()
+
+
+@kernel('SMA_20')
+def _sma_20_kernel(close):
+    return indicator_kernels.rolling_mean(close, 20)
+
+
+@register('SMA_50', ['Close'])
+def _sma_50(close):
+    return close.rolling(window=50).mean()
+
+
+@kernel('SMA_50')
+def _sma_50_kernel(close):
+    return indicator_kernels.rolling_mean(close, 50)
+
+
+@register('EMA_12', ['Close'])
+def _ema_12(close):
+    return close.ewm(span=12).mean()
+
+
+@kernel('EMA_12')
+def _ema_12_kernel(close):
+    return indicator_kernels.ewm_mean(close, 12)
+
+
+@register('EMA_26', ['Close'])
+def _ema_26(close):
+    return close.ewm(span=26).mean()
+
+
+@kernel('EMA_26')
+def _ema_26_kernel(close):
+    return indicator_kernels.ewm_mean(close, 26)
+
+
+@kernel('MACD')
+@register('MACD', ['EMA_12', 'EMA_26'])
+def _macd(ema_12, ema_26):
+    return ema_12 - ema_26
+
+
+@register('MACD_Signal', ['MACD'])
+def _macd_signal(macd):
+    return macd.ewm(span=9).mean()
+
+
+@kernel('MACD_Signal')
+def _macd_signal_kernel(macd):
+    return indicator_kernels.ewm_mean(macd, 9)
+
+
+@kernel('MACD_Histogram')
+@register('MACD_Histogram', ['MACD', 'MACD_Signal'])
+def _macd_histogram(macd, macd_signal):
+    return macd - macd_signal
+
+
+@register('Price_Delta', ['Close'], public=False)
+def _price_delta(close):
+    return close.diff()
+
+
+@kernel('Price_Delta')
+def _price_delta_kernel(close):
+    return np.diff(close, prepend=np.nan)
+
+
+@register('Avg_Gain', ['Price_Delta'], public=False)
+def _avg_gain(delta):
+    return (delta.where(delta > 0, 0)).rolling(window=14).mean()
+
+
+@kernel('Avg_Gain')
+def _avg_gain_kernel(delta):
+    # NaN > 0 is False, so the first bar's missing change counts as 0 as with where()
+    return indicator_kernels.rolling_mean(np.where(delta > 0, delta, 0.0), 14)
+
+
+@register('Avg_Loss', ['Price_Delta'], public=False)
+def _avg_loss(delta):
+    return (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+
+
+@kernel('Avg_Loss')
+def _avg_loss_kernel(delta):
+    return indicator_kernels.rolling_mean(np.where(delta < 0, -delta, 0.0), 14)
+
+
+@register('RSI', ['Avg_Gain', 'Avg_Loss'])
+def _rsi(gain, loss):
+    rs = gain / loss
+    return 100 - (100 / (1 + rs))
+
+
+@kernel('RSI')
+def _rsi_kernel(gain, loss):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _rsi(gain, loss)
+
+
+# The Bollinger middle band is the 20-day SMA; sharing it avoids a second rolling mean
+@kernel('BB_Middle')
+@register('BB_Middle', ['SMA_20'])
+def _bb_middle(sma_20):
+    return sma_20
+
+
+@register('BB_Std', ['Close'], public=False)
+def _bb_std(close):
+    return close.rolling(window=20).std()
+
+
+@kernel('BB_Std')
+def _bb_std_kernel(close):
+    return indicator_kernels.rolling_std(close, 20)
+
+
+@kernel('BB_Upper')
+@register('BB_Upper', ['BB_Middle', 'BB_Std'])
+def _bb_upper(middle, std):
+    return middle + (std * 2)
+
+
+@kernel('BB_Lower')
+@register('BB_Lower', ['BB_Middle', 'BB_Std'])
+def _bb_lower(middle, std):
+    return middle - (std * 2)
+
+
+@register('Volume_SMA', ['Volume'])
+def _volume_sma(volume):
+    return volume.rolling(window=20).mean()
+
+
+@kernel('Volume_SMA')
+def _volume_sma_kernel(volume):
+    return indicator_kernels.rolling_mean(volume, 20)
+
+
+@register('Volume_Ratio', ['Volume', 'Volume_SMA'])
+def _volume_ratio(volume, volume_sma):
+    return volume / volume_sma
+
+
+@kernel('Volume_Ratio')
+def _volume_ratio_kernel(volume, volume_sma):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _volume_ratio(volume, volume_sma)
@@ -0,0 +1,293 @@
+import argparse
+import json
+import math
+import os
+import threading
+import time
+
+import pandas as pd
+
+from .market_catalog import HISTORY_SUFFIX, get_catalog
+from .streaming_indicators import IndicatorStream
+
+SNAPSHOT_SUBDIR = 'snapshots'
+SNAPSHOT_VERSION = 1
+
+# Trailing bars kept per symbol; advice for any analysis period below this is
+# served from the snapshot (the default period is 30, signals read 20 bars)
+SNAPSHOT_ROWS = 60
+SNAPSHOT_PRICE_COLUMNS = ['Close', 'High', 'Low', 'Volume']
+
+_snapshot_stores = {}
+_snapshot_stores_lock = threading.Lock()
+
+
+class IndicatorSnapshot:
+    """A symbol's last ``SNAPSHOT_ROWS`` bars with their indicators, stamped with the source version.
+
+    ``frame`` holds the price columns advice reads plus the indicator
+    columns; ``state`` is an ``IndicatorStream`` checkpoint at the last bar
+    so new bars can be appended without recomputing history. ``advice``
+    memoizes advice per analysis period for as long as the snapshot is
+    current.
+    """
+
+    def __init__(self, rel_path, mtime_ns, size, frame, state=None):
+        self.rel_path = rel_path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.frame = frame
+        self.state = state
+        self.advice = {}
+
+    def is_current(self, source_stats):
+        return (source_stats is not None and self.mtime_ns == source_stats['mtime_ns']
+                and self.size == source_stats['size'])
+
+    def to_json(self):
+        columns = {col: [None if math.isnan(v) else float(v) for v in self.frame[col].values]
+                   for col in self.frame.columns if col != 'Volume'}
+        columns['Volume'] = [int(v) for v in self.frame['Volume'].values]
+        return {
+            'version': SNAPSHOT_VERSION,
+            'rel_path': self.rel_path,
+            'mtime_ns': self.mtime_ns,
+            'size': self.size,
+            'dates': [date.isoformat() for date in self.frame.index],
+            'columns': columns,
+            'state': self.state
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        if data.get('version') != SNAPSHOT_VERSION:
+            return None
+        frame = pd.DataFrame({col: [math.nan if v is None else v for v in values] if col != 'Volume' else values
+                              for col, values in data['columns'].items()},
+                             index=pd.DatetimeIndex(pd.to_datetime(data['dates']), name='Date'))
+        return cls(data['rel_path'], data['mtime_ns'], data['size'], frame, data.get('state'))
+
+
+class SnapshotStore:
+    """Per-symbol indicator snapshots under ``market_store/snapshots/``.
+
+    Snapshots are written when the data is ingested (``build``) and read
+    back once per process; ``get`` returns one only while its stamp still
+    matches the source CSV, so callers fall back to computing when the data
+    changed after the last build.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.snapshots_dir = os.path.join(store_dir, SNAPSHOT_SUBDIR)
+        self._snapshots = {}
+        # rel_path -> (source mtime_ns, source size, snapshot file stamp) of the last stale read
+        self._misses = {}
+        self._lock = threading.Lock()
+
+    def snapshot_path(self, rel_path):
+        return os.path.join(self.snapshots_dir, rel_path[:-len(HISTORY_SUFFIX)] + '.json')
+
+    def read(self, rel_path):
+        """Snapshot on disk for a CSV, current or not, or None"""
+        try:
+            with open(self.snapshot_path(rel_path), 'r') as f:
+                return IndicatorSnapshot.from_json(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _file_stamp(self, rel_path):
+        """(mtime_ns, size) of a CSV's snapshot file, or None when there is none"""
+        try:
+            stat = os.stat(self.snapshot_path(rel_path))
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self, rel_path, source_stats):
+        """Current snapshot for a CSV, or None when missing or stale.
+
+        A miss is remembered with the CSV's and the snapshot file's stamps,
+        so a stale snapshot is read again only after one of them changes.
+        """
+        snapshot = self._snapshots.get(rel_path)
+        if snapshot is not None and snapshot.is_current(source_stats):
+            return snapshot
+        file_stamp = self._file_stamp(rel_path)
+        if source_stats is None or file_stamp is None:
+            return None
+        miss = (source_stats['mtime_ns'], source_stats['size'], file_stamp)
+        if self._misses.get(rel_path) == miss:
+            return None
+
+        snapshot = self.read(rel_path)
+        with self._lock:
+            if snapshot is None or not snapshot.is_current(source_stats):
+                self._misses[rel_path] = miss
+                return None
+            self._snapshots[rel_path] = snapshot
+            self._misses.pop(rel_path, None)
+        return snapshot
+
+    def put(self, snapshot):
+        path = self.snapshot_path(snapshot.rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot.to_json(), f)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._snapshots[snapshot.rel_path] = snapshot
+            self._misses.pop(snapshot.rel_path, None)
+
+    def remove(self, rel_path):
+        with self._lock:
+            self._snapshots.pop(rel_path, None)
+            self._misses.pop(rel_path, None)
+        try:
+            os.remove(self.snapshot_path(rel_path))
+        except OSError:
+            pass
+
+    def build(self, analyzer, indicators, force=False):
+        """Write a snapshot for every symbol whose snapshot is missing or stale.
+
+        Stale snapshots whose history only gained bars are extended from
+        their stream state; anything else is recomputed from the analysis
+        window through the analyzer.
+        """
+        catalog = analyzer.catalog
+        catalog.refresh()
+        columns = SNAPSHOT_PRICE_COLUMNS + list(indicators)
+        built, extended, skipped, failed = 0, 0, 0, 0
+
+        live = set()
+        for symbol, entry in sorted(catalog.entries.items()):
+            rel_path = entry['file']
+            stats = catalog.files.get(rel_path)
+            if stats is None:
+                continue
+            live.add(rel_path)
+            previous = None if force else self.read(rel_path)
+            if previous is not None and previous.is_current(stats):
+                skipped += 1
+                continue
+
+            try:
+                snapshot = self._extend(previous, analyzer, symbol, rel_path, stats, columns)
+                if snapshot is not None:
+                    extended += 1
+                else:
+                    snapshot = self._compute(analyzer, symbol, rel_path, stats, columns, indicators)
+                    built += 1
+            except Exception as e:
+                print(f"Failed to snapshot {rel_path}: {e}")
+                failed += 1
+                continue
+            if snapshot is None:
+                failed += 1
+                continue
+            self.put(snapshot)
+
+        for root, _, names in os.walk(self.snapshots_dir):
+            for name in names:
+                rel_path = os.path.relpath(os.path.join(root, name[:-len('.json')]), self.snapshots_dir)
+                rel_path = rel_path.replace(os.sep, '/') + HISTORY_SUFFIX
+                if name.endswith('.json') and rel_path not in live:
+                    self.remove(rel_path)
+        return {'built': built, 'extended': extended, 'skipped': skipped, 'failed': failed}
+
+    @staticmethod
+    def _compute(analyzer, symbol, rel_path, stats, columns, indicators):
+        window = analyzer.analysis_window(SNAPSHOT_ROWS)
+        df = analyzer.load_indicator_data(symbol, tail=window, indicators=indicators)
+        if df is None or df.empty:
+            return None
+        stream = IndicatorStream()
+        stream.replay(df)
+        return IndicatorSnapshot(rel_path, stats['mtime_ns'], stats['size'],
+                                 df[columns].tail(SNAPSHOT_ROWS).copy(), stream.to_state())
+
+    @staticmethod
+    def _extend(previous, analyzer, symbol, rel_path, stats, columns):
+        """Append bars added since ``previous`` through its stream state, or None if history changed"""
+        if previous is None or previous.state is None or previous.frame.empty:
+            return None
+        df = analyzer.load_stock_data(symbol, tail=analyzer.analysis_window(SNAPSHOT_ROWS))
+        if df is None or df.empty:
+            return None
+        last_date = previous.frame.index[-1]
+        position = df.index.searchsorted(last_date)
+        # Only appends are incremental: the old last bar must still be there, unchanged
+        if (position >= len(df) or df.index[position] != last_date
+                or df['Close'].iloc[position] != previous.frame['Close'].iloc[-1]):
+            return None
+        new_bars = df.iloc[position + 1:]
+        if new_bars.empty or len(new_bars) >= SNAPSHOT_ROWS:
+            return None
+
+        stream = IndicatorStream.from_state(previous.state)
+        added = stream.replay(new_bars)
+        for col in SNAPSHOT_PRICE_COLUMNS:
+            added[col] = new_bars[col]
+        frame = pd.concat([previous.frame, added[columns]]).tail(SNAPSHOT_ROWS)
+        return IndicatorSnapshot(rel_path, stats['mtime_ns'], stats['size'], frame, stream.to_state())
+
+
+def get_snapshot_store(store_dir):
+    """Process-wide snapshot store for a store directory"""
+    key = os.path.abspath(store_dir)
+    store = _snapshot_stores.get(key)
+    if store is None:
+        with _snapshot_stores_lock:
+            store = _snapshot_stores.get(key)
+            if store is None:
+                store = SnapshotStore(key)
+                _snapshot_stores[key] = store
+    return store
+
+
+def benchmark(analyzer, symbols=None, repeat=200):
+    """Time advice served from snapshots against computing it, per request"""
+    symbols = symbols or analyzer.catalog.symbols()
+    timings = {}
+    for label, use_snapshots in (('snapshot', True), ('computed', False)):
+        analyzer.use_snapshots = use_snapshots
+        analyzer.analysis_cache.clear()
+        for symbol in symbols:
+            analyzer.generate_investment_advice(symbol)
+        rounds = repeat if use_snapshots else 1
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for symbol in symbols:
+                analyzer.generate_investment_advice(symbol)
+        timings[label] = (time.perf_counter() - start) / (rounds * len(symbols))
+    analyzer.use_snapshots = True
+    return timings
+
+
+def main():
+    from .stock_analyzer import SIGNAL_INDICATORS, StockAnalyzer
+
+    parser = argparse.ArgumentParser(description="Build or benchmark precomputed indicator snapshots")
+    parser.add_argument('command', choices=['build', 'bench'])
+    parser.add_argument('--data-dir', default=None)
+    parser.add_argument('--force', action='store_true', help="Recompute every snapshot")
+    args = parser.parse_args()
+
+    analyzer = StockAnalyzer(get_catalog(args.data_dir).data_dir)
+    if args.command == 'build':
+        start = time.perf_counter()
+        summary = analyzer.snapshots.build(analyzer, SIGNAL_INDICATORS, force=args.force)
+        print(f"Snapshots: built {summary['built']}, extended {summary['extended']}, skipped "
+              f"{summary['skipped']}, failed {summary['failed']} in {time.perf_counter() - start:.2f}s "
+              f"-> {analyzer.snapshots.snapshots_dir}")
+        return
+
+    timings = benchmark(analyzer)
+    print(f"Advice per request: snapshot {timings['snapshot'] * 1e6:.1f} us, "
+          f"computed {timings['computed'] * 1e6:.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,377 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_DATA_DIR = os.path.abspath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', 'stock-data-collector', 'market_data'
+))
+
+HISTORY_SUFFIX = '_history.csv'
+HEADER_LINES = 3
+CATALOG_FILENAME = 'catalog.json'
+CATALOG_VERSION = 2
+
+# Deduplicated layout: one file per ticker under series/, category membership in categories.json
+SERIES_DIR = 'series'
+MEMBERSHIP_FILENAME = 'categories.json'
+
+# Seconds between directory signature checks on the lookup path
+REFRESH_INTERVAL = 30
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def default_store_dir(data_dir):
+    """Directory holding derived artifacts (catalog, stores) for a data dir"""
+    return os.path.join(os.path.dirname(os.path.abspath(data_dir)), 'market_store')
+
+
+def normalize_symbol(symbol):
+    """Normalize user supplied tickers (btc-usd, BTC/USD) to the catalog key form"""
+    return symbol.strip().upper().replace('-', '_').replace('/', '_')
+
+
+def symbol_from_stem(stem):
+    """Display symbol for a file stem: BTC_USD -> BTC, AAPL -> AAPL"""
+    if stem.endswith('_USD') and len(stem) > 4:
+        return stem[:-4]
+    return stem
+
+
+def stem_aliases(stem):
+    """All lookup keys that resolve to a file stem"""
+    aliases = {stem, stem.replace('_', '-')}
+    if stem.endswith('_USD') and len(stem) > 4:
+        base = stem[:-4]
+        aliases.update({base, base + 'USD'})
+    return aliases
+
+
+def load_membership(data_dir):
+    """Category -> file stems map of a deduplicated tree, or None for the per-category layout"""
+    try:
+        with open(os.path.join(data_dir, MEMBERSHIP_FILENAME), 'r') as f:
+            return json.load(f)['categories']
+    except FileNotFoundError:
+        return None
+
+
+def save_membership(data_dir, membership):
+    """Atomically write the category membership of a deduplicated tree"""
+    path = os.path.join(data_dir, MEMBERSHIP_FILENAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    categories = {category: sorted(set(stems)) for category, stems in sorted(membership.items())}
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': 1, 'categories': categories}, f, indent=1)
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def scan_history_file(file_path):
+    """Count data rows and read first/last dates of a yfinance CSV"""
+    with open(file_path, 'rb') as f:
+        content = f.read()
+
+    lines = content.split(b'\n', HEADER_LINES + 1)
+    if len(lines) <= HEADER_LINES:
+        return {'rows': 0, 'first_date': None, 'last_date': None}
+
+    body_start = sum(len(line) + 1 for line in lines[:HEADER_LINES])
+    rows = content.count(b'\n', body_start)
+    if not content.endswith(b'\n'):
+        rows += 1
+
+    first_line = lines[HEADER_LINES]
+    last_line = content.rstrip(b'\r\n').rsplit(b'\n', 1)[-1]
+    if rows == 0 or not first_line.strip():
+        return {'rows': 0, 'first_date': None, 'last_date': None}
+
+    return {
+        'rows': rows,
+        'first_date': first_line.split(b',', 1)[0].decode()[:10],
+        'last_date': last_line.split(b',', 1)[0].decode()[:10]
+    }
+
+
+class MarketCatalog:
+    """Symbol -> file index over the market_data tree.
+
+    The catalog is persisted next to the data (``market_store/catalog.json``)
+    so startup only rescans files whose mtime or size changed, and lookups
+    are plain dictionary hits. Directory mtimes are used as a cheap change
+    signature; writers replace files via rename, which bumps them.
+
+    Two layouts are understood: the original ``<Category>/<STEM>_history.csv``
+    tree, and the deduplicated one (``series/`` plus ``categories.json``)
+    where every category a ticker belongs to resolves to the same file.
+    """
+
+    def __init__(self, data_dir=None, store_dir=None, refresh_interval=REFRESH_INTERVAL):
+        self.data_dir = os.path.abspath(data_dir or DEFAULT_DATA_DIR)
+        self.store_dir = store_dir or default_store_dir(self.data_dir)
+        self.catalog_path = os.path.join(self.store_dir, CATALOG_FILENAME)
+        self.refresh_interval = refresh_interval
+
+        self.entries = {}
+        self.aliases = {}
+        self.category_members = {}
+        self.files = {}
+        self.memberships = {}
+        self.signature = {}
+        self.built_at = None
+
+        self._lock = threading.RLock()
+        self._last_check = 0.0
+
+        self._load_persisted()
+        self.refresh()
+
+    def _directory_signature(self):
+        """mtime of the data dir and every category dir"""
+        signature = {}
+        try:
+            signature['.'] = os.stat(self.data_dir).st_mtime_ns
+            with os.scandir(self.data_dir) as it:
+                for entry in it:
+                    if entry.is_dir() and not entry.name.startswith('.'):
+                        signature[entry.name] = entry.stat().st_mtime_ns
+                    elif entry.name == MEMBERSHIP_FILENAME:
+                        signature[entry.name] = entry.stat().st_mtime_ns
+        except OSError:
+            return {}
+        return signature
+
+    def _load_persisted(self):
+        try:
+            with open(self.catalog_path, 'r') as f:
+                persisted = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if persisted.get('version') != CATALOG_VERSION or persisted.get('data_dir') != self.data_dir:
+            return
+
+        self.files = persisted.get('files', {})
+        self.memberships = persisted.get('memberships', {})
+        self._index(persisted.get('signature', {}), persisted.get('built_at'))
+
+    def _persist(self):
+        payload = {
+            'version': CATALOG_VERSION,
+            'data_dir': self.data_dir,
+            'built_at': self.built_at,
+            'signature': self.signature,
+            'files': self.files,
+            'memberships': self.memberships
+        }
+        try:
+            os.makedirs(self.store_dir, exist_ok=True)
+            tmp_path = f"{self.catalog_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(payload, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.catalog_path)
+        except OSError as e:
+            print(f"Could not persist market catalog: {e}")
+
+    def refresh(self, force=False):
+        """Rescan the tree if its directory signature changed. Returns True on rebuild"""
+        with self._lock:
+            self._last_check = time.monotonic()
+            signature = self._directory_signature()
+            if not force and self.entries and signature == self.signature:
+                return False
+
+            membership = load_membership(self.data_dir)
+            if membership is None:
+                directories = [name for name in sorted(signature) if name not in ('.', MEMBERSHIP_FILENAME)]
+            else:
+                directories = [SERIES_DIR]
+
+            files = {}
+            for directory in directories:
+                self._scan_directory(directory, files, force)
+
+            memberships = {}
+            if membership is None:
+                for rel_path in files:
+                    memberships[rel_path] = [rel_path.split('/', 1)[0]]
+            else:
+                for category, stems in membership.items():
+                    for stem in stems:
+                        rel_path = f"{SERIES_DIR}/{stem}{HISTORY_SUFFIX}"
+                        if rel_path in files:
+                            memberships.setdefault(rel_path, []).append(category)
+
+            self.files = files
+            self.memberships = memberships
+            self._index(signature, datetime.now().isoformat())
+            self._persist()
+            return True
+
+    def _scan_directory(self, directory, files, force):
+        """Stat every history CSV in a directory, rescanning only changed files"""
+        try:
+            names = os.listdir(os.path.join(self.data_dir, directory))
+        except OSError:
+            return
+
+        for name in names:
+            if not name.endswith(HISTORY_SUFFIX):
+                continue
+            rel_path = f"{directory}/{name}"
+            file_path = os.path.join(self.data_dir, directory, name)
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+
+            previous = self.files.get(rel_path)
+            if (not force and previous and previous['mtime_ns'] == st.st_mtime_ns
+                    and previous['size'] == st.st_size):
+                files[rel_path] = previous
+                continue
+
+            try:
+                stats = scan_history_file(file_path)
+            except OSError as e:
+                print(f"Error scanning {file_path}: {e}")
+                continue
+            stats.update({'mtime_ns': st.st_mtime_ns, 'size': st.st_size})
+            files[rel_path] = stats
+
+    def maybe_refresh(self):
+        """``refresh`` at most once per ``refresh_interval`` seconds"""
+        if time.monotonic() - self._last_check >= self.refresh_interval:
+            self.refresh()
+
+    def _index(self, signature, built_at):
+        """Rebuild the in-memory symbol, alias and category maps from self.files"""
+        entries = {}
+        category_members = {}
+
+        for rel_path in sorted(self.files):
+            name = rel_path.split('/', 1)[1]
+            stem = name[:-len(HISTORY_SUFFIX)]
+            symbol = symbol_from_stem(stem)
+            stats = self.files[rel_path]
+
+            entry = entries.get(symbol)
+            if entry is None:
+                entry = {
+                    'symbol': symbol,
+                    'ticker': stem.replace('_', '-'),
+                    'stem': stem,
+                    'file': rel_path,
+                    'files': {},
+                    'categories': [],
+                    'rows': stats['rows'],
+                    'first_date': stats['first_date'],
+                    'last_date': stats['last_date']
+                }
+                entries[symbol] = entry
+            elif stats['rows'] > entry['rows']:
+                entry.update({
+                    'file': rel_path,
+                    'rows': stats['rows'],
+                    'first_date': stats['first_date'],
+                    'last_date': stats['last_date']
+                })
+
+            for category in self.memberships.get(rel_path, []):
+                entry['files'][category] = rel_path
+                entry['categories'].append(category)
+                category_members.setdefault(category, []).append(symbol)
+
+        # Exact stems win over derived aliases (e.g. a stock named like a crypto base)
+        aliases = {}
+        for symbol, entry in entries.items():
+            for alias in stem_aliases(entry['stem']):
+                aliases.setdefault(normalize_symbol(alias), symbol)
+        for symbol, entry in entries.items():
+            aliases[normalize_symbol(entry['stem'])] = symbol
+
+        self.entries = entries
+        self.aliases = aliases
+        self.category_members = category_members
+        self.signature = signature
+        self.built_at = built_at
+
+    def resolve(self, symbol, category=None):
+        """Catalog entry for a ticker or alias, or None"""
+        if not symbol:
+            return None
+        self.maybe_refresh()
+
+        key = normalize_symbol(symbol)
+        canonical = self.aliases.get(key)
+        if canonical is None and self.refresh():
+            canonical = self.aliases.get(key)
+        if canonical is None:
+            return None
+
+        entry = self.entries[canonical]
+        if category and category not in entry['files']:
+            return None
+        return entry
+
+    def get_rel_path(self, symbol, category=None):
+        """CSV path relative to the data dir, optionally within one category"""
+        entry = self.resolve(symbol, category)
+        if entry is None:
+            return None
+        return entry['files'][category] if category else entry['file']
+
+    def get_file_path(self, symbol, category=None):
+        """Absolute CSV path for a symbol, optionally within one category"""
+        rel_path = self.get_rel_path(symbol, category)
+        if rel_path is None:
+            return None
+        return os.path.join(self.data_dir, rel_path)
+
+    def symbols(self, category=None):
+        """Sorted canonical symbols, optionally limited to one category"""
+        self.maybe_refresh()
+        if category:
+            return sorted(self.category_members.get(category, []))
+        return sorted(self.entries)
+
+    def categories(self):
+        self.maybe_refresh()
+        return sorted(self.category_members)
+
+    def describe(self, symbol):
+        """Public view of an entry for API responses"""
+        entry = self.resolve(symbol)
+        if entry is None:
+            return None
+        return {
+            'symbol': entry['symbol'],
+            'ticker': entry['ticker'],
+            'categories': list(entry['categories']),
+            'rows': entry['rows'],
+            'first_date': entry['first_date'],
+            'last_date': entry['last_date']
+        }
+
+
+def get_catalog(data_dir=None):
+    """Process-wide catalog for a data directory"""
+    key = os.path.abspath(data_dir or DEFAULT_DATA_DIR)
+    catalog = _catalogs.get(key)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.get(key)
+            if catalog is None:
+                catalog = MarketCatalog(key)
+                _catalogs[key] = catalog
+    return catalog
+
+
+if __name__ == '__main__':
+    catalog = get_catalog()
+    catalog.refresh(force=True)
+    print(f"Catalog: {len(catalog.entries)} symbols in {len(catalog.category_members)} categories "
+          f"({len(catalog.files)} files) -> {catalog.catalog_path}")
@@ -0,0 +1,282 @@
+import argparse
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import batch_indicators
+from .backtest import (BACKTEST_WARMUP_BARS, CHUNK_SYMBOLS, DEFAULT_HORIZON, DEFAULT_RULES, _right_aligned,
+                       apply_rules, backtest_frames, evaluate, forward_returns, signal_inputs)
+
+SWEEP_FILENAME = 'parameter_sweep.npz'
+# Risk scores run 1-10, so a cap of 10 keeps every call
+NO_RISK_CAP = 10
+
+# Values tried for each rule parameter; pairs move together (weak/strong trend cut-offs,
+# oversold/overbought RSI levels, low/mid/high volatility tiers)
+DEFAULT_GRID = {
+    'analysis_period': [10, 20, 30, 60],
+    'trend': [(1, 3), (2, 5), (3, 8)],
+    'rsi': [(25, 75), (30, 70), (35, 65)],
+    'volume_spike': [1.25, 1.5, 2.0],
+    'volatility_tiers': [(20, 30, 50), (25, 40, 60)],
+    'max_risk': [NO_RISK_CAP, 7]
+}
+DEFAULT_CONFIG = {'analysis_period': 30, 'max_risk': NO_RISK_CAP, **DEFAULT_RULES}
+
+CONFIG_COLUMNS = ('analysis_period', 'trend_weak', 'trend_strong', 'rsi_oversold', 'rsi_overbought',
+                  'volume_spike', 'volatility_low', 'volatility_mid', 'volatility_high', 'max_risk')
+# Per (config, symbol) results kept from ``evaluate``; counts are summed when pooling
+COUNT_METRICS = ('calls', 'hits', 'buy_calls', 'buy_hits', 'sell_calls', 'sell_hits', 'trades')
+VALUE_METRICS = ('total_return', 'max_drawdown', 'exposure')
+OBJECTIVES = ('hit_rate', 'buy_hit_rate', 'sell_hit_rate', 'mean_total_return', 'median_total_return',
+              'median_max_drawdown')
+
+
+def expand_grid(grid=None):
+    """Every combination of ``grid`` values as flat rule configs"""
+    grid = dict(DEFAULT_GRID, **(grid or {}))
+    configs = []
+    for period, (weak, strong), (oversold, overbought), spike, tiers, max_risk in itertools.product(
+            grid['analysis_period'], grid['trend'], grid['rsi'], grid['volume_spike'], grid['volatility_tiers'],
+            grid['max_risk']):
+        configs.append({'analysis_period': period, 'trend_weak': weak, 'trend_strong': strong,
+                        'rsi_oversold': oversold, 'rsi_overbought': overbought, 'volume_spike': spike,
+                        'volatility_tiers': tuple(tiers), 'max_risk': max_risk})
+    return configs
+
+
+def sweep_frames(frames, configs, horizon=DEFAULT_HORIZON, allow_short=False):
+    """Evaluate every config on ``{symbol: price frame}``; returns ``(symbols, {metric: configs x symbols})``.
+
+    Each chunk of ``CHUNK_SYMBOLS`` symbols computes its indicators,
+    per-period changes and forward returns once; a config then only
+    re-applies thresholds and scores the resulting calls, once per distinct
+    set of calls. All configs share
+    the warmup of the longest analysis period so they score the same bars.
+    """
+    symbols = [symbol for symbol, df in frames.items() if df is not None and len(df) > BACKTEST_WARMUP_BARS]
+    periods = sorted({config['analysis_period'] for config in configs})
+    warmup = max(BACKTEST_WARMUP_BARS, periods[-1] - 1)
+    metrics = {name: np.zeros((len(configs), len(symbols)), dtype=np.int32) for name in COUNT_METRICS}
+    metrics.update({name: np.full((len(configs), len(symbols)), np.nan) for name in VALUE_METRICS})
+
+    for start in range(0, len(symbols), CHUNK_SYMBOLS):
+        chunk = symbols[start:start + CHUNK_SYMBOLS]
+        columns = slice(start, start + len(chunk))
+        close = _right_aligned([frames[symbol]['Close'].to_numpy(dtype=np.float64) for symbol in chunk])
+        volume = _right_aligned([frames[symbol]['Volume'].to_numpy(dtype=np.float64) for symbol in chunk])
+        inputs = signal_inputs(close, volume, periods)
+        returns = forward_returns(close, horizon)
+        first = batch_indicators.first_bars(close)
+        valid = np.arange(close.shape[1]) >= (first + warmup)[:, None]
+
+        results = {}
+        for c, config in enumerate(configs):
+            capped = config['max_risk'] < NO_RISK_CAP
+            # Volatility tiers only move the risk score, so without a cap they do not change the calls
+            key = tuple(value for name, value in config.items() if capped or name != 'volatility_tiers')
+            result = results.get(key)
+            if result is None:
+                history = apply_rules(inputs, config['analysis_period'], config)
+                recommendation = history['recommendation']
+                if capped:
+                    # Calls above the risk cap are treated as HOLD
+                    recommendation = np.where(history['risk_score'] <= config['max_risk'], recommendation, 2)
+                result = results[key] = evaluate(close, recommendation, valid, horizon, allow_short, returns)
+            for name in metrics:
+                metrics[name][c, columns] = result[name]
+    return symbols, metrics
+
+
+def _sweep_worker(symbols, configs, horizon, allow_short):
+    from .stock_analyzer import worker_analyzer
+    analyzer = worker_analyzer()
+    return sweep_frames({symbol: analyzer.load_stock_data(symbol) for symbol in symbols}, configs, horizon,
+                        allow_short)
+
+
+class SweepResult:
+    """Per-config, per-symbol results of a parameter sweep, stored column by column"""
+
+    def __init__(self, configs, symbols, metrics, params):
+        self.configs = configs
+        self.symbols = symbols
+        self.metrics = metrics
+        self.params = params
+
+    def config_frame(self):
+        """One row per config: its parameters and pooled hit rates, returns and drawdowns over all symbols"""
+        frame = pd.DataFrame(_config_columns(self.configs)).rename_axis('config')
+        counts = {name: self.metrics[name].sum(axis=1) for name in COUNT_METRICS}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frame['calls'] = counts['calls']
+            frame['hit_rate'] = counts['hits'] / counts['calls']
+            frame['buy_hit_rate'] = counts['buy_hits'] / counts['buy_calls']
+            frame['sell_hit_rate'] = counts['sell_hits'] / counts['sell_calls']
+        frame['mean_total_return'] = np.nanmean(self.metrics['total_return'], axis=1)
+        frame['median_total_return'] = np.nanmedian(self.metrics['total_return'], axis=1)
+        frame['median_max_drawdown'] = np.nanmedian(self.metrics['max_drawdown'], axis=1)
+        frame['mean_exposure'] = np.nanmean(self.metrics['exposure'], axis=1)
+        return frame
+
+    def best(self, objective='hit_rate', top=5, min_calls=1000):
+        """The ``top`` configs by ``objective`` among those making at least ``min_calls`` calls"""
+        frame = self.config_frame()
+        frame = frame[frame['calls'] >= min_calls]
+        return frame.sort_values(objective, ascending=False, kind='stable').head(top)
+
+    def default_index(self):
+        """Row of the advice rule's own settings, if the grid contains it"""
+        for i, config in enumerate(self.configs):
+            if config == DEFAULT_CONFIG:
+                return i
+        return None
+
+    def save(self, path):
+        """Write one compressed array per column (metrics as configs x symbols) to an ``.npz`` file"""
+        columns = {f'config_{name}': values for name, values in _config_columns(self.configs).items()}
+        columns['symbol'] = np.array(self.symbols, dtype=str)
+        for name, values in self.metrics.items():
+            columns[name] = values.astype(np.float32) if values.dtype.kind == 'f' else values
+        columns.update({f'param_{name}': np.array(value) for name, value in self.params.items()})
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **columns)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            table = {name: data[f'config_{name}'] for name in CONFIG_COLUMNS}
+            configs = []
+            for i in range(len(table['analysis_period'])):
+                row = {name: table[name][i].item() for name in CONFIG_COLUMNS}
+                row['volatility_tiers'] = (row.pop('volatility_low'), row.pop('volatility_mid'),
+                                           row.pop('volatility_high'))
+                configs.append(row)
+            metrics = {name: data[name] for name in COUNT_METRICS + VALUE_METRICS}
+            params = {name[len('param_'):]: data[name].item() for name in data.files if name.startswith('param_')}
+            return cls(configs, [str(symbol) for symbol in data['symbol']], metrics, params)
+
+
+def _config_columns(configs):
+    columns = {name: [] for name in CONFIG_COLUMNS}
+    for config in configs:
+        low, mid, high = config['volatility_tiers']
+        values = dict(config, volatility_low=low, volatility_mid=mid, volatility_high=high)
+        for name in CONFIG_COLUMNS:
+            columns[name].append(values[name])
+    return {name: np.array(values) for name, values in columns.items()}
+
+
+def run_sweep(analyzer, symbols=None, configs=None, horizon=DEFAULT_HORIZON, allow_short=False, workers=None):
+    """Evaluate every config over every symbol's full history.
+
+    Each worker of the shared pool loads its share of the symbols once
+    (pages of the memory-mapped universe store are shared between the
+    processes) and runs the whole grid on it; with one worker the sweep
+    runs in this process.
+    """
+    from .stock_analyzer import DEFAULT_BATCH_WORKERS, discard_worker_pool, get_worker_pool
+
+    configs = configs or expand_grid()
+    symbols = list(symbols or analyzer.catalog.symbols())
+    workers = DEFAULT_BATCH_WORKERS if workers is None else workers
+    parts = []
+    if workers > 1 and len(symbols) > CHUNK_SYMBOLS:
+        pool = get_worker_pool(analyzer.data_dir, analyzer.indicator_backend, workers)
+        chunks = [symbols[i::workers] for i in range(workers)]
+        try:
+            parts = [future.result() for future in [pool.submit(_sweep_worker, chunk, configs, horizon, allow_short)
+                                                    for chunk in chunks if chunk]]
+        except Exception as e:
+            print(f"Sweep pool failed, running in-process: {e}")
+            discard_worker_pool(pool)
+            parts = []
+    if not parts:
+        parts = [sweep_frames({symbol: analyzer.load_stock_data(symbol) for symbol in symbols}, configs, horizon,
+                              allow_short)]
+
+    swept = [symbol for part_symbols, _ in parts for symbol in part_symbols]
+    metrics = {name: np.concatenate([part[name] for _, part in parts], axis=1) for name in parts[0][1]}
+    params = {'horizon': horizon, 'allow_short': allow_short}
+    return SweepResult(configs, swept, metrics, params)
+
+
+def check(analyzer, symbols=None):
+    """Compare the sweep's default-config results with ``backtest_frames`` per symbol"""
+    symbols = symbols or analyzer.catalog.symbols()[::4]
+    frames = {symbol: analyzer.load_stock_data(symbol) for symbol in symbols}
+    swept, metrics = sweep_frames(frames, [DEFAULT_CONFIG])
+    expected = backtest_frames(frames)
+    mismatches = []
+    for i, symbol in enumerate(swept):
+        for name in COUNT_METRICS + VALUE_METRICS:
+            ours, theirs = metrics[name][0, i], expected[symbol][name]
+            if theirs is None:
+                same = np.isnan(ours)
+            else:
+                same = ours == theirs or np.isclose(ours, theirs, rtol=1e-12)
+            if not same:
+                mismatches.append(f"{symbol} {name}: {ours} != {theirs}")
+    return mismatches, len(swept)
+
+
+def main():
+    from .stock_analyzer import StockAnalyzer
+
+    parser = argparse.ArgumentParser(description="Sweep the advice rule's analysis period and signal thresholds")
+    parser.add_argument('command', choices=['run', 'check', 'show'])
+    parser.add_argument('--symbols', nargs='*', default=None)
+    parser.add_argument('--periods', nargs='*', type=int, default=None, help="Analysis periods to try")
+    parser.add_argument('--horizon', type=int, default=DEFAULT_HORIZON, help="Bars ahead a call is scored on")
+    parser.add_argument('--allow-short', action='store_true')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--objective', choices=OBJECTIVES, default='hit_rate')
+    parser.add_argument('--min-calls', type=int, default=1000, help="Ignore configs making fewer calls")
+    parser.add_argument('--top', type=int, default=5)
+    parser.add_argument('--output', default=None, help=f"Results file (default: <store dir>/{SWEEP_FILENAME})")
+    args = parser.parse_args()
+
+    analyzer = StockAnalyzer()
+    output = args.output or os.path.join(analyzer.catalog.store_dir, SWEEP_FILENAME)
+    if args.command == 'check':
+        mismatches, checked = check(analyzer, args.symbols)
+        for mismatch in mismatches[:20]:
+            print(f"MISMATCH {mismatch}")
+        print(f"{checked - len({m.split()[0] for m in mismatches})} of {checked} symbols match the backtest "
+              f"for the default settings")
+        if mismatches:
+            sys.exit(1)
+        return
+
+    if args.command == 'run':
+        configs = expand_grid({'analysis_period': args.periods} if args.periods else None)
+        start = time.perf_counter()
+        result = run_sweep(analyzer, args.symbols, configs, args.horizon, args.allow_short, args.workers)
+        elapsed = time.perf_counter() - start
+        result.save(output)
+        print(f"Swept {len(configs)} configs over {len(result.symbols)} symbols in {elapsed:.2f}s; "
+              f"results written to {os.path.abspath(output)}")
+    else:
+        result = SweepResult.load(output)
+
+    with pd.option_context('display.width', 250, 'display.max_columns', 30, 'display.float_format', '{:.3f}'.format):
+        print(f"Best {args.top} by {args.objective} (at least {args.min_calls} calls):")
+        print(result.best(args.objective, args.top, args.min_calls))
+        default = result.default_index()
+        if default is not None:
+            frame = result.config_frame()
+            rank = int((frame.loc[frame['calls'] >= args.min_calls, args.objective]
+                        > frame.loc[default, args.objective]).sum()) + 1
+            print(f"Current settings (config {default}) rank {rank} of {len(frame)}:")
+            print(frame.loc[[default]])
+
+
+if __name__ == '__main__':
+    main()
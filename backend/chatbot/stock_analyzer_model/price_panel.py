@@ -0,0 +1,252 @@
+import argparse
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from .compact_series import days_to_dates
+from .price_store import PRICE_COLUMNS
+
+CRYPTO_CATEGORY = 'Crypto'
+
+_panels = {}
+_panels_lock = threading.Lock()
+
+
+class PricePanel:
+    """Dense, date-aligned OHLCV arrays for many symbols (symbols x dates).
+
+    ``dates`` is the union calendar of every symbol, so crypto weekends are
+    included and equities hold NaN on days they did not trade. ``mask`` is
+    True where a symbol has a bar. ``equity_calendar()`` narrows the panel
+    to days on which any non-crypto symbol traded, for comparisons against
+    the 5-day equity calendar. Arrays are read-only and shared; derive new
+    arrays rather than writing into them.
+    """
+
+    def __init__(self, symbols, dates, fields, mask, crypto, source_key=None):
+        self.symbols = symbols
+        self.dates = dates
+        self.fields = fields
+        self.mask = mask
+        self.crypto = crypto
+        self.source_key = source_key
+        self._positions = {symbol: i for i, symbol in enumerate(symbols)}
+        for array in list(fields.values()) + [mask, crypto]:
+            array.flags.writeable = False
+
+    @classmethod
+    def from_frames(cls, frames, crypto_symbols=(), dtype=np.float64, source_key=None):
+        """Align ``{symbol: OHLCV frame}`` onto their union calendar"""
+        symbols = sorted(frames)
+        indexes = [frames[symbol].index.values for symbol in symbols]
+        dates = np.unique(np.concatenate(indexes)) if indexes else np.array([], dtype='datetime64[ns]')
+
+        fields = {col: np.full((len(symbols), len(dates)), np.nan, dtype=dtype) for col in PRICE_COLUMNS}
+        mask = np.zeros((len(symbols), len(dates)), dtype=bool)
+        for i, (symbol, index) in enumerate(zip(symbols, indexes)):
+            positions = np.searchsorted(dates, index)
+            mask[i, positions] = True
+            df = frames[symbol]
+            for col in PRICE_COLUMNS:
+                fields[col][i, positions] = df[col].values
+
+        crypto = np.array([symbol in crypto_symbols for symbol in symbols], dtype=bool)
+        return cls(symbols, dates, fields, mask, crypto, source_key)
+
+    @classmethod
+    def from_series(cls, series, crypto_symbols=(), dtype=np.float32, source_key=None):
+        """Align ``{symbol: CompactSeries}`` onto their union calendar without going through DataFrames"""
+        symbols = sorted(series)
+        days = [series[symbol].days for symbol in symbols]
+        union = np.unique(np.concatenate(days)) if days else np.array([], dtype=np.int32)
+
+        fields = {col: np.full((len(symbols), len(union)), np.nan, dtype=dtype) for col in PRICE_COLUMNS}
+        mask = np.zeros((len(symbols), len(union)), dtype=bool)
+        for i, (symbol, index) in enumerate(zip(symbols, days)):
+            positions = np.searchsorted(union, index)
+            mask[i, positions] = True
+            for col in PRICE_COLUMNS:
+                fields[col][i, positions] = series[symbol].column(col)
+
+        crypto = np.array([symbol in crypto_symbols for symbol in symbols], dtype=bool)
+        return cls(symbols, days_to_dates(union), fields, mask, crypto, source_key)
+
+    @property
+    def shape(self):
+        return self.mask.shape
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.fields.values()) + self.mask.nbytes + self.dates.nbytes
+
+    def __getitem__(self, field):
+        return self.fields[field]
+
+    def index_of(self, symbol):
+        """Row of a symbol, or None"""
+        return self._positions.get(symbol)
+
+    def series(self, symbol, field='Close'):
+        """One symbol's bars as a Series on its own trading days"""
+        i = self._positions[symbol]
+        return pd.Series(self.fields[field][i, self.mask[i]], index=pd.DatetimeIndex(self.dates[self.mask[i]]),
+                         name=symbol)
+
+    def bar_matrix(self, field='Close', bars=None):
+        """Each symbol's own last ``bars`` bars, right-aligned with leading NaN (symbols x bars).
+
+        Unlike the calendar-aligned arrays, column j is each symbol's j-th
+        bar from the end, which is what per-symbol indicators operate on.
+        """
+        counts = self.mask.sum(axis=1)
+        width = int(bars or (counts.max() if len(counts) else 0))
+        out = np.full((len(self.symbols), width), np.nan, dtype=self.fields[field].dtype)
+        for i in range(len(self.symbols)):
+            values = self.fields[field][i, self.mask[i]][-width:] if width else []
+            out[i, width - len(values):] = values
+        return out
+
+    def select(self, symbols=None, date_mask=None):
+        """Sub-panel for some symbols and/or dates"""
+        rows = (np.arange(len(self.symbols)) if symbols is None
+                else np.array([self._positions[symbol] for symbol in symbols if symbol in self._positions],
+                              dtype=np.intp))
+        cols = slice(None) if date_mask is None else date_mask
+        return PricePanel([self.symbols[i] for i in rows], self.dates[cols],
+                          {name: array[rows][:, cols] for name, array in self.fields.items()},
+                          self.mask[rows][:, cols], self.crypto[rows], self.source_key)
+
+    def equity_calendar(self):
+        """Panel restricted to days on which any non-crypto symbol traded"""
+        if self.crypto.all():
+            return self
+        return self.select(date_mask=self.mask[~self.crypto].any(axis=0))
+
+    def ffill(self, field='Close'):
+        """Field with each symbol's last bar carried forward over missing days"""
+        values = self.fields[field]
+        positions = np.where(self.mask, np.arange(values.shape[1]), 0)
+        np.maximum.accumulate(positions, axis=1, out=positions)
+        filled = np.take_along_axis(values, positions, axis=1)
+        # Before a symbol's first bar there is nothing to carry
+        filled[~np.maximum.accumulate(self.mask, axis=1)] = np.nan
+        return filled
+
+    def last(self, field='Close'):
+        """Latest value of a field per symbol"""
+        return self.ffill(field)[:, -1]
+
+    def returns(self, periods=1, field='Close'):
+        """Percent change over ``periods`` of each symbol's own bars, aligned to the panel dates"""
+        # Every symbol's bars end to end, with each bar's position within its own symbol
+        counts = self.mask.sum(axis=1)
+        values = self.fields[field][self.mask]
+        bar = np.arange(len(values)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        changes = np.full(len(values), np.nan, dtype=values.dtype)
+        if periods < len(values):
+            np.divide(values[periods:], values[:-periods], out=changes[periods:])
+            changes[periods:] -= 1
+        # The first ``periods`` bars of a symbol would divide by the previous symbol's bars
+        changes[bar < periods] = np.nan
+        result = np.full(self.shape, np.nan, dtype=values.dtype)
+        result[self.mask] = changes
+        return result
+
+    def to_frame(self, field='Close'):
+        """Field as a symbols x dates DataFrame"""
+        return pd.DataFrame(self.fields[field], index=pd.Index(self.symbols, name='Symbol'),
+                            columns=pd.DatetimeIndex(self.dates, name='Date'))
+
+
+def panel_source_key(catalog):
+    """Identity of the data behind a panel: every canonical file's path, mtime and size"""
+    return tuple(sorted(
+        (entry['file'], catalog.files[entry['file']]['mtime_ns'], catalog.files[entry['file']]['size'])
+        for entry in catalog.entries.values() if entry['file'] in catalog.files
+    ))
+
+
+def build_panel(analyzer, symbols=None, dtype=np.float64):
+    """Panel of every catalog symbol (or ``symbols``) loaded through the analyzer's store path.
+
+    A float32 panel is built from the compact series the frame cache holds
+    (``load_compact_series``) rather than from float64 frames.
+    """
+    catalog = analyzer.catalog
+    source_key = panel_source_key(catalog)
+    compact = np.dtype(dtype) == np.float32
+    load = analyzer.load_compact_series if compact else analyzer.load_stock_data
+    histories = {}
+    for symbol in symbols or catalog.symbols():
+        history = load(symbol)
+        if history is not None and len(history):
+            histories[symbol] = history
+    crypto_symbols = set(catalog.symbols(CRYPTO_CATEGORY))
+    if compact:
+        return PricePanel.from_series(histories, crypto_symbols, dtype, source_key)
+    return PricePanel.from_frames(histories, crypto_symbols, dtype, source_key)
+
+
+def get_price_panel(analyzer=None, dtype=np.float64):
+    """Process-wide universe panel, rebuilt when the catalog picks up changed files.
+
+    The catalog re-checks its directory signature at most every
+    ``REFRESH_INTERVAL`` seconds, so most calls are a dictionary lookup.
+    """
+    if analyzer is None:
+        from .stock_analyzer import StockAnalyzer
+        analyzer = StockAnalyzer()
+
+    catalog = analyzer.catalog
+    catalog.maybe_refresh()
+    key = (catalog.data_dir, np.dtype(dtype).str)
+    cached = _panels.get(key)
+    if cached is None or cached[0] != catalog.built_at:
+        with _panels_lock:
+            cached = _panels.get(key)
+            if cached is None or cached[0] != catalog.built_at:
+                cached = (catalog.built_at, build_panel(analyzer, dtype=dtype))
+                _panels[key] = cached
+    return cached[1]
+
+
+def main():
+    from .stock_analyzer import StockAnalyzer
+
+    parser = argparse.ArgumentParser(description="Build the universe price panel and time a cross-sectional pass")
+    parser.add_argument('--compact', action='store_true', help="float32 panel from the compact series")
+    args = parser.parse_args()
+
+    analyzer = StockAnalyzer()
+    dtype = np.float32 if args.compact else np.float64
+
+    start = time.perf_counter()
+    panel = build_panel(analyzer, dtype=dtype)
+    build_time = time.perf_counter() - start
+    equity = panel.equity_calendar()
+    print(f"Panel {panel.shape[0]} symbols x {panel.shape[1]} dates ({equity.shape[1]} equity days), "
+          f"{panel.nbytes / 1e6:.1f} MB, built in {build_time:.2f}s")
+
+    start = time.perf_counter()
+    panel_returns = panel.returns(252)
+    latest = np.take_along_axis(panel_returns, (panel.shape[1] - 1 - np.argmax(
+        panel.mask[:, ::-1], axis=1))[:, None], axis=1)[:, 0]
+    panel_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    looped = []
+    for symbol in panel.symbols:
+        close = analyzer.load_stock_data(symbol)['Close']
+        looped.append(close.iloc[-1] / close.iloc[-253] - 1 if len(close) > 252 else np.nan)
+    loop_time = time.perf_counter() - start
+
+    agree = np.allclose(latest, np.array(looped, dtype=dtype), equal_nan=True, rtol=1e-5)
+    print(f"1-year return for every symbol: panel {panel_time * 1000:.1f} ms, "
+          f"per-symbol frames {loop_time * 1000:.1f} ms (results agree: {agree})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,487 @@
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .market_catalog import HEADER_LINES, HISTORY_SUFFIX, get_catalog
+
+PRICE_COLUMNS = ['Close', 'High', 'Low', 'Open', 'Volume']
+STORE_SUBDIR = 'prices'
+MANIFEST_FILENAME = 'manifest.json'
+QUALITY_FILENAME = 'quality.json'
+STORE_VERSION = 3
+
+# Relative slack before High/Low are reported as inconsistent with Open/Close
+OHLC_TOLERANCE = 1e-6
+
+TAIL_BLOCK_SIZE = 64 * 1024
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def read_history_csv(file_path, float_precision=None):
+    """Parse a yfinance history CSV into a clean Date-indexed OHLCV frame (the same rows the store holds)"""
+    names, skip = read_history_header(file_path)
+    raw = pd.read_csv(file_path, skiprows=skip, header=None, names=names, usecols=['Date'] + PRICE_COLUMNS,
+                      float_precision=float_precision)
+    return clean_history(raw)[0]
+
+
+def read_history_csv_tail(file_path, rows):
+    """Parse only the last ``rows`` lines of a history CSV, seeking from the end"""
+    with open(file_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        buffer = b''
+        # One extra newline so the first kept line is complete
+        while position > 0 and buffer.rstrip(b'\r\n').count(b'\n') <= rows:
+            step = min(TAIL_BLOCK_SIZE, position)
+            position -= step
+            f.seek(position)
+            buffer = f.read(step) + buffer
+
+    if position == 0:
+        # Fewer lines than requested past the header: parse the whole file
+        return read_history_csv(file_path).tail(rows)
+
+    names, _ = read_history_header(file_path)
+    lines = buffer.rstrip(b'\r\n').split(b'\n')[-rows:]
+    raw = pd.read_csv(io.BytesIO(b'\n'.join(lines)), header=None, names=names, usecols=['Date'] + PRICE_COLUMNS)
+    return clean_history(raw)[0]
+
+
+def clean_history(raw):
+    """Validate parsed Date + OHLCV columns into a clean frame. Returns (frame, counts of what was fixed).
+
+    Enforces dtypes (datetime64 dates, float64 prices, int64 volume),
+    drops rows with a bad date, missing or non-positive prices or negative
+    volume, sorts by date and keeps the last row of any duplicated date.
+    Every load path (stores and CSV fallback) goes through this.
+    """
+    dates = pd.to_datetime(raw['Date'].astype(str).str[:10], format='%Y-%m-%d', errors='coerce')
+    values = raw[PRICE_COLUMNS].apply(pd.to_numeric, errors='coerce')
+    bad_date = dates.isna().to_numpy()
+    bad_values = ~bad_date & (values.isna().any(axis=1).to_numpy()
+                              | (values[PRICE_COLUMNS[:-1]] <= 0).any(axis=1).to_numpy()
+                              | (values['Volume'] < 0).to_numpy())
+    keep = ~(bad_date | bad_values)
+
+    df = values[keep]
+    df.index = pd.DatetimeIndex(dates[keep], name='Date')
+    df = df.astype({col: np.float64 for col in PRICE_COLUMNS[:-1]})
+    df['Volume'] = df['Volume'].round().astype(np.int64)
+
+    out_of_order = int((np.diff(df.index.values) < np.timedelta64(0)).sum())
+    if out_of_order:
+        df = df.sort_index(kind='stable')
+    duplicated = df.index.duplicated(keep='last')
+    if duplicated.any():
+        df = df[~duplicated]
+    return df, {
+        'bad_dates': int(bad_date.sum()),
+        'bad_values': int(bad_values.sum()),
+        'out_of_order': out_of_order,
+        'duplicate_dates': int(duplicated.sum())
+    }
+
+
+def read_history_header(file_path):
+    """Column names and header line count of a history CSV (yfinance three-line or plain header)"""
+    with open(file_path, 'r') as f:
+        lines = [f.readline() for _ in range(HEADER_LINES)]
+
+    first = lines[0].strip().split(',')
+    if first[0] == 'Price':
+        skip = 1
+        while skip < len(lines) and lines[skip].split(',', 1)[0] in ('Ticker', 'Date'):
+            skip += 1
+    elif first[0] == 'Date':
+        skip = 1
+    else:
+        raise ValueError(f"Unrecognized header in {file_path}: {lines[0].strip()!r}")
+
+    names = ['Date'] + [name.strip() for name in first[1:]]
+    missing = [col for col in PRICE_COLUMNS if col not in names]
+    if missing:
+        raise ValueError(f"Missing columns {missing} in {file_path}")
+    return names, skip
+
+
+def ingest_history_csv(file_path):
+    """Parse and validate a history CSV once for the stores. Returns (clean frame, quality report).
+
+    Cleaning is ``clean_history``; inconsistent High/Low bars are reported,
+    not changed.
+    """
+    names, skip = read_history_header(file_path)
+    raw = pd.read_csv(file_path, skiprows=skip, header=None, names=names, usecols=['Date'] + PRICE_COLUMNS)
+    rows_in = len(raw)
+    df, counts = clean_history(raw)
+
+    body_high = np.maximum(df['Open'].values, df['Close'].values)
+    body_low = np.minimum(df['Open'].values, df['Close'].values)
+    inconsistent = ((df['High'].values < body_high * (1 - OHLC_TOLERANCE))
+                    | (df['Low'].values > body_low * (1 + OHLC_TOLERANCE)))
+    gaps = np.diff(df.index.values).astype('timedelta64[D]').astype(np.int64)
+
+    report = {
+        'rows_in': rows_in,
+        'rows': len(df),
+        **counts,
+        'ohlc_inconsistent': int(inconsistent.sum()),
+        'max_gap_days': int(gaps.max()) if len(gaps) else 0,
+        'first_date': df.index[0].strftime('%Y-%m-%d') if len(df) else None,
+        'last_date': df.index[-1].strftime('%Y-%m-%d') if len(df) else None
+    }
+    if not len(df):
+        report['status'] = 'error'
+    elif report['rows'] != rows_in or counts['out_of_order'] or report['ohlc_inconsistent']:
+        report['status'] = 'warning'
+    else:
+        report['status'] = 'ok'
+    return df, report
+
+
+def validate_history_csv(file_path):
+    """Quality report for one CSV (ValueError and parse failures become error reports)"""
+    try:
+        return ingest_history_csv(file_path)[1]
+    except Exception as e:
+        return {'status': 'error', 'error': str(e)}
+
+
+def frame_to_records(df):
+    """Typed structured array (Date + OHLCV) for a cleaned frame"""
+    dtype = [('Date', df.index.values.dtype)] + [(col, df[col].values.dtype) for col in PRICE_COLUMNS]
+    records = np.empty(len(df), dtype=dtype)
+    records['Date'] = df.index.values
+    for col in PRICE_COLUMNS:
+        records[col] = df[col].values
+    return records
+
+
+def records_to_frame(records):
+    """Date-indexed frame from a (possibly memory-mapped) structured array"""
+    index = pd.DatetimeIndex(records['Date'], name='Date')
+    return pd.DataFrame({col: records[col] for col in PRICE_COLUMNS}, index=index)
+
+
+def drop_page_cache(file_path):
+    """Ask the kernel to evict a file from the page cache (cold-read benchmarks)"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+class PriceStore:
+    """Binary columnar mirror of the market_data CSVs.
+
+    Each history CSV is validated once by ``ingest_history_csv`` and stored
+    as one ``.npy`` structured array under ``market_store/prices/`` which is
+    opened with ``mmap_mode='r'``, so loads do no parsing or cleaning at
+    all. The manifest records the source mtime and size; entries that no
+    longer match are treated as missing and callers fall back to the CSV.
+    Per-file quality reports are kept in ``market_store/quality.json``.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.prices_dir = os.path.join(store_dir, STORE_SUBDIR)
+        self.manifest_path = os.path.join(self.prices_dir, MANIFEST_FILENAME)
+        self.quality_path = os.path.join(store_dir, QUALITY_FILENAME)
+        self.manifest = {}
+        self._manifest_mtime = None
+        self._lock = threading.Lock()
+        self._reload_manifest()
+
+    def _reload_manifest(self):
+        """Re-read the manifest if it changed on disk. Returns True if reloaded"""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._manifest_mtime:
+            return False
+
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read price store manifest: {e}")
+            return False
+
+        if manifest.get('version') != STORE_VERSION:
+            return False
+        with self._lock:
+            self.manifest = manifest.get('files', {})
+            self._manifest_mtime = mtime
+        return True
+
+    def _write_manifest(self):
+        os.makedirs(self.prices_dir, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': STORE_VERSION, 'files': self.manifest}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+        self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+
+    def load_quality(self):
+        try:
+            with open(self.quality_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def write_quality(self, reports):
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp_path = f"{self.quality_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(reports, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.quality_path)
+
+    def store_path(self, rel_path):
+        return os.path.join(self.prices_dir, rel_path[:-len(HISTORY_SUFFIX)] + '.npy')
+
+    def lookup(self, rel_path, source_stats):
+        """Store file for a CSV if it was built from the same source version"""
+        if source_stats is None:
+            return None
+        entry = self.manifest.get(rel_path)
+        if not self._is_current(entry, source_stats) and self._reload_manifest():
+            entry = self.manifest.get(rel_path)
+        if not self._is_current(entry, source_stats):
+            return None
+        return self.store_path(rel_path)
+
+    @staticmethod
+    def _is_current(entry, source_stats):
+        return (entry is not None and entry['mtime_ns'] == source_stats['mtime_ns']
+                and entry['size'] == source_stats['size'])
+
+    def load_records(self, rel_path, source_stats):
+        """Memory-mapped structured array for a CSV, or None when not stored"""
+        path = self.lookup(rel_path, source_stats)
+        if path is None:
+            return None
+        try:
+            return np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+    def load(self, rel_path, source_stats, tail=None):
+        """Date-indexed OHLCV frame for a CSV (optionally its last rows), or None when not stored"""
+        records = self.load_records(rel_path, source_stats)
+        if records is None:
+            return None
+        if tail:
+            # Slicing the memory map only pages in the rows that are used
+            records = records[-tail:]
+        return records_to_frame(records)
+
+    def build(self, catalog, force=False):
+        """Validate and convert every catalog CSV whose store entry is missing or stale"""
+        catalog.refresh()
+        self._reload_manifest()
+        quality = self.load_quality()
+        built, skipped, failed = 0, 0, 0
+
+        for rel_path, stats in sorted(catalog.files.items()):
+            if not force and self._is_current(self.manifest.get(rel_path), stats):
+                skipped += 1
+                continue
+
+            source = os.path.join(catalog.data_dir, rel_path)
+            try:
+                df, report = ingest_history_csv(source)
+                quality[rel_path] = report
+                if report['status'] == 'error':
+                    raise ValueError("no valid rows")
+                records = frame_to_records(df)
+                target = self.store_path(rel_path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                tmp_path = f"{target}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, records)
+                os.replace(tmp_path, target)
+            except Exception as e:
+                print(f"Failed to store {rel_path}: {e}")
+                quality.setdefault(rel_path, {'status': 'error', 'error': str(e)})
+                failed += 1
+                continue
+
+            self.manifest[rel_path] = {
+                'mtime_ns': stats['mtime_ns'],
+                'size': stats['size'],
+                'rows': int(len(records))
+            }
+            built += 1
+
+        live = set(catalog.files)
+        for rel_path in [p for p in self.manifest if p not in live]:
+            del self.manifest[rel_path]
+            try:
+                os.remove(self.store_path(rel_path))
+            except OSError:
+                pass
+
+        self._write_manifest()
+        self.write_quality({rel_path: report for rel_path, report in quality.items() if rel_path in live})
+        return {'built': built, 'skipped': skipped, 'failed': failed}
+
+
+def get_price_store(store_dir):
+    """Process-wide price store for a store directory"""
+    key = os.path.abspath(store_dir)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = PriceStore(key)
+                _stores[key] = store
+    return store
+
+
+def validate_tree(catalog, workers=None):
+    """Quality report for every catalog CSV, validated in parallel worker processes"""
+    catalog.refresh()
+    rel_paths = sorted(catalog.files)
+    paths = [os.path.join(catalog.data_dir, rel_path) for rel_path in rel_paths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        reports = list(executor.map(validate_history_csv, paths, chunksize=8))
+    return dict(zip(rel_paths, reports))
+
+
+def _time_loads(paths, loader, cold):
+    timings = []
+    for path in paths:
+        if cold:
+            drop_page_cache(path)
+        start = time.perf_counter()
+        loader()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def benchmark(catalog, store, symbol='AAPL', repeat=5):
+    """Compare CSV parsing with store loads, cold and warm, per symbol and universe"""
+    results = {}
+
+    entry = catalog.resolve(symbol)
+    if entry is None:
+        raise ValueError(f"Unknown symbol {symbol}")
+    rel_path = entry['file']
+    csv_path = os.path.join(catalog.data_dir, rel_path)
+    stats = catalog.files[rel_path]
+    npy_path = store.lookup(rel_path, stats)
+    if npy_path is None:
+        raise RuntimeError("Price store is missing or stale; run the build step first")
+
+    for cold in (True, False):
+        label = 'cold' if cold else 'warm'
+        csv_times = _time_loads([csv_path] * repeat, lambda: read_history_csv(csv_path), cold)
+        store_times = _time_loads([npy_path] * repeat, lambda: store.load(rel_path, stats), cold)
+        results[f"{symbol} {label}"] = (min(csv_times), min(store_times))
+
+    universe = sorted(catalog.files.items())
+    for cold in (True, False):
+        label = 'cold' if cold else 'warm'
+        if cold:
+            for rel_path, stats in universe:
+                drop_page_cache(os.path.join(catalog.data_dir, rel_path))
+        start = time.perf_counter()
+        for rel_path, stats in universe:
+            read_history_csv(os.path.join(catalog.data_dir, rel_path))
+        csv_total = time.perf_counter() - start
+
+        if cold:
+            for rel_path, stats in universe:
+                drop_page_cache(store.store_path(rel_path))
+        start = time.perf_counter()
+        for rel_path, stats in universe:
+            store.load(rel_path, stats)
+        store_total = time.perf_counter() - start
+        results[f"universe ({len(universe)} files) {label}"] = (csv_total, store_total)
+
+    return results
+
+
+def check(catalog, store, tail=430):
+    """Files whose CSV fallback (full or last ``tail`` rows) differs from the stored frame"""
+    catalog.refresh()
+    mismatches = []
+    checked = 0
+    for rel_path, stats in sorted(catalog.files.items()):
+        stored = store.load(rel_path, stats)
+        if stored is None:
+            continue
+        checked += 1
+        file_path = os.path.join(catalog.data_dir, rel_path)
+        if not read_history_csv(file_path).equals(stored):
+            mismatches.append(f"{rel_path}: CSV frame differs from the store")
+        if not read_history_csv_tail(file_path, tail).equals(stored.tail(tail)):
+            mismatches.append(f"{rel_path}: last {tail} CSV rows differ from the store")
+    return mismatches, checked
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, validate, check or benchmark the binary price store")
+    parser.add_argument('command', choices=['build', 'validate', 'check', 'bench'])
+    parser.add_argument('--data-dir', default=None)
+    parser.add_argument('--force', action='store_true', help="Rebuild every entry")
+    parser.add_argument('--symbol', default='AAPL', help="Symbol for the per-symbol benchmark")
+    parser.add_argument('--workers', type=int, default=None, help="Validation processes (default: CPU count)")
+    args = parser.parse_args()
+
+    catalog = get_catalog(args.data_dir)
+    store = get_price_store(catalog.store_dir)
+
+    if args.command == 'build':
+        start = time.perf_counter()
+        summary = store.build(catalog, force=args.force)
+        print(f"Built {summary['built']}, skipped {summary['skipped']}, failed {summary['failed']} "
+              f"in {time.perf_counter() - start:.2f}s -> {store.prices_dir}")
+    elif args.command == 'validate':
+        start = time.perf_counter()
+        reports = validate_tree(catalog, args.workers)
+        for rel_path, report in sorted(reports.items()):
+            if report['status'] != 'ok':
+                details = report.get('error') or ', '.join(
+                    f"{key} {report[key]}" for key in ('bad_dates', 'bad_values', 'out_of_order',
+                                                       'duplicate_dates', 'ohlc_inconsistent') if report[key])
+                print(f"{report['status']:<8} {rel_path}: {details}")
+        store.write_quality(reports)
+        counts = {status: sum(1 for r in reports.values() if r['status'] == status)
+                  for status in ('ok', 'warning', 'error')}
+        print(f"Validated {len(reports)} files in {time.perf_counter() - start:.2f}s: {counts['ok']} ok, "
+              f"{counts['warning']} warnings, {counts['error']} errors -> {store.quality_path}")
+        if counts['error']:
+            sys.exit(1)
+    elif args.command == 'check':
+        mismatches, checked = check(catalog, store)
+        for mismatch in mismatches:
+            print(f"MISMATCH {mismatch}")
+        print(f"{checked - len({m.split(':')[0] for m in mismatches})} of {checked} files load the same from "
+              f"CSV and from the store")
+        if mismatches:
+            sys.exit(1)
+    else:
+        for name, (csv_time, store_time) in benchmark(catalog, store, args.symbol).items():
+            print(f"{name:<32} csv {csv_time * 1000:9.2f} ms   store {store_time * 1000:9.2f} ms   "
+                  f"x{csv_time / store_time:6.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+import argparse
+import math
+import sys
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from . import batch_indicators
+from .indicator_snapshots import SNAPSHOT_ROWS
+from .price_panel import get_price_panel
+
+# Ordered so that comparisons follow the labels (e.g. trend >= UPTREND)
+TRENDS = ['STRONG_DOWNTREND', 'DOWNTREND', 'SIDEWAYS', 'UPTREND', 'STRONG_UPTREND']
+RECOMMENDATIONS = ['STRONG_SELL', 'SELL', 'HOLD', 'BUY', 'STRONG_BUY']
+BOLLINGER_POSITIONS = ['below', 'middle', 'above']
+
+SIGNAL_FLAGS = ['macd_bullish', 'macd_bearish', 'rsi_overbought', 'rsi_oversold', 'price_above_sma', 'volume_spike']
+LABEL_COLUMNS = {'trend': TRENDS, 'recommendation': RECOMMENDATIONS, 'bollinger_position': BOLLINGER_POSITIONS}
+NUMERIC_COLUMNS = ['current_price', 'price_change_pct', 'volatility', 'support', 'resistance', 'rsi',
+                   'volume_ratio', 'risk_score']
+
+# Price and indicator values agree with per-symbol advice to float rounding
+CHECK_RTOL = 1e-9
+
+_states = {}
+_states_lock = threading.Lock()
+
+
+def trend_codes(price_change_pct, weak=2, strong=5):
+    """``analyze_trend``'s classification as ``TRENDS`` indexes, for arrays of percent changes"""
+    return np.select([price_change_pct > strong, price_change_pct > weak, price_change_pct < -strong,
+                      price_change_pct < -weak], [4, 3, 0, 1], default=2).astype(np.int8)
+
+
+def bollinger_codes(close, upper, lower):
+    """``bollinger_position`` as ``BOLLINGER_POSITIONS`` indexes"""
+    return np.select([close > upper, close < lower], [2, 0], default=1).astype(np.int8)
+
+
+def recommendation_codes(trend, macd_bullish, macd_bearish, rsi_overbought, rsi_oversold, price_above_sma,
+                         volume_spike, bollinger):
+    """``_generate_recommendation`` as ``RECOMMENDATIONS`` indexes, element-wise over signal arrays"""
+    bullish = macd_bullish.astype(np.int8) + rsi_oversold + price_above_sma + volume_spike + (bollinger == 0)
+    bearish = macd_bearish.astype(np.int8) + rsi_overbought + (bollinger == 2)
+    return np.select([trend == 4, trend == 0, bullish > bearish + 1, bearish > bullish + 1],
+                     [4, 0, 3, 1], default=2).astype(np.int8)
+
+
+def risk_scores(volatility, trend, rsi_overbought, rsi_oversold, volume_spike, tiers=(20, 30, 50)):
+    """``_calculate_risk_score`` element-wise over arrays (``tiers``: the volatility steps, ascending)"""
+    low, mid, high = tiers
+    with np.errstate(invalid='ignore'):
+        score = (5 + np.select([volatility > high, volatility > mid, volatility > low], [3, 2, 1], default=0)
+                 + np.select([(trend == 0) | (trend == 4), (trend == 1) | (trend == 3)], [2, 1], default=0)
+                 + (rsi_overbought | rsi_oversold) + volume_spike)
+    return np.clip(score, 1, 10).astype(np.int8)
+
+
+def _labels(names, values):
+    return np.array([names.index(value) for value in values], dtype=np.int8)
+
+
+class ScreenerState:
+    """Latest trend, signals, recommendation and risk of every symbol as aligned arrays.
+
+    Row i describes ``symbols[i]`` the way ``generate_investment_advice``
+    would for the same analysis period. Label columns hold indexes into
+    ``TRENDS``, ``RECOMMENDATIONS`` and ``BOLLINGER_POSITIONS``. Built once
+    per data version; screening only masks and sorts the arrays.
+    """
+
+    def __init__(self, symbols, categories, last_dates, columns, analysis_period, source_key=None):
+        self.symbols = symbols
+        self.categories = categories
+        self.last_dates = last_dates
+        self.columns = columns
+        self.analysis_period = analysis_period
+        self.source_key = source_key
+        self._members = {}
+        for i, symbol_categories in enumerate(categories):
+            for category in symbol_categories:
+                self._members.setdefault(category, []).append(i)
+
+    @classmethod
+    def from_panel(cls, panel, categories, analysis_period, window):
+        """Evaluate ``analyze_trend``, ``analyze_technical_signals`` and the scoring rules for every panel symbol.
+
+        The batch indicators run over each symbol's last ``window`` bars, the
+        same tail per-symbol advice computes them on.
+        """
+        close = panel.bar_matrix('Close', window)
+        volume = panel.bar_matrix('Volume', window)
+        indicators = batch_indicators.compute_indicators(close, volume)
+        rows = np.arange(len(panel.symbols))
+
+        # Symbols with too few bars give all-NaN slices; their comparisons are simply False
+        with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            # analyze_trend over the last analysis_period bars
+            period_close = close[:, -analysis_period:]
+            start = period_close[rows, np.argmax(~np.isnan(period_close), axis=1)]
+            current = close[:, -1]
+            price_change_pct = (current - start) / start * 100
+            trend = trend_codes(price_change_pct)
+            volatility = np.nanstd(np.diff(period_close, axis=1) / period_close[:, :-1], axis=1, ddof=1)
+            volatility *= np.sqrt(252) * 100
+            support = np.nanmin(panel.bar_matrix('Low', analysis_period), axis=1)
+            resistance = np.nanmax(panel.bar_matrix('High', analysis_period), axis=1)
+
+            # analyze_technical_signals
+            macd, signal = indicators['MACD'], indicators['MACD_Signal']
+            has_previous = ~np.isnan(close[:, -2])
+            macd_bullish = has_previous & (macd[:, -2] <= signal[:, -2]) & (macd[:, -1] > signal[:, -1])
+            macd_bearish = has_previous & (macd[:, -2] >= signal[:, -2]) & (macd[:, -1] < signal[:, -1])
+            rsi = indicators['RSI'][:, -1]
+            rsi_overbought = rsi > 70
+            rsi_oversold = rsi < 30
+            price_above_sma = current > indicators['SMA_20'][:, -1]
+            volume_spike = volume[:, -1] > np.nanmean(volume[:, -5:], axis=1) * 1.5
+            bollinger = bollinger_codes(current, indicators['BB_Upper'][:, -1], indicators['BB_Lower'][:, -1])
+            volume_ratio = indicators['Volume_Ratio'][:, -1]
+
+        recommendation = recommendation_codes(trend, macd_bullish, macd_bearish, rsi_overbought, rsi_oversold,
+                                              price_above_sma, volume_spike, bollinger)
+        risk_score = risk_scores(volatility, trend, rsi_overbought, rsi_oversold, volume_spike)
+
+        last_positions = panel.shape[1] - 1 - np.argmax(panel.mask[:, ::-1], axis=1)
+        last_dates = [str(date)[:10] for date in panel.dates[last_positions]]
+        columns = {
+            'current_price': current,
+            'price_change_pct': price_change_pct,
+            'volatility': volatility,
+            'support': support,
+            'resistance': resistance,
+            'rsi': rsi,
+            'volume_ratio': volume_ratio,
+            'risk_score': risk_score,
+            'trend': trend,
+            'recommendation': recommendation,
+            'bollinger_position': bollinger,
+            'macd_bullish': macd_bullish,
+            'macd_bearish': macd_bearish,
+            'rsi_overbought': rsi_overbought,
+            'rsi_oversold': rsi_oversold,
+            'price_above_sma': price_above_sma,
+            'volume_spike': volume_spike
+        }
+        symbol_categories = [categories.get(symbol, []) for symbol in panel.symbols]
+        return cls(list(panel.symbols), symbol_categories, last_dates, columns, analysis_period, panel.source_key)
+
+    def mask(self, filters=None):
+        """Rows passing every filter.
+
+        Filters: a signal flag (``rsi_oversold``, ...) mapped to True/False;
+        ``trend``, ``recommendation`` or ``bollinger_position`` mapped to a
+        label or list of labels; ``category``; ``symbols``; and
+        ``min_<column>`` / ``max_<column>`` for numeric columns.
+        """
+        keep = np.ones(len(self.symbols), dtype=bool)
+        for name, value in (filters or {}).items():
+            if value is None:
+                continue
+            if name in SIGNAL_FLAGS:
+                keep &= self.columns[name] == bool(value)
+            elif name in LABEL_COLUMNS:
+                values = [value] if isinstance(value, str) else value
+                unknown = [v for v in values if v not in LABEL_COLUMNS[name]]
+                if unknown:
+                    raise ValueError(f"Unknown {name} {', '.join(unknown)}")
+                keep &= np.isin(self.columns[name], _labels(LABEL_COLUMNS[name], values))
+            elif name == 'category':
+                rows = np.zeros(len(self.symbols), dtype=bool)
+                rows[self._members.get(value, [])] = True
+                keep &= rows
+            elif name == 'symbols':
+                keep &= np.isin(np.array(self.symbols), [symbol.upper() for symbol in value])
+            elif name[:4] in ('min_', 'max_') and name[4:] in NUMERIC_COLUMNS:
+                column = self.columns[name[4:]]
+                with np.errstate(invalid='ignore'):
+                    keep &= column >= float(value) if name[:4] == 'min_' else column <= float(value)
+            else:
+                raise ValueError(f"Unknown screener filter {name}")
+        return keep
+
+    def screen(self, filters=None, sort_by=None, descending=True, limit=None):
+        """Rows matching ``filters``, ordered by a numeric or label column (missing values last), at most ``limit``"""
+        rows = np.flatnonzero(self.mask(filters))
+        if sort_by:
+            if sort_by == 'symbol':
+                order = sorted(range(len(rows)), key=lambda i: self.symbols[rows[i]], reverse=descending)
+            elif sort_by in self.columns:
+                values = self.columns[sort_by][rows].astype(np.float64)
+                order = np.argsort(-values if descending else values, kind='stable')
+            else:
+                raise ValueError(f"Cannot sort by {sort_by}")
+            rows = rows[order]
+        if limit is not None:
+            rows = rows[:max(0, int(limit))]
+        return [self.row(i) for i in rows]
+
+    def row(self, i):
+        """One symbol's state in the shape of advice (NaN as None, for JSON)"""
+        columns = self.columns
+        return {
+            'symbol': self.symbols[i],
+            'categories': self.categories[i],
+            'last_date': self.last_dates[i],
+            'current_price': _number(columns['current_price'][i]),
+            'trend': TRENDS[columns['trend'][i]],
+            'price_change_pct': _number(columns['price_change_pct'][i]),
+            'volatility': _number(columns['volatility'][i]),
+            'support': _number(columns['support'][i]),
+            'resistance': _number(columns['resistance'][i]),
+            'rsi': _number(columns['rsi'][i]),
+            'volume_ratio': _number(columns['volume_ratio'][i]),
+            'technical_signals': dict(
+                {flag: bool(columns[flag][i]) for flag in SIGNAL_FLAGS},
+                bollinger_position=BOLLINGER_POSITIONS[columns['bollinger_position'][i]]
+            ),
+            'recommendation': RECOMMENDATIONS[columns['recommendation'][i]],
+            'risk_score': int(columns['risk_score'][i]),
+            'analysis_period': self.analysis_period
+        }
+
+
+def _number(value):
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def filters_from_query(args):
+    """Screener filters from query-string style ``{name: str}`` arguments.
+
+    Flags accept true/false/1/0, label filters accept comma-separated
+    lists, and paging/sorting keys are ignored.
+    """
+    filters = {}
+    for name, value in args.items():
+        if name in ('sort', 'order', 'limit', 'period') or value == '':
+            continue
+        if name in SIGNAL_FLAGS:
+            if value.lower() not in ('true', 'false', '1', '0'):
+                raise ValueError(f"{name} must be true or false")
+            filters[name] = value.lower() in ('true', '1')
+        elif name in LABEL_COLUMNS or name == 'symbols':
+            filters[name] = [v.strip() for v in value.split(',') if v.strip()]
+        else:
+            filters[name] = value
+    return filters
+
+
+def get_screener_state(analyzer, analysis_period=30):
+    """Process-wide screener state, rebuilt when any underlying file changes"""
+    panel = get_price_panel(analyzer)
+    key = (analyzer.catalog.data_dir, analysis_period)
+    state = _states.get(key)
+    if state is None or state.source_key != panel.source_key:
+        with _states_lock:
+            state = _states.get(key)
+            if state is None or state.source_key != panel.source_key:
+                categories = {symbol: entry['categories'] for symbol, entry in analyzer.catalog.entries.items()}
+                # The snapshot window, so daily values match snapshot-served advice exactly
+                window = analyzer.analysis_window(max(analysis_period, SNAPSHOT_ROWS))
+                state = ScreenerState.from_panel(panel, categories, analysis_period, window)
+                _states[key] = state
+    return state
+
+
+def check(analyzer, analysis_period=30):
+    """Compare every screener row with ``generate_investment_advice`` for the same symbol"""
+    state = get_screener_state(analyzer, analysis_period)
+    failures = {}
+    for i, symbol in enumerate(state.symbols):
+        row = state.row(i)
+        advice = analyzer.generate_investment_advice(symbol, analysis_period)
+        failed = [name for name in ('trend', 'recommendation', 'risk_score', 'technical_signals')
+                  if row[name] != advice.get(name)]
+        failed += [name for name in ('current_price', 'price_change_pct', 'volatility', 'support', 'resistance')
+                   if not _close(row[name], advice.get(name))]
+        if failed:
+            failures[symbol] = failed
+    return failures, len(state.symbols)
+
+
+def _close(value, expected):
+    if value is None or expected is None or math.isnan(expected):
+        return value is None and (expected is None or math.isnan(expected))
+    return math.isclose(value, expected, rel_tol=CHECK_RTOL, abs_tol=1e-12)
+
+
+def main():
+    from .stock_analyzer import StockAnalyzer
+
+    parser = argparse.ArgumentParser(description="Check or benchmark the vectorized market screener")
+    parser.add_argument('command', choices=['check', 'bench'])
+    parser.add_argument('--period', type=int, default=30)
+    args = parser.parse_args()
+
+    analyzer = StockAnalyzer()
+    if args.command == 'check':
+        failures, checked = check(analyzer, args.period)
+        for symbol, columns in sorted(failures.items()):
+            print(f"MISMATCH {symbol}: {', '.join(columns)}")
+        print(f"{checked - len(failures)} of {checked} symbols match generate_investment_advice")
+        if failures:
+            sys.exit(1)
+        return
+
+    start = time.perf_counter()
+    state = get_screener_state(analyzer, args.period)
+    build_time = time.perf_counter() - start
+
+    screens = [
+        ('oversold', {'rsi_oversold': True}, 'rsi', False),
+        ('bullish crossovers by volume', {'macd_bullish': True}, 'volume_ratio', True),
+        ('low-risk uptrends', {'trend': ['UPTREND', 'STRONG_UPTREND'], 'max_risk_score': 6}, 'price_change_pct', True),
+        ('everything by risk', {}, 'risk_score', True),
+    ]
+    print(f"State for {len(state.symbols)} symbols built in {build_time * 1000:.1f} ms")
+    for label, filters, sort_by, descending in screens:
+        best = float('inf')
+        for _ in range(50):
+            start = time.perf_counter()
+            # get_screener_state is included: a request pays its freshness check too
+            rows = get_screener_state(analyzer, args.period).screen(filters, sort_by, descending, limit=20)
+            best = min(best, time.perf_counter() - start)
+        print(f"{label:<30} {len(rows):3d} rows in {best * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
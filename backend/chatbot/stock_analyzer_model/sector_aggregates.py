@@ -0,0 +1,333 @@
+import argparse
+import math
+import sys
+import threading
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from . import batch_indicators
+
+INDEX_BASE = 100.0
+
+# Trailing bars each symbol's latest state is computed on; SMA_50 and RSI are
+# plain rolling means, so any tail this long gives their full-history value
+STATE_BARS = 60
+
+_aggregates = {}
+_aggregates_lock = threading.Lock()
+
+
+def classify_trend(change_pct):
+    """``analyze_trend``'s labels for a percent change"""
+    if change_pct > 5:
+        return 'STRONG_UPTREND'
+    if change_pct > 2:
+        return 'UPTREND'
+    if change_pct < -5:
+        return 'STRONG_DOWNTREND'
+    if change_pct < -2:
+        return 'DOWNTREND'
+    return 'SIDEWAYS'
+
+
+def _right_aligned(series, width):
+    out = np.full((len(series), width), np.nan)
+    for i, values in enumerate(series):
+        values = values[-width:]
+        out[i, width - len(values):] = values
+    return out
+
+
+class SectorAggregates:
+    """Equal-weight index, breadth, volatility and trend of every category, kept current symbol by symbol.
+
+    Per symbol it holds a row of daily returns on the union calendar of all
+    symbols plus its latest close, SMA_50, RSI and ``analysis_period``
+    volatility. ``refresh`` recomputes only symbols whose CSV changed (in
+    one batch) and then re-aggregates every category with a membership
+    matrix product, which is cheap next to loading the data.
+    """
+
+    def __init__(self, analysis_period=30):
+        self.analysis_period = analysis_period
+        self.symbols = []
+        self.stamps = {}
+        self.dates = np.array([], dtype='datetime64[ns]')
+        self.returns = np.empty((0, 0))
+        self.latest = {name: np.empty(0) for name in ('close', 'sma_50', 'rsi', 'volatility')}
+        self.categories = {}
+        self._summaries = None
+        self._indexes = None
+        self._lock = threading.Lock()
+
+    def refresh(self, analyzer):
+        """Bring the aggregates up to date with the catalog. Returns the symbols recomputed"""
+        catalog = analyzer.catalog
+        catalog.refresh()
+        stamps = {}
+        for symbol, entry in catalog.entries.items():
+            stats = catalog.files.get(entry['file'])
+            if stats is not None:
+                stamps[symbol] = (entry['file'], stats['mtime_ns'], stats['size'])
+        categories = {symbol: list(catalog.entries[symbol]['categories']) for symbol in stamps}
+
+        if not self._changes(stamps, categories)[2]:
+            return []
+
+        with self._lock:
+            changed, removed, stale = self._changes(stamps, categories)
+            if not stale:
+                return []
+            frames = {}
+            for symbol in changed:
+                df = analyzer.load_stock_data(symbol)
+                frames[symbol] = df if df is not None and not df.empty else None
+            self.update(frames, removed)
+            for symbol in changed:
+                self.stamps[symbol] = stamps[symbol]
+            for symbol in removed:
+                self.stamps.pop(symbol, None)
+            self.categories = categories
+            self._summaries = self._indexes = None
+        return changed
+
+    def _changes(self, stamps, categories):
+        changed = [symbol for symbol, stamp in stamps.items() if self.stamps.get(symbol) != stamp]
+        removed = [symbol for symbol in self.symbols if symbol not in stamps]
+        return changed, removed, bool(changed or removed or categories != self.categories)
+
+    def update(self, frames, removed=()):
+        """Replace the rows of ``{symbol: price frame or None}`` and drop ``removed`` symbols"""
+        drop = [symbol for symbol in removed if symbol in self.symbols]
+        drop += [symbol for symbol, df in frames.items() if df is None and symbol in self.symbols]
+        if drop:
+            keep = [i for i, symbol in enumerate(self.symbols) if symbol not in set(drop)]
+            self.symbols = [self.symbols[i] for i in keep]
+            self.returns = self.returns[keep]
+            self.latest = {name: values[keep] for name, values in self.latest.items()}
+
+        frames = {symbol: df for symbol, df in frames.items() if df is not None}
+        if not frames:
+            return
+
+        # Extend the calendar with any new dates, moving existing rows onto it
+        dates = np.unique(np.concatenate([self.dates] + [df.index.values for df in frames.values()]))
+        if len(dates) != len(self.dates):
+            returns = np.full((len(self.symbols), len(dates)), np.nan)
+            returns[:, np.searchsorted(dates, self.dates)] = self.returns
+            self.dates, self.returns = dates, returns
+
+        added = [symbol for symbol in frames if symbol not in self.symbols]
+        if added:
+            self.symbols = self.symbols + added
+            self.returns = np.vstack([self.returns, np.full((len(added), len(self.dates)), np.nan)])
+            self.latest = {name: np.concatenate([values, np.full(len(added), np.nan)])
+                           for name, values in self.latest.items()}
+
+        # Latest state of every changed symbol in one batch pass
+        symbols = list(frames)
+        rows = np.array([self.symbols.index(symbol) for symbol in symbols], dtype=np.intp)
+        closes = [df['Close'].to_numpy(dtype=np.float64) for df in frames.values()]
+        close = _right_aligned(closes, max(STATE_BARS, self.analysis_period))
+        first = batch_indicators.first_bars(close)
+        self.latest['close'][rows] = close[:, -1]
+        self.latest['sma_50'][rows] = batch_indicators.rolling_mean(close, 50, first)[:, -1]
+        self.latest['rsi'][rows] = batch_indicators.rsi(close, 14, first)[:, -1]
+        period_close = close[:, -self.analysis_period:]
+        with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            volatility = np.nanstd(np.diff(period_close, axis=1) / period_close[:, :-1], axis=1, ddof=1)
+        self.latest['volatility'][rows] = volatility * np.sqrt(252) * 100
+
+        for row, values, df in zip(rows, closes, frames.values()):
+            self.returns[row] = np.nan
+            self.returns[row, np.searchsorted(self.dates, df.index.values[1:])] = values[1:] / values[:-1] - 1
+
+    def _aggregate(self):
+        """Index series and latest summary of every category from the per-symbol rows"""
+        names = sorted({category for symbols in self.categories.values() for category in symbols})
+        membership = np.zeros((len(names), len(self.symbols)))
+        positions = {name: i for i, name in enumerate(names)}
+        for j, symbol in enumerate(self.symbols):
+            for category in self.categories.get(symbol, []):
+                membership[positions[category], j] = 1.0
+
+        traded = ~np.isnan(self.returns)
+        totals = membership @ np.where(traded, self.returns, 0.0)
+        counts = membership @ traded
+        indexes, summaries = {}, {}
+        for i, name in enumerate(names):
+            days = counts[i] > 0
+            levels = INDEX_BASE * np.cumprod(1 + totals[i, days] / counts[i, days])
+            index = pd.Series(levels, index=pd.DatetimeIndex(self.dates[days], name='Date'), name=name)
+            indexes[name] = index
+            summaries[name] = self._summary(name, membership[i] > 0, index)
+        return indexes, summaries
+
+    def _summary(self, name, members, index):
+        latest = {key: values[members] for key, values in self.latest.items()}
+        with np.errstate(invalid='ignore'):
+            above = latest['close'] > latest['sma_50']
+            oversold = latest['rsi'] < 30
+        has_sma = ~np.isnan(latest['sma_50'])
+        has_rsi = ~np.isnan(latest['rsi'])
+        volatility = latest['volatility'][~np.isnan(latest['volatility'])]
+
+        change_pct = None
+        if len(index) >= 2:
+            recent = index.iloc[-self.analysis_period:]
+            change_pct = float((recent.iloc[-1] / recent.iloc[0] - 1) * 100)
+        return {
+            'category': name,
+            'members': int(members.sum()),
+            'last_date': index.index[-1].date().isoformat() if len(index) else None,
+            'index_level': float(index.iloc[-1]) if len(index) else None,
+            'index_change_pct': change_pct,
+            'trend': classify_trend(change_pct) if change_pct is not None else 'UNKNOWN',
+            'pct_above_sma_50': _percent(above[has_sma].sum(), has_sma.sum()),
+            'pct_oversold': _percent(oversold[has_rsi].sum(), has_rsi.sum()),
+            'median_volatility': float(np.median(volatility)) if len(volatility) else None,
+            'analysis_period': self.analysis_period
+        }
+
+    def _materialize(self):
+        if self._summaries is None:
+            with self._lock:
+                if self._summaries is None:
+                    self._indexes, self._summaries = self._aggregate()
+
+    def summaries(self):
+        """``{category: summary}`` for every category"""
+        self._materialize()
+        return self._summaries
+
+    def index(self, category):
+        """Equal-weight index of a category (daily-rebalanced mean of member returns), or None"""
+        self._materialize()
+        return self._indexes.get(category)
+
+
+def _percent(part, whole):
+    return float(part) / float(whole) * 100 if whole else None
+
+
+def get_sector_aggregates(analyzer, analysis_period=30):
+    """Process-wide sector aggregates, refreshed for any symbols whose data changed"""
+    key = (analyzer.catalog.data_dir, analysis_period)
+    aggregates = _aggregates.get(key)
+    if aggregates is None:
+        with _aggregates_lock:
+            aggregates = _aggregates.get(key)
+            if aggregates is None:
+                aggregates = SectorAggregates(analysis_period)
+                _aggregates[key] = aggregates
+    aggregates.refresh(analyzer)
+    return aggregates
+
+
+def reference(analyzer, category, analysis_period=30):
+    """One category's summary and index with pandas, one symbol at a time"""
+    returns, above, oversold, volatility = [], [], [], []
+    for symbol in analyzer.catalog.symbols(category):
+        df = analyzer.load_indicator_data(symbol, indicators=['SMA_50', 'RSI'])
+        if df is None or df.empty:
+            continue
+        returns.append(df['Close'].pct_change().rename(symbol))
+        if not math.isnan(df['SMA_50'].iloc[-1]):
+            above.append(df['Close'].iloc[-1] > df['SMA_50'].iloc[-1])
+        if not math.isnan(df['RSI'].iloc[-1]):
+            oversold.append(df['RSI'].iloc[-1] < 30)
+        trend = analyzer.analyze_trend(df, analysis_period)
+        if not math.isnan(trend['volatility']):
+            volatility.append(trend['volatility'])
+    mean_returns = pd.concat(returns, axis=1, sort=True).mean(axis=1).dropna()
+    index = INDEX_BASE * (1 + mean_returns).cumprod()
+    return {
+        'pct_above_sma_50': _percent(sum(above), len(above)) if above else None,
+        'pct_oversold': _percent(sum(oversold), len(oversold)) if oversold else None,
+        'median_volatility': float(np.median(volatility)) if volatility else None
+    }, index
+
+
+def check(analyzer, analysis_period=30, changed=20, trimmed_bars=5):
+    """Compare the aggregates with pandas per category, and an incremental refresh with a full build"""
+    full = SectorAggregates(analysis_period)
+    full.refresh(analyzer)
+    failures = []
+    for category, summary in full.summaries().items():
+        expected, index = reference(analyzer, category, analysis_period)
+        for name, value in expected.items():
+            if (value is None) != (summary[name] is None) or (
+                    value is not None and not math.isclose(value, summary[name], rel_tol=1e-9)):
+                failures.append(f"{category} {name}: {summary[name]} != {value}")
+        ours = full.index(category)
+        if not ours.index.equals(index.index) or not np.allclose(ours.values, index.values, rtol=1e-9):
+            failures.append(f"{category} index differs from pandas")
+
+    # Start from histories missing their last bars for some symbols, then bring those up to date
+    incremental = SectorAggregates(analysis_period)
+    stale = set(full.symbols[::max(1, len(full.symbols) // changed)][:changed])
+    frames = {symbol: analyzer.load_stock_data(symbol) for symbol in full.symbols}
+    incremental.update({symbol: df.iloc[:-trimmed_bars] if symbol in stale else df for symbol, df in frames.items()})
+    incremental.categories = full.categories
+    incremental.update({symbol: frames[symbol] for symbol in stale})
+    for category, summary in full.summaries().items():
+        if incremental.summaries()[category] != summary:
+            failures.append(f"{category} incremental summary differs from a full build")
+        if not incremental.index(category).equals(full.index(category)):
+            failures.append(f"{category} incremental index differs from a full build")
+    return failures, len(full.summaries())
+
+
+def main():
+    from .stock_analyzer import StockAnalyzer
+
+    parser = argparse.ArgumentParser(description="Check or benchmark the sector aggregates")
+    parser.add_argument('command', choices=['check', 'bench', 'show'])
+    parser.add_argument('--period', type=int, default=30)
+    args = parser.parse_args()
+
+    analyzer = StockAnalyzer()
+    if args.command == 'check':
+        failures, checked = check(analyzer, args.period)
+        for failure in failures:
+            print(f"MISMATCH {failure}")
+        print(f"{checked} categories checked, {len(failures)} mismatches")
+        if failures:
+            sys.exit(1)
+        return
+
+    if args.command == 'show':
+        for name, summary in get_sector_aggregates(analyzer, args.period).summaries().items():
+            print(f"{name:<24} {summary['members']:3d} members  {summary['trend']:<16} "
+                  f"above SMA_50 {summary['pct_above_sma_50']:5.1f}%  oversold {summary['pct_oversold']:5.1f}%  "
+                  f"median volatility {summary['median_volatility']:5.1f}%")
+        return
+
+    aggregates = SectorAggregates(args.period)
+    start = time.perf_counter()
+    aggregates.refresh(analyzer)
+    aggregates.summaries()
+    build_time = time.perf_counter() - start
+
+    frames = {symbol: analyzer.load_stock_data(symbol) for symbol in aggregates.symbols[:5]}
+    start = time.perf_counter()
+    aggregates.update(frames)
+    aggregates._summaries = None
+    aggregates.summaries()
+    update_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    aggregates.refresh(analyzer)
+    aggregates.summaries()
+    current_time = time.perf_counter() - start
+    print(f"Full build of {len(aggregates.summaries())} categories over {len(aggregates.symbols)} symbols: "
+          f"{build_time * 1000:.1f} ms; 5 symbols updated: {update_time * 1000:.1f} ms; "
+          f"no change: {current_time * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
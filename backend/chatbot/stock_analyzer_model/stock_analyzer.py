@@ -1,65 +1,202 @@
-import pandas as pd
 import numpy as np
 import os
-from datetime import datetime, timedelta
-import json
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from .market_catalog import get_catalog
+from .advice_snapshot import get_advice_snapshot_store
+from .backtest import DEFAULT_HORIZON, run_backtest
+from .compact_series import CompactSeries
+from .correlation import DEFAULT_WINDOW as CORRELATION_WINDOW, get_correlation_matrix
+from .frame_cache import file_cache_key, get_frame_cache
+from .indicator_registry import compute_indicators, resolve
+from .indicator_snapshots import SNAPSHOT_ROWS, get_snapshot_store
+from .price_store import get_price_store, read_history_csv, read_history_csv_tail
+from .screener import get_screener_state
+from .sector_aggregates import get_sector_aggregates
+from .timeframes import get_timeframe_cache, periods_per_year, timeframe_rule
+from .universe_store import get_universe_store
+
+# Extra bars loaded ahead of the analysis window so tail-only indicators match
+# the full-history computation. SMA_50 needs 49 and RSI/BB/Volume_SMA fewer;
+# the binding constraint is the EMA_26 (and MACD signal) memory: the
+# truncation error decays as (25/27)**n, about 4e-14 relative at 400 bars.
+INDICATOR_WARMUP_BARS = 400
+
+# analyze_technical_signals always looks at the last 20 bars
+SIGNAL_WINDOW = 20
+
+# Indicators analyze_technical_signals reads; advice computes only these
+SIGNAL_INDICATORS = ('MACD', 'MACD_Signal', 'RSI', 'SMA_20', 'BB_Upper', 'BB_Lower')
+
+# 'pandas' (rolling/ewm) or 'numpy' (indicator_kernels); both agree to within
+# the parity tolerance asserted by tests/test_indicator_kernels.py
+DEFAULT_INDICATOR_BACKEND = os.environ.get('STOCK_INDICATOR_BACKEND', 'pandas')
+
+# Batch advice computes misses in worker processes once there are this many;
+# fewer are cheaper in-process than a round trip through the pool
+BATCH_POOL_MIN_SYMBOLS = 4
+DEFAULT_BATCH_WORKERS = int(os.environ.get('STOCK_ADVICE_WORKERS', str(os.cpu_count() or 1)))
+
+_worker_pools = {}
+_worker_pools_lock = threading.Lock()
+_worker_analyzer = None
+
+
+def _init_worker(data_dir, indicator_backend):
+    global _worker_analyzer
+    _worker_analyzer = StockAnalyzer(data_dir, indicator_backend)
+
+
+def _advice_worker(symbols, analysis_period, timeframe, use_advice_snapshot=True):
+    # Follow the caller, which turns the advice snapshot off while rebuilding it
+    _worker_analyzer.use_advice_snapshot = use_advice_snapshot
+    try:
+        return {symbol: _worker_analyzer._advice_or_error(symbol, analysis_period, timeframe) for symbol in symbols}
+    finally:
+        _worker_analyzer.use_advice_snapshot = True
+
+
+def _worker_context():
+    """Pool start method: forkserver with this module preloaded where available, else spawn.
+
+    Forking the threaded Flask process itself could copy held locks. Either
+    way each worker imports the caller's ``__main__`` (as ``__mp_main__``),
+    so entry points keep heavy setup out of module level.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload([__name__])
+    return context
+
+
+def get_worker_pool(data_dir, indicator_backend, workers):
+    """Process-wide worker pool (each worker holds a StockAnalyzer), started on first use and reused"""
+    key = (os.path.abspath(data_dir), indicator_backend, workers)
+    pool = _worker_pools.get(key)
+    if pool is None:
+        with _worker_pools_lock:
+            pool = _worker_pools.get(key)
+            if pool is None:
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=_worker_context(),
+                                           initializer=_init_worker, initargs=(data_dir, indicator_backend))
+                _worker_pools[key] = pool
+    return pool
+
+
+def discard_worker_pool(pool):
+    """Forget a pool (e.g. broken by a crashed worker) so the next caller starts a new one"""
+    with _worker_pools_lock:
+        for key, existing in list(_worker_pools.items()):
+            if existing is pool:
+                del _worker_pools[key]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def worker_analyzer():
+    """The analyzer of the current pool worker process"""
+    return _worker_analyzer
+
 
 class StockAnalyzer:
-    def __init__(self, data_dir=None):
+    def __init__(self, data_dir=None, indicator_backend=None):
         if data_dir is None:
          
             current_dir = os.path.dirname(os.path.abspath(__file__))
             data_dir = os.path.join(current_dir, '..', '..', 'stock-data-collector', 'market_data')
         self.data_dir = data_dir
-        self.analysis_cache = {}
+        self.catalog = get_catalog(data_dir)
+        self.price_store = get_price_store(self.catalog.store_dir)
+        self.universe = get_universe_store(self.catalog.store_dir)
+        self.snapshots = get_snapshot_store(self.catalog.store_dir)
+        self.use_snapshots = True
+        self.advice_snapshot = get_advice_snapshot_store(self.catalog.store_dir)
+        self.use_advice_snapshot = True
+        self.indicator_backend = indicator_backend or DEFAULT_INDICATOR_BACKEND
+        self.analysis_cache = get_frame_cache()
+        self.timeframes = get_timeframe_cache()
+    
+    def analysis_window(self, analysis_period=30):
+        """Number of trailing bars needed to analyze a period with warm indicators"""
+        return max(analysis_period, SIGNAL_WINDOW) + INDICATOR_WARMUP_BARS
+    
+    def load_stock_data(self, symbol, category=None, tail=None):
+        """Load stock/crypto price history, optionally only the last ``tail`` bars (a private copy, safe to modify)"""
+        df = self._load_cached(symbol, category, ('prices', tail))
+        return None if df is None else df.copy()
+    
+    def load_indicator_data(self, symbol, category=None, tail=None, indicators=None):
+        """Load price history with technical indicators, by default all of them (shared cached frame, read-only)"""
+        names = None if indicators is None else tuple(resolve(indicators))
+        return self._load_cached(symbol, category, ('indicators', tail, names, self.indicator_backend))
+    
+    def load_timeframe_data(self, symbol, timeframe='weekly', category=None, tail=None, indicators=None):
+        """Load bars resampled to a timeframe ('daily', 'weekly', 'monthly' or a pandas offset alias) with
+        technical indicators computed on those bars (``indicators=()`` for none; shared cached frame, read-only)"""
+        rule = timeframe_rule(timeframe)
+        if rule is None:
+            return self.load_indicator_data(symbol, category, tail, indicators)
+        names = None if indicators is None else tuple(resolve(indicators))
+        return self._load_cached(symbol, category, ('timeframe', tail, rule, names, self.indicator_backend))
     
-    def load_stock_data(self, symbol, category=None):
-        """Load stock/crypto data from CSV file"""
+    def load_compact_series(self, symbol, category=None, tail=None):
+        """Load price history as a cached CompactSeries (float32 prices, int32 days; shared, read-only)"""
+        return self._load_cached(symbol, category, ('compact', tail))
+    
+    def _load_cached(self, symbol, category, variant):
+        """Serve a frame from the process-wide cache, building it on a miss"""
         try:
-            if '-' in symbol:
-                symbol = symbol.replace('-', '_')
+            rel_path = self.catalog.get_rel_path(symbol, category)
+            if rel_path is None:
+                return None
             
-            if category:
-                file_path = os.path.join(self.data_dir, category, f"{symbol}_history.csv")
-            else:
-                for cat in os.listdir(self.data_dir):
-                    cat_path = os.path.join(self.data_dir, cat)
-                    if os.path.isdir(cat_path):
-                        possible_paths = [
-                            os.path.join(cat_path, f"{symbol}_history.csv"),
-                            os.path.join(cat_path, f"{symbol}_USD_history.csv"),
-                            os.path.join(cat_path, f"{symbol.replace('_', '')}_USD_history.csv")
-                        ]
-                        
-                        for file_path in possible_paths:
-                            if os.path.exists(file_path):
-                                break
-                        else:
-                            continue
-                        break
-                else:
-                    return None
+            file_path = os.path.join(self.catalog.data_dir, rel_path)
+            try:
+                key = file_cache_key(file_path, variant)
+            except FileNotFoundError:
+                # File vanished since the catalog was built
+                self.catalog.refresh()
+                return None
             
-            if os.path.exists(file_path):
-                df = pd.read_csv(file_path, skiprows=3)
-                df.columns = ['Date', 'Close', 'High', 'Low', 'Open', 'Volume']
-                
-                df = df.dropna(subset=['Date'])
-                
-                df['Date'] = pd.to_datetime(df['Date'])
-                df.set_index('Date', inplace=True)
-                
-                for col in ['Close', 'High', 'Low', 'Open', 'Volume']:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-                
-                df = df.dropna()
-                
+            df = self.analysis_cache.get(key)
+            if df is not None:
                 return df
-            return None
+            
+            kind, tail = variant[:2]
+            source_stats = {'mtime_ns': key[1], 'size': key[2]}
+            if kind == 'timeframe':
+                bars = self.timeframes.get(rel_path, source_stats, variant[2],
+                                           lambda: self._read_prices(rel_path, file_path, source_stats))
+                if bars is None:
+                    return None
+                df = bars.tail(tail).copy() if tail else bars.copy()
+                return self.analysis_cache.put(key, self.calculate_technical_indicators(df, variant[3], variant[4]))
+            
+            df = self._read_prices(rel_path, file_path, source_stats, tail)
+            if kind == 'indicators':
+                df = self.calculate_technical_indicators(df, variant[2], variant[3])
+            elif kind == 'compact':
+                df = CompactSeries.from_frame(df)
+            return self.analysis_cache.put(key, df)
         except Exception as e:
             print(f"Error loading data for {symbol}: {e}")
             return None
     
+    def _read_prices(self, rel_path, file_path, source_stats, tail=None):
+        """Read from the shared universe file, then the binary price store, falling back to CSV"""
+        df = self.universe.load(rel_path, source_stats, tail)
+        if df is not None:
+            return df
+        df = self.price_store.load(rel_path, source_stats, tail)
+        if df is not None:
+            return df
+        if tail:
+            return read_history_csv_tail(file_path, tail)
+        return read_history_csv(file_path)
+    
     def is_crypto(self, symbol):
         """Check if symbol is a crypto currency"""
         crypto_symbols = [
@@ -70,38 +207,15 @@ class StockAnalyzer:
         ]
         return symbol.upper() in crypto_symbols
     
-    def calculate_technical_indicators(self, df):
-        """Calculate technical indicators"""
+    def calculate_technical_indicators(self, df, indicators=None, backend=None):
+        """Calculate technical indicators (all by default, or only ``indicators`` and their dependencies)"""
         if df is None or df.empty:
             return {}
         
-        df['SMA_20'] = df['Close'].rolling(window=20).mean()
-        df['SMA_50'] = df['Close'].rolling(window=50).mean()
-        df['EMA_12'] = df['Close'].ewm(span=12).mean()
-        df['EMA_26'] = df['Close'].ewm(span=26).mean()
-        
-        df['MACD'] = df['EMA_12'] - df['EMA_26']
-        df['MACD_Signal'] = df['MACD'].ewm(span=9).mean()
-        df['MACD_Histogram'] = df['MACD'] - df['MACD_Signal']
-        
-        delta = df['Close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        df['RSI'] = 100 - (100 / (1 + rs))
-        
-        df['BB_Middle'] = df['Close'].rolling(window=20).mean()
-        bb_std = df['Close'].rolling(window=20).std()
-        df['BB_Upper'] = df['BB_Middle'] + (bb_std * 2)
-        df['BB_Lower'] = df['BB_Middle'] - (bb_std * 2)
-        
-        df['Volume_SMA'] = df['Volume'].rolling(window=20).mean()
-        df['Volume_Ratio'] = df['Volume'] / df['Volume_SMA']
-        
-        return df
+        return compute_indicators(df, indicators, backend or self.indicator_backend)
     
-    def analyze_trend(self, df, period_days=30):
-        """Analyze recent trend"""
+    def analyze_trend(self, df, period_days=30, periods_per_year=252):
+        """Analyze the trend over the last ``period_days`` bars (volatility annualized by ``periods_per_year``)"""
         if df is None or df.empty:
             return {}
         
@@ -125,7 +239,7 @@ class StockAnalyzer:
         else:
             trend = "SIDEWAYS"
         
-        volatility = recent_data['Close'].pct_change().std() * np.sqrt(252) * 100
+        volatility = recent_data['Close'].pct_change().std() * np.sqrt(periods_per_year) * 100
         
         resistance = recent_data['High'].max()
         support = recent_data['Low'].min()
@@ -201,17 +315,164 @@ class StockAnalyzer:
         
         return signals
     
-    def generate_investment_advice(self, symbol, analysis_period=30):
-        """Generate investment advice based on analysis"""
-        df = self.load_stock_data(symbol)
+    def _source_stats(self, symbol):
+        """CSV path of a symbol and the mtime/size stamp of that file, or None"""
+        rel_path = self.catalog.get_rel_path(symbol)
+        if rel_path is None:
+            return None
+        try:
+            stat = os.stat(os.path.join(self.catalog.data_dir, rel_path))
+        except OSError:
+            return None
+        return rel_path, {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+    
+    def _current_snapshot(self, symbol, analysis_period, source=None):
+        """Indicator snapshot for a symbol if it covers the period and matches the data on disk"""
+        if not self.use_snapshots or analysis_period >= SNAPSHOT_ROWS:
+            return None
+        source = source or self._source_stats(symbol)
+        return None if source is None else self.snapshots.get(*source)
+    
+    def _snapshot_advice(self, symbol, analysis_period=30, source=None):
+        """Precomputed advice snapshot entry (``advice``, ``insights``) if it matches the data on disk"""
+        if not (self.use_snapshots and self.use_advice_snapshot):
+            return None
+        source = source or self._source_stats(symbol)
+        return None if source is None else self.advice_snapshot.get(*source, analysis_period)
+    
+    def _served_advice(self, entry, symbol):
+        """A caller's copy of snapshot advice, under the symbol as asked"""
+        advice = entry['advice']
+        return dict(advice, symbol=symbol, technical_signals=dict(advice['technical_signals']),
+                    timestamp=datetime.now().isoformat())
+    
+    def _served_insight(self, entry, symbol, question_type):
+        """Insight text from a snapshot entry, formatted again only when asked under another spelling"""
+        if symbol == entry['advice']['symbol'] and question_type in entry['insights']:
+            return entry['insights'][question_type]
+        return self.format_investment_insight(dict(entry['advice'], symbol=symbol), question_type)
+    
+    def generate_investment_advice(self, symbol, analysis_period=30, timeframe='daily'):
+        """Generate investment advice based on analysis; ``analysis_period`` counts bars of ``timeframe``"""
+        if timeframe_rule(timeframe) is not None:
+            df = self.load_timeframe_data(symbol, timeframe, indicators=SIGNAL_INDICATORS)
+            if df is None or df.empty:
+                return {
+                    'error': f'No data available for {symbol}',
+                    'recommendation': 'UNAVAILABLE'
+                }
+            return self._build_advice(symbol, df, analysis_period, timeframe,
+                                      periods_per_year(timeframe, df.index))
+        
+        source = self._source_stats(symbol) if self.use_snapshots else None
+        entry = self._snapshot_advice(symbol, analysis_period, source) if source else None
+        if entry is not None:
+            return self._served_advice(entry, symbol)
+        
+        snapshot = self._current_snapshot(symbol, analysis_period, source) if source else None
+        if snapshot is not None:
+            advice = snapshot.advice.get(analysis_period)
+            if advice is None:
+                advice = self._build_advice(symbol, snapshot.frame, analysis_period)
+                snapshot.advice[analysis_period] = advice
+            return dict(advice, symbol=symbol, technical_signals=dict(advice['technical_signals']),
+                        timestamp=datetime.now().isoformat())
+        
+        df = self.load_indicator_data(symbol, tail=self.analysis_window(analysis_period),
+                                      indicators=SIGNAL_INDICATORS)
         if df is None:
             return {
                 'error': f'No data available for {symbol}',
                 'recommendation': 'UNAVAILABLE'
             }
-        
-        df = self.calculate_technical_indicators(df)
-        trend_analysis = self.analyze_trend(df, analysis_period)
+        return self._build_advice(symbol, df, analysis_period)
+    
+    def generate_investment_advice_batch(self, symbols, analysis_period=30, timeframe='daily', workers=None):
+        """Advice for many symbols, keyed by symbol; failures get an ``error`` entry instead of raising.
+        
+        Symbols with a current advice or indicator snapshot are answered in-process.
+        The rest are split across a pool of worker processes when there are
+        enough of them and more than one worker, otherwise computed here.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        workers = DEFAULT_BATCH_WORKERS if workers is None else workers
+        results = {}
+        pending = []
+        for symbol in symbols:
+            source = self._source_stats(symbol) if timeframe == 'daily' and self.use_snapshots else None
+            if source and (self._snapshot_advice(symbol, analysis_period, source) is not None
+                           or self._current_snapshot(symbol, analysis_period, source) is not None):
+                results[symbol] = self._advice_or_error(symbol, analysis_period, timeframe)
+            else:
+                pending.append(symbol)
+        
+        if workers > 1 and len(pending) >= BATCH_POOL_MIN_SYMBOLS:
+            pool = get_worker_pool(self.data_dir, self.indicator_backend, workers)
+            chunks = [pending[i::workers] for i in range(workers)]
+            try:
+                for future in [pool.submit(_advice_worker, chunk, analysis_period, timeframe,
+                                           self.use_advice_snapshot) for chunk in chunks if chunk]:
+                    results.update(future.result())
+            except Exception as e:
+                print(f"Advice pool failed, computing in-process: {e}")
+                discard_worker_pool(pool)
+            # Chunks that finished before a failure are kept
+            pending = [symbol for symbol in pending if symbol not in results]
+        
+        for symbol in pending:
+            results[symbol] = self._advice_or_error(symbol, analysis_period, timeframe)
+        return {symbol: results[symbol] for symbol in symbols}
+    
+    def screen(self, filters=None, sort_by=None, descending=True, limit=None, analysis_period=30):
+        """Screen every catalog symbol's latest daily state at once (see ``ScreenerState.mask`` for filters)"""
+        return get_screener_state(self, analysis_period).screen(filters, sort_by, descending, limit)
+    
+    def sector_summary(self, category=None, analysis_period=30):
+        """Breadth, median volatility and trend of one category, or ``{category: summary}`` for all"""
+        summaries = get_sector_aggregates(self, analysis_period).summaries()
+        if category is None:
+            return {name: dict(summary) for name, summary in summaries.items()}
+        summary = summaries.get(category)
+        return None if summary is None else dict(summary)
+    
+    def sector_index(self, category, tail=None):
+        """Equal-weight index Series of a category (base 100), optionally its last ``tail`` points, or None"""
+        index = get_sector_aggregates(self).index(category)
+        if index is None:
+            return None
+        return index.tail(tail) if tail else index
+    
+    def correlation_matrix(self, symbols=None, window=CORRELATION_WINDOW):
+        """Cached return correlation/covariance over the last ``window`` trading days, for ``symbols`` or all"""
+        matrix = get_correlation_matrix(self, window)
+        if symbols is None:
+            return matrix
+        resolved = []
+        for symbol in symbols:
+            entry = self.catalog.resolve(symbol)
+            resolved.append(entry['symbol'] if entry else symbol)
+        return matrix.select(resolved)
+    
+    def correlation_summary(self, symbols, window=CORRELATION_WINDOW):
+        """Average pairwise correlation and most/least correlated pairs of ``symbols``, or None"""
+        return self.correlation_matrix(symbols, window).summary()
+    
+    def backtest(self, symbols=None, analysis_period=30, horizon=DEFAULT_HORIZON, allow_short=False, workers=None):
+        """Replay the recommendation rule over every date of each symbol's history (a BacktestReport)"""
+        return run_backtest(self, symbols, analysis_period, horizon, allow_short, workers)
+    
+    def _advice_or_error(self, symbol, analysis_period, timeframe):
+        try:
+            return self.generate_investment_advice(symbol, analysis_period, timeframe)
+        except Exception as e:
+            return {
+                'error': f'Analysis failed for {symbol}: {e}',
+                'recommendation': 'UNAVAILABLE'
+            }
+    
+    def _build_advice(self, symbol, df, analysis_period, timeframe='daily', periods_per_year=252):
+        """Advice from a frame holding at least the period's bars and the signal indicators"""
+        trend_analysis = self.analyze_trend(df, analysis_period, periods_per_year)
         technical_signals = self.analyze_technical_signals(df)
         
         recommendation = self._generate_recommendation(trend_analysis, technical_signals)
@@ -230,6 +491,7 @@ class StockAnalyzer:
             'recommendation': recommendation,
             'risk_score': risk_score,
             'analysis_period': analysis_period,
+            'timeframe': timeframe,
             'timestamp': datetime.now().isoformat()
         }
     
@@ -297,14 +559,21 @@ class StockAnalyzer:
         
         return max(1, min(10, risk_score))
     
-    def get_investment_insight(self, symbol, question_type="general"):
-        """Get investment insight for chatbot"""
-        advice = self.generate_investment_advice(symbol)
+    def get_investment_insight(self, symbol, question_type="general", advice=None):
+        """Get investment insight for chatbot, reusing precomputed advice when given"""
+        if advice is None:
+            entry = self._snapshot_advice(symbol)
+            if entry is not None:
+                return self._served_insight(entry, symbol, question_type)
+            advice = self.generate_investment_advice(symbol)
         
         if 'error' in advice:
             return f"I don't have enough data to analyze {symbol}. Please check if the stock symbol is correct."
         
-
+        return self.format_investment_insight(advice, question_type)
+    
+    def format_investment_insight(self, advice, question_type="general"):
+        """Format precomputed advice for a question type"""
         if question_type == "should_i_buy":
             return self._format_buy_advice(advice)
         elif question_type == "trend_analysis":
@@ -316,6 +585,40 @@ class StockAnalyzer:
         else:
             return self._format_general_advice(advice)
     
+    def get_technical_data(self, advice):
+        """Structured summary of advice for API responses"""
+        return {
+            'current_price': advice.get('current_price'),
+            'trend': advice.get('trend'),
+            'recommendation': advice.get('recommendation'),
+            'risk_score': advice.get('risk_score'),
+            'volatility': advice.get('volatility'),
+            'support': advice.get('support'),
+            'resistance': advice.get('resistance'),
+            'price_change_pct': advice.get('price_change_pct')
+        }
+    
+    def analyze_question(self, symbol, question_type="general", analysis_period=30):
+        """Advice, technical data and formatted insight from a single computation (or the advice snapshot)"""
+        entry = self._snapshot_advice(symbol, analysis_period)
+        if entry is not None:
+            advice = self._served_advice(entry, symbol)
+            return {
+                'advice': advice,
+                'technical_data': self.get_technical_data(advice),
+                'response': self._served_insight(entry, symbol, question_type)
+            }
+        
+        advice = self.generate_investment_advice(symbol, analysis_period)
+        if 'error' in advice:
+            return {'advice': advice, 'technical_data': None, 'response': None}
+        
+        return {
+            'advice': advice,
+            'technical_data': self.get_technical_data(advice),
+            'response': self.format_investment_insight(advice, question_type)
+        }
+    
     def _format_buy_advice(self, advice):
         """Format advice for buy/sell decisions"""
         symbol = advice['symbol']
@@ -0,0 +1,346 @@
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+INDICATOR_COLUMNS = ['SMA_20', 'SMA_50', 'EMA_12', 'EMA_26', 'MACD', 'MACD_Signal', 'MACD_Histogram',
+                     'RSI', 'BB_Middle', 'BB_Upper', 'BB_Lower', 'Volume_SMA', 'Volume_Ratio']
+STATE_VERSION = 1
+
+# Parity tolerance against the pandas batch path (running sums vs pandas' own kernels)
+PARITY_RTOL = 1e-9
+PARITY_ATOL = 1e-9
+
+
+class RollingMean:
+    """Fixed-window mean updated in O(1), following pandas' compensated add/remove sums"""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+        self.add_compensation = 0.0
+        self.remove_compensation = 0.0
+        self.negatives = 0
+        self.same_run = 0
+        self.previous = math.nan
+
+    def update(self, value):
+        if len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self.values.append(value)
+        self._add(value)
+        return self.value()
+
+    def _add(self, value):
+        y = value - self.add_compensation
+        t = self.total + y
+        self.add_compensation = t - self.total - y
+        self.total = t
+        if math.copysign(1.0, value) < 0:
+            self.negatives += 1
+        self.same_run = self.same_run + 1 if value == self.previous else 1
+        self.previous = value
+
+    def _remove(self, value):
+        y = -value - self.remove_compensation
+        t = self.total + y
+        self.remove_compensation = t - self.total - y
+        self.total = t
+        if math.copysign(1.0, value) < 0:
+            self.negatives -= 1
+
+    def value(self):
+        count = len(self.values)
+        if count < self.window:
+            return math.nan
+        if self.same_run >= count:
+            return self.previous
+        mean = self.total / count
+        if self.negatives == 0 and mean < 0:
+            return 0.0
+        if self.negatives == count and mean > 0:
+            return 0.0
+        return mean
+
+    def state(self):
+        return {'values': list(self.values), 'total': self.total, 'add_compensation': self.add_compensation,
+                'remove_compensation': self.remove_compensation, 'negatives': self.negatives,
+                'same_run': self.same_run, 'previous': self.previous}
+
+    def restore(self, state):
+        self.values = deque(state['values'])
+        for key in ('total', 'add_compensation', 'remove_compensation', 'negatives', 'same_run', 'previous'):
+            setattr(self, key, state[key])
+        return self
+
+
+class RollingStd:
+    """Fixed-window sample standard deviation via Welford add/remove updates"""
+
+    def __init__(self, window, ddof=1):
+        self.window = window
+        self.ddof = ddof
+        self.values = deque()
+        self.mean = 0.0
+        self.sum_squares = 0.0
+        self.same_run = 0
+        self.previous = math.nan
+
+    def update(self, value):
+        if len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self.values.append(value)
+        self.same_run = self.same_run + 1 if value == self.previous else 1
+        self.previous = value
+        count = len(self.values)
+        delta = value - self.mean
+        self.mean += delta / count
+        self.sum_squares += delta * (value - self.mean)
+        return self.value()
+
+    def _remove(self, value):
+        count = len(self.values)
+        if count == 0:
+            self.mean = 0.0
+            self.sum_squares = 0.0
+            return
+        delta = value - self.mean
+        self.mean -= delta / count
+        self.sum_squares -= delta * (value - self.mean)
+
+    def value(self):
+        count = len(self.values)
+        if count < self.window:
+            return math.nan
+        if self.same_run >= count:
+            return 0.0
+        return math.sqrt(max(self.sum_squares, 0.0) / (count - self.ddof))
+
+    def state(self):
+        return {'values': list(self.values), 'mean': self.mean, 'sum_squares': self.sum_squares,
+                'same_run': self.same_run, 'previous': self.previous}
+
+    def restore(self, state):
+        self.values = deque(state['values'])
+        for key in ('mean', 'sum_squares', 'same_run', 'previous'):
+            setattr(self, key, state[key])
+        return self
+
+
+class ExponentialMean:
+    """``Series.ewm(span=...).mean()`` (adjust=True) updated in O(1)"""
+
+    def __init__(self, span):
+        self.decay = 1.0 - 2.0 / (span + 1.0)
+        self.weighted = math.nan
+        self.weight = 1.0
+
+    def update(self, value):
+        if self.weighted != self.weighted:
+            self.weighted = value
+            self.weight = 1.0
+            return self.weighted
+        self.weight *= self.decay
+        if self.weighted != value:
+            self.weighted = (self.weight * self.weighted + value) / (self.weight + 1.0)
+        self.weight += 1.0
+        return self.weighted
+
+    def state(self):
+        return {'weighted': self.weighted, 'weight': self.weight}
+
+    def restore(self, state):
+        self.weighted = state['weighted']
+        self.weight = state['weight']
+        return self
+
+
+class IndicatorStream:
+    """Running state for every indicator ``calculate_technical_indicators`` produces.
+
+    ``update`` consumes one bar (close, volume) in constant time and returns
+    that bar's indicator values, matching the pandas batch path to within
+    ``PARITY_RTOL``. The state round-trips through ``to_state``/``save`` so a
+    stream can resume from a checkpoint instead of replaying history.
+    """
+
+    def __init__(self):
+        self.sma_20 = RollingMean(20)
+        self.sma_50 = RollingMean(50)
+        self.ema_12 = ExponentialMean(12)
+        self.ema_26 = ExponentialMean(26)
+        self.macd_signal = ExponentialMean(9)
+        self.gain = RollingMean(14)
+        self.loss = RollingMean(14)
+        self.bb_std = RollingStd(20)
+        self.volume_sma = RollingMean(20)
+        self.last_close = math.nan
+        self.last_date = None
+        self.bars = 0
+
+    def update(self, close, volume, date=None):
+        """Advance by one bar and return its indicator values"""
+        delta = close - self.last_close
+        self.last_close = close
+        self.last_date = date
+        self.bars += 1
+
+        sma_20 = self.sma_20.update(close)
+        ema_12 = self.ema_12.update(close)
+        ema_26 = self.ema_26.update(close)
+        macd = ema_12 - ema_26
+        macd_signal = self.macd_signal.update(macd)
+
+        gain = self.gain.update(delta if delta > 0 else 0.0)
+        loss = self.loss.update(-delta if delta < 0 else 0.0)
+        rsi = 100 - (100 / (1 + _divide(gain, loss)))
+
+        bb_std = self.bb_std.update(close)
+        volume_sma = self.volume_sma.update(float(volume))
+
+        return {
+            'SMA_20': sma_20,
+            'SMA_50': self.sma_50.update(close),
+            'EMA_12': ema_12,
+            'EMA_26': ema_26,
+            'MACD': macd,
+            'MACD_Signal': macd_signal,
+            'MACD_Histogram': macd - macd_signal,
+            'RSI': rsi,
+            'BB_Middle': sma_20,
+            'BB_Upper': sma_20 + bb_std * 2,
+            'BB_Lower': sma_20 - bb_std * 2,
+            'Volume_SMA': volume_sma,
+            'Volume_Ratio': _divide(float(volume), volume_sma)
+        }
+
+    def replay(self, df):
+        """Feed every bar of an OHLCV frame; returns the indicator columns for those bars"""
+        rows = [self.update(close, volume, date)
+                for date, close, volume in zip(df.index, df['Close'].values, df['Volume'].values)]
+        return pd.DataFrame(rows, index=df.index, columns=INDICATOR_COLUMNS)
+
+    def to_state(self):
+        return {
+            'version': STATE_VERSION,
+            'bars': self.bars,
+            'last_close': self.last_close,
+            'last_date': None if self.last_date is None else pd.Timestamp(self.last_date).isoformat(),
+            'sma_20': self.sma_20.state(),
+            'sma_50': self.sma_50.state(),
+            'ema_12': self.ema_12.state(),
+            'ema_26': self.ema_26.state(),
+            'macd_signal': self.macd_signal.state(),
+            'gain': self.gain.state(),
+            'loss': self.loss.state(),
+            'bb_std': self.bb_std.state(),
+            'volume_sma': self.volume_sma.state()
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        if state.get('version') != STATE_VERSION:
+            raise ValueError(f"Unsupported indicator state version {state.get('version')}")
+        stream = cls()
+        stream.bars = state['bars']
+        stream.last_close = state['last_close']
+        stream.last_date = None if state['last_date'] is None else pd.Timestamp(state['last_date'])
+        for name in ('sma_20', 'sma_50', 'ema_12', 'ema_26', 'macd_signal', 'gain', 'loss', 'bb_std',
+                     'volume_sma'):
+            getattr(stream, name).restore(state[name])
+        return stream
+
+    def save(self, path):
+        """Atomically checkpoint the running state to a JSON file"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_state(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            return cls.from_state(json.load(f))
+
+
+def _divide(numerator, denominator):
+    """Float division with pandas semantics: x/0 -> +-inf, 0/0 -> nan"""
+    if denominator == 0:
+        if numerator == 0 or numerator != numerator:
+            return math.nan
+        return math.copysign(math.inf, numerator)
+    return numerator / denominator
+
+
+def parity_errors(reference, streamed):
+    """Max absolute error per indicator and the columns outside tolerance"""
+    errors, failed = {}, []
+    for name in INDICATOR_COLUMNS:
+        expected = reference[name].values.astype(np.float64)
+        actual = streamed[name].values.astype(np.float64)
+        if not np.array_equal(np.isnan(expected), np.isnan(actual)):
+            errors[name] = math.inf
+            failed.append(name)
+            continue
+        valid = np.isfinite(expected)
+        errors[name] = float(np.max(np.abs(actual[valid] - expected[valid]), initial=0.0))
+        if not np.allclose(actual, expected, rtol=PARITY_RTOL, atol=PARITY_ATOL, equal_nan=True):
+            failed.append(name)
+    return errors, failed
+
+
+def check(analyzer, symbols=None):
+    """Stream every symbol with a mid-history checkpoint round trip and compare to the batch path"""
+    failures = {}
+    bars, elapsed = 0, 0.0
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        for symbol in symbols or analyzer.catalog.symbols():
+            df = analyzer.load_stock_data(symbol)
+            if df is None or df.empty:
+                continue
+            reference = analyzer.calculate_technical_indicators(df.copy())
+
+            half = len(df) // 2
+            start = time.perf_counter()
+            stream = IndicatorStream()
+            first = stream.replay(df.iloc[:half])
+            path = os.path.join(checkpoint_dir, f"{symbol}.json")
+            stream.save(path)
+            second = IndicatorStream.load(path).replay(df.iloc[half:])
+            elapsed += time.perf_counter() - start
+            bars += len(df)
+
+            _, failed = parity_errors(reference, pd.concat([first, second]))
+            if failed:
+                failures[symbol] = failed
+    return failures, bars, elapsed
+
+
+def main():
+    from .stock_analyzer import StockAnalyzer
+
+    parser = argparse.ArgumentParser(description="Check the streaming indicator engine against the pandas path")
+    parser.add_argument('command', choices=['check'])
+    parser.add_argument('--symbols', nargs='*', default=None)
+    args = parser.parse_args()
+
+    failures, bars, elapsed = check(StockAnalyzer(), args.symbols)
+    for symbol, columns in sorted(failures.items()):
+        print(f"MISMATCH {symbol}: {', '.join(columns)}")
+    print(f"Streamed {bars} bars in {elapsed:.2f}s ({elapsed / max(bars, 1) * 1e6:.1f} us/bar) with a "
+          f"checkpoint round trip per symbol; {len(failures)} symbols outside rtol={PARITY_RTOL:g}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+import argparse
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from .price_store import PRICE_COLUMNS
+
+# Named timeframes and their pandas rules; any other pandas offset alias
+# ('3D', '2W-FRI', 'QE', ...) is accepted as a custom timeframe
+TIMEFRAMES = {'daily': None, 'weekly': 'W-FRI', 'monthly': 'ME'}
+PERIODS_PER_YEAR = {'daily': 252, 'weekly': 52, 'monthly': 12}
+
+OHLCV_AGGREGATION = {'Close': 'last', 'High': 'max', 'Low': 'min', 'Open': 'first', 'Volume': 'sum'}
+
+MAX_ENTRIES = 1024
+
+_timeframe_cache = None
+_timeframe_cache_lock = threading.Lock()
+
+
+@lru_cache(maxsize=64)
+def _offset(rule):
+    return pd.tseries.frequencies.to_offset(rule)
+
+
+def timeframe_rule(timeframe):
+    """pandas resample rule for a timeframe name or offset alias (None for daily)"""
+    if timeframe in TIMEFRAMES:
+        return TIMEFRAMES[timeframe]
+    try:
+        _offset(timeframe)
+    except (TypeError, ValueError):
+        raise ValueError(f"Unknown timeframe {timeframe}")
+    return timeframe
+
+
+def periods_per_year(timeframe, index=None):
+    """Bars per year used to annualize volatility; custom timeframes use the bars' mean spacing"""
+    if timeframe in PERIODS_PER_YEAR:
+        return PERIODS_PER_YEAR[timeframe]
+    if index is None or len(index) < 2:
+        return PERIODS_PER_YEAR['daily']
+    spacing_days = (index[-1] - index[0]) / pd.Timedelta(days=1) / (len(index) - 1)
+    return 365.25 / spacing_days
+
+
+WEEKDAYS = ['MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT', 'SUN']
+# 1970-01-01 was a Thursday
+EPOCH_WEEKDAY = 3
+DAY_NS = 86400 * 10**9
+
+
+def bin_labels(dates, rule):
+    """pandas' resample label of every datetime64 value for weekly, month-end and fixed-length rules, else None"""
+    offset = _offset(rule)
+    if isinstance(offset, pd.offsets.Week) and offset.n == 1 and offset.weekday is not None:
+        days = dates.astype('datetime64[D]').astype(np.int64)
+        # Weeks are labelled by their closing weekday, on or after the bar
+        days += (offset.weekday - (days + EPOCH_WEEKDAY)) % 7
+        return days.astype('datetime64[D]').astype('datetime64[ns]')
+    if isinstance(offset, pd.offsets.MonthEnd) and offset.n == 1:
+        months = dates.astype('datetime64[M]')
+        return ((months + 1).astype('datetime64[D]') - 1).astype('datetime64[ns]')
+    if isinstance(offset, (pd.offsets.Day, pd.offsets.Tick)):
+        step = offset.n * DAY_NS if isinstance(offset, pd.offsets.Day) else offset.nanos
+        # Fixed-length bins counted from the epoch and labelled by their start
+        ns = dates.astype('datetime64[ns]').astype(np.int64)
+        return (ns - ns % step).astype('datetime64[ns]')
+    return None
+
+
+def _resample_pandas(df, rule):
+    offset = _offset(rule)
+    if isinstance(offset, pd.offsets.Day):
+        # Newer pandas only honours origin for sub-daily rules, so express days in hours
+        grouped = df[PRICE_COLUMNS].resample(f"{offset.n * 24}h", origin='epoch')
+    elif isinstance(offset, pd.offsets.Tick):
+        grouped = df[PRICE_COLUMNS].resample(rule, origin='epoch')
+    else:
+        grouped = df[PRICE_COLUMNS].resample(rule)
+    bars = grouped.agg(OHLCV_AGGREGATION)
+    counts = grouped['Close'].count().values
+    bars = bars[counts > 0]
+    bars['Volume'] = bars['Volume'].astype(np.int64)
+    return bars, int(counts[counts > 0][-1]) if len(bars) else 0
+
+
+def _aggregate(df, rule, start=0):
+    """(labels, {column: values}, daily rows in the last bar) for rows ``start:``, or None for pandas-only rules"""
+    labels = bin_labels(df.index.values[start:], rule)
+    if labels is None:
+        return None
+    if not len(labels):
+        return labels, {col: df[col].values[:0] for col in PRICE_COLUMNS}, 0
+
+    starts = np.flatnonzero(np.concatenate(([True], labels[1:] != labels[:-1])))
+    ends = np.append(starts[1:], len(labels)) - 1
+    columns = {
+        'Close': df['Close'].values[start:][ends],
+        'High': np.fmax.reduceat(df['High'].values[start:], starts),
+        'Low': np.fmin.reduceat(df['Low'].values[start:], starts),
+        'Open': df['Open'].values[start:][starts],
+        'Volume': np.add.reduceat(df['Volume'].values[start:].astype(np.int64), starts)
+    }
+    return labels[starts], columns, int(ends[-1] - starts[-1] + 1)
+
+
+def _bars_frame(labels, columns, name='Date'):
+    return pd.DataFrame(columns, index=pd.DatetimeIndex(labels, name=name))
+
+
+def resample_ohlcv(df, rule):
+    """Aggregate daily OHLCV bars by ``rule``; returns (bars, daily rows in the last bar).
+
+    Weekly, month-end and fixed-length rules are aggregated with NumPy. Their
+    bins depend only on each bar's date (calendar periods, or fixed-length
+    bins counted from the epoch), so re-aggregating any suffix of a history
+    that starts on a bin boundary reproduces the same bars. Other rules go
+    through pandas, which anchors multi-period bins ('2W-FRI', '2ME', '2QE')
+    to the first row, so they are only ever resampled whole. Periods without
+    trading are dropped.
+    """
+    aggregated = _aggregate(df, rule)
+    if aggregated is None:
+        return _resample_pandas(df, rule)
+    labels, columns, last_bar_rows = aggregated
+    return _bars_frame(labels, columns, df.index.name), last_bar_rows
+
+
+class TimeframeEntry:
+    def __init__(self, bars, mtime_ns, size, daily_rows, last_bar_rows, last_date, last_close):
+        self.bars = bars
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.daily_rows = daily_rows
+        self.last_bar_rows = last_bar_rows
+        self.last_date = last_date
+        self.last_close = last_close
+
+
+class TimeframeCache:
+    """Resampled bars per (file, rule), kept up to date incrementally.
+
+    When the source file changes and its history only gained bars, the
+    last (possibly partial) period is dropped and re-aggregated together
+    with the new daily bars; the earlier periods are reused unchanged.
+    Anything else (rewritten history, or a rule only pandas aggregates)
+    resamples from scratch. Bars are
+    shared; callers that mutate must copy.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.full = 0
+        self.incremental = 0
+        self.hits = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, rel_path, source_stats, rule, load_daily):
+        """Bars for a file at ``rule``; ``load_daily()`` returns the full daily frame on a miss"""
+        key = (rel_path, rule)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if (entry is not None and entry.mtime_ns == source_stats['mtime_ns']
+                and entry.size == source_stats['size']):
+            self.hits += 1
+            return entry.bars
+
+        daily = load_daily()
+        if daily is None or daily.empty:
+            return None
+        entry = self._extend(entry, daily, rule, source_stats) or self._build(daily, rule, source_stats)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry.bars
+
+    def _build(self, daily, rule, source_stats):
+        self.full += 1
+        bars, last_bar_rows = resample_ohlcv(daily, rule)
+        return self._entry(bars, daily, last_bar_rows, source_stats)
+
+    def _extend(self, entry, daily, rule, source_stats):
+        """Entry with only the last period re-aggregated, or None if the history was not just appended
+        to or the rule's bins are not fixed by the bar dates alone"""
+        if entry is None or len(daily) <= entry.daily_rows:
+            return None
+        position = entry.daily_rows - 1
+        if (daily.index.values[position] != entry.last_date
+                or daily['Close'].values[position] != entry.last_close):
+            return None
+
+        start = entry.daily_rows - entry.last_bar_rows
+        aggregated = _aggregate(daily, rule, start)
+        if aggregated is None:
+            return None
+        self.incremental += 1
+        labels, columns, last_bar_rows = aggregated
+        head = entry.bars
+        bars = _bars_frame(np.concatenate((head.index.values[:-1], labels)),
+                           {col: np.concatenate((head[col].values[:-1], columns[col])) for col in PRICE_COLUMNS},
+                           head.index.name)
+        return self._entry(bars, daily, last_bar_rows, source_stats)
+
+    @staticmethod
+    def _entry(bars, daily, last_bar_rows, source_stats):
+        return TimeframeEntry(bars, source_stats['mtime_ns'], source_stats['size'], len(daily), last_bar_rows,
+                              daily.index.values[-1], daily['Close'].values[-1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'full': self.full,
+                    'incremental': self.incremental}
+
+
+def get_timeframe_cache():
+    """Process-wide resampled-bar cache shared by every StockAnalyzer"""
+    global _timeframe_cache
+    if _timeframe_cache is None:
+        with _timeframe_cache_lock:
+            if _timeframe_cache is None:
+                _timeframe_cache = TimeframeCache()
+    return _timeframe_cache
+
+
+def check(analyzer, timeframes=('weekly', 'monthly', '3D', 'QE', '2W-FRI', '2ME'), appended=(1, 3, 25)):
+    """Compare the NumPy aggregation with pandas' resample, and cached updates with full resampling"""
+    mismatches = []
+    for symbol in analyzer.catalog.symbols():
+        daily = analyzer.load_stock_data(symbol)
+        if daily is None or len(daily) <= max(appended):
+            continue
+        stats = {'mtime_ns': 0, 'size': 0}
+        for timeframe in timeframes:
+            rule = timeframe_rule(timeframe)
+            incremental = bin_labels(daily.index.values[:0], rule) is not None
+            expected, _ = resample_ohlcv(daily, rule)
+            reference, _ = _resample_pandas(daily, rule)
+            if not expected.equals(reference.astype(expected.dtypes.to_dict())):
+                mismatches.append((symbol, timeframe, 'pandas'))
+            for count in appended:
+                cache = TimeframeCache()
+                cache.get(symbol, stats, rule, lambda: daily.iloc[:-count])
+                actual = cache.get(symbol, {'mtime_ns': 1, 'size': 0}, rule, lambda: daily)
+                if cache.incremental != int(incremental) or not actual.equals(expected):
+                    mismatches.append((symbol, timeframe, f"{count} appended bars"))
+    return mismatches
+
+
+def main():
+    from .stock_analyzer import StockAnalyzer
+
+    parser = argparse.ArgumentParser(description="Check or benchmark the multi-timeframe resampling layer")
+    parser.add_argument('command', choices=['check', 'bench'])
+    args = parser.parse_args()
+
+    analyzer = StockAnalyzer()
+    if args.command == 'check':
+        mismatches = check(analyzer)
+        for symbol, timeframe, against in mismatches:
+            print(f"MISMATCH {symbol} {timeframe}: {against}")
+        print(f"{len(mismatches)} mismatches against pandas resample and full re-aggregation")
+        if mismatches:
+            sys.exit(1)
+        return
+
+    symbols = analyzer.catalog.symbols()
+    frames = {symbol: analyzer.load_stock_data(symbol) for symbol in symbols}
+    for timeframe in ('weekly', 'monthly'):
+        rule = timeframe_rule(timeframe)
+        start = time.perf_counter()
+        for df in frames.values():
+            resample_ohlcv(df, rule)
+        full_time = time.perf_counter() - start
+
+        cache = TimeframeCache()
+        for symbol, df in frames.items():
+            cache.get(symbol, {'mtime_ns': 0, 'size': 0}, rule, lambda: df.iloc[:-1])
+        start = time.perf_counter()
+        for symbol, df in frames.items():
+            cache.get(symbol, {'mtime_ns': 1, 'size': 0}, rule, lambda: df)
+        incremental_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for symbol, df in frames.items():
+            cache.get(symbol, {'mtime_ns': 1, 'size': 0}, rule, lambda: df)
+        cached_time = time.perf_counter() - start
+        print(f"{timeframe:<8} {len(frames)} symbols: full resample {full_time * 1000:7.1f} ms, "
+              f"one new bar {incremental_time * 1000:7.1f} ms, cached {cached_time * 1000:6.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
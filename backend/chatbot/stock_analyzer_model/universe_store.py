@@ -0,0 +1,254 @@
+import argparse
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from .market_catalog import get_catalog
+from .price_store import PRICE_COLUMNS, get_price_store, read_history_csv
+
+UNIVERSE_INDEX_FILENAME = 'universe.json'
+UNIVERSE_VERSION = 1
+
+# Float columns are stored as one (4, rows) block so a symbol's slice becomes
+# a single pandas block without copying; Volume stays int64
+FLOAT_COLUMNS = ['Close', 'High', 'Low', 'Open']
+
+_universes = {}
+_universes_lock = threading.Lock()
+
+
+class UniverseStore:
+    """Every symbol's price history in one read-only, memory-mapped file.
+
+    The data file holds three column segments (dates, a float block and
+    volumes) with each symbol stored as a contiguous row range, and
+    ``universe.json`` maps catalog paths to those ranges. Frames returned
+    by ``load`` are views into the mapping, so every process (both Flask
+    services, gunicorn workers) shares the same page-cache pages instead of
+    holding private copies.
+
+    Builds write a new ``universe.<stamp>.bin`` and then swap the index;
+    attached processes notice the index change and remap, while mappings of
+    the old file stay valid until they are dropped.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.index_path = os.path.join(store_dir, UNIVERSE_INDEX_FILENAME)
+        self.files = {}
+        self.data_file = None
+        self._index_mtime = None
+        self._dates = None
+        self._floats = None
+        self._volumes = None
+        self._lock = threading.Lock()
+        self.attach()
+
+    def attach(self):
+        """Map the current universe file if the index changed. Returns True if remapped"""
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._index_mtime:
+            return False
+
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+            if index.get('version') != UNIVERSE_VERSION:
+                return False
+            rows = index['rows']
+            data = np.memmap(os.path.join(self.store_dir, index['data_file']), dtype=np.int64,
+                             mode='r', shape=(6 * rows,)) if rows else np.zeros(0, dtype=np.int64)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not attach universe store: {e}")
+            return False
+
+        with self._lock:
+            self._dates = data[:rows].view('datetime64[ns]')
+            self._floats = data[rows:5 * rows].view(np.float64).reshape(4, rows)
+            self._volumes = data[5 * rows:6 * rows]
+            self.files = index['files']
+            self.data_file = index['data_file']
+            self._index_mtime = mtime
+        return True
+
+    @staticmethod
+    def _is_current(entry, source_stats):
+        return (entry is not None and source_stats is not None
+                and entry['mtime_ns'] == source_stats['mtime_ns'] and entry['size'] == source_stats['size'])
+
+    def load(self, rel_path, source_stats, tail=None):
+        """Zero-copy Date-indexed OHLCV frame for a CSV, or None when not in the universe"""
+        entry = self.files.get(rel_path)
+        if not self._is_current(entry, source_stats) and self.attach():
+            entry = self.files.get(rel_path)
+        if not self._is_current(entry, source_stats):
+            return None
+
+        with self._lock:
+            dates, floats, volumes = self._dates, self._floats, self._volumes
+        stop = entry['start'] + entry['rows']
+        start = max(entry['start'], stop - tail) if tail else entry['start']
+
+        df = pd.DataFrame(floats[:, start:stop].T, columns=FLOAT_COLUMNS,
+                          index=pd.DatetimeIndex(dates[start:stop], name='Date', copy=False), copy=False)
+        df['Volume'] = volumes[start:stop]
+        return df
+
+    def build(self, catalog, price_store=None):
+        """Write a fresh universe file from the price store (or CSVs) and swap the index"""
+        catalog.refresh()
+        price_store = price_store or get_price_store(catalog.store_dir)
+
+        parts = []
+        files = {}
+        start = 0
+        for rel_path, stats in sorted(catalog.files.items()):
+            records = price_store.load_records(rel_path, stats)
+            if records is None:
+                try:
+                    df = read_history_csv(os.path.join(catalog.data_dir, rel_path))
+                except Exception as e:
+                    print(f"Failed to read {rel_path}: {e}")
+                    continue
+                columns = {col: df[col].values for col in PRICE_COLUMNS}
+                dates = df.index.values
+            else:
+                columns = {col: records[col] for col in PRICE_COLUMNS}
+                dates = records['Date']
+            parts.append((dates.astype('datetime64[ns]'), columns))
+            files[rel_path] = {'start': start, 'rows': len(dates),
+                               'mtime_ns': stats['mtime_ns'], 'size': stats['size']}
+            start += len(dates)
+
+        rows = start
+        data = np.empty(6 * rows, dtype=np.int64)
+        dates_out = data[:rows].view('datetime64[ns]')
+        floats_out = data[rows:5 * rows].view(np.float64).reshape(4, rows)
+        volumes_out = data[5 * rows:]
+        for (dates, columns), entry in zip(parts, files.values()):
+            segment = slice(entry['start'], entry['start'] + entry['rows'])
+            dates_out[segment] = dates
+            for i, col in enumerate(FLOAT_COLUMNS):
+                floats_out[i, segment] = columns[col]
+            volumes_out[segment] = columns['Volume']
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        data_file = f"universe.{time.time_ns()}.bin"
+        data_path = os.path.join(self.store_dir, data_file)
+        tmp_path = f"{data_path}.{os.getpid()}.tmp"
+        data.tofile(tmp_path)
+        os.replace(tmp_path, data_path)
+
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': UNIVERSE_VERSION, 'data_file': data_file, 'rows': rows, 'files': files},
+                      f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+        # Processes still mapping an old file keep it alive until they remap
+        for name in os.listdir(self.store_dir):
+            if name.startswith('universe.') and name.endswith('.bin') and name != data_file:
+                os.remove(os.path.join(self.store_dir, name))
+
+        self.attach()
+        return {'files': len(files), 'rows': rows, 'bytes': data.nbytes}
+
+
+def get_universe_store(store_dir):
+    """Process-wide universe store for a store directory"""
+    key = os.path.abspath(store_dir)
+    store = _universes.get(key)
+    if store is None:
+        with _universes_lock:
+            store = _universes.get(key)
+            if store is None:
+                store = UniverseStore(key)
+                _universes[key] = store
+    return store
+
+
+def memory_usage_mb():
+    """(rss, private) memory of this process in MB from /proc/self/smaps_rollup"""
+    values = {}
+    with open('/proc/self/smaps_rollup', 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(':')] = int(parts[1])
+    private = values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)
+    return values.get('Rss', 0) / 1024, private / 1024
+
+
+def _worker(source, data_dir, ready, results):
+    baseline = memory_usage_mb()
+    started = time.perf_counter()
+    catalog = get_catalog(data_dir)
+    if source == 'universe':
+        store = get_universe_store(catalog.store_dir)
+    elif source == 'price_store':
+        store = get_price_store(catalog.store_dir)
+
+    frames = []
+    for rel_path, stats in sorted(catalog.files.items()):
+        if source == 'csv':
+            frames.append(read_history_csv(os.path.join(catalog.data_dir, rel_path)))
+        else:
+            frames.append(store.load(rel_path, stats))
+    # Touch every value, as indicator code would
+    checksum = sum(float(df['Close'].sum()) for df in frames)
+    rss, private = memory_usage_mb()
+    results.put((time.perf_counter() - started, rss - baseline[0], private - baseline[1], checksum))
+    # Stay alive until every worker has measured so pages are genuinely shared
+    ready.wait()
+
+
+def benchmark(data_dir=None, workers=4, source='universe'):
+    """Start workers that each load every price history; report per-worker load time and memory"""
+    context = multiprocessing.get_context('spawn')
+    ready = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(source, data_dir, ready, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    measurements = [results.get() for _ in processes]
+    ready.set()
+    for process in processes:
+        process.join()
+    return measurements
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or benchmark the shared memory-mapped universe file")
+    parser.add_argument('command', choices=['build', 'bench'])
+    parser.add_argument('--data-dir', default=None)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    catalog = get_catalog(args.data_dir)
+    if args.command == 'build':
+        start = time.perf_counter()
+        summary = get_universe_store(catalog.store_dir).build(catalog)
+        print(f"Universe: {summary['files']} files, {summary['rows']} rows, {summary['bytes'] / 1e6:.1f} MB "
+              f"in {time.perf_counter() - start:.2f}s -> {catalog.store_dir}")
+        return
+
+    for source in ('universe', 'price_store', 'csv'):
+        measurements = benchmark(args.data_dir, args.workers, source)
+        startup = max(m[0] for m in measurements)
+        rss = sum(m[1] for m in measurements) / len(measurements)
+        private = sum(m[2] for m in measurements) / len(measurements)
+        print(f"{source:<12} {args.workers} workers: load all {startup:6.2f}s, per worker "
+              f"+{rss:7.1f} MB RSS, +{private:7.1f} MB private")
+
+
+if __name__ == '__main__':
+    main()
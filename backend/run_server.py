@@ -4,7 +4,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app.main import app
-
 if __name__ == '__main__':
+    # Imported here so advice pool workers, which re-import this module, do not each build the app
+    from app.main import app
     app.run(host='0.0.0.0', port=5003) 
\ No newline at end of file